@@ -0,0 +1,79 @@
+import asyncio
+
+# Seconds a backend that refused a connection is skipped for
+BACKEND_RETRY_DELAY = 1.0
+
+# Bytes copied per read when relaying a connection
+RELAY_CHUNK_SIZE = 65536
+
+
+class Backend:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.down_until = 0.0
+
+
+class LeastConnectionsBalancer:
+    """TCP front end that hands each client connection to the backend with the fewest open connections.
+
+    Used when several server instances can't share the listening port with
+    SO_REUSEPORT (webhook, or platforms without it). Connections are relayed
+    byte for byte, so a keep-alive connection stays on one backend.
+    """
+
+    def __init__(self, backends):
+        self.backends = [Backend(host, port) for host, port in backends]
+
+    def candidates(self):
+        """Backends to try, least loaded first, skipping ones that recently refused connections."""
+        now = asyncio.get_running_loop().time()
+        ordered = sorted(self.backends, key=lambda backend: backend.connections)
+        up = [backend for backend in ordered if backend.down_until <= now]
+        return up or ordered
+
+    async def handle_connection(self, client_reader, client_writer):
+        backend_reader = backend_writer = None
+        for backend in self.candidates():
+            try:
+                backend_reader, backend_writer = await asyncio.open_connection(backend.host, backend.port)
+                break
+            except OSError:
+                backend.down_until = asyncio.get_running_loop().time() + BACKEND_RETRY_DELAY
+        if backend_writer is None:
+            client_writer.close()
+            return
+
+        backend.connections += 1
+        try:
+            await asyncio.gather(relay(client_reader, backend_writer), relay(backend_reader, client_writer))
+        finally:
+            backend.connections -= 1
+            backend_writer.close()
+            client_writer.close()
+
+
+async def relay(reader, writer):
+    """Copy reader to writer until EOF, then pass the EOF on."""
+    try:
+        while True:
+            data = await reader.read(RELAY_CHUNK_SIZE)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        writer.close()
+
+
+async def run_balancer(host, port, backends, on_ready=None):
+    """Balance connections on (host, port) across backends until cancelled."""
+    balancer = LeastConnectionsBalancer(backends)
+    listener = await asyncio.start_server(balancer.handle_connection, host, port)
+    if on_ready:
+        on_ready()
+    async with listener:
+        await listener.serve_forever()
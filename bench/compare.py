@@ -0,0 +1,45 @@
+import sys
+import json
+
+# Compare two benchmark result files case by case:
+#   python bench/compare.py bench/results/before.json bench/results/after.json
+
+
+def load_results(path):
+    with open(path) as f:
+        data = json.load(f)
+    cases = {}
+    for result in data["results"]:
+        cases[(result["endpoint"], result["payload_bytes"], result["concurrency"])] = result
+    return data["environment"], cases
+
+
+def change(before, after):
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python bench/compare.py BEFORE.json AFTER.json")
+        sys.exit(2)
+    before_env, before = load_results(sys.argv[1])
+    after_env, after = load_results(sys.argv[2])
+    print(f"before: {before_env.get('commit')}{' (dirty)' if before_env.get('dirty') else ''}, "
+          f"after: {after_env.get('commit')}{' (dirty)' if after_env.get('dirty') else ''}")
+    print(f"{'endpoint':<8} {'bytes':>8} {'conc':>5} {'rps before':>11} {'rps after':>10} {'change':>8} "
+          f"{'p99 before':>11} {'p99 after':>10} {'change':>8}")
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        print(f"{key[0]:<8} {key[1]:>8} {key[2]:>5} {old['rps']:>11.1f} {new['rps']:>10.1f} "
+              f"{change(old['rps'], new['rps']):>8} {old['latency_ms']['p99']:>11.2f} "
+              f"{new['latency_ms']['p99']:>10.2f} "
+              f"{change(old['latency_ms']['p99'], new['latency_ms']['p99']):>8}")
+    missing = sorted(before.keys() ^ after.keys())
+    if missing:
+        print(f"{len(missing)} case(s) only in one file were skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import sys
+
+# Large-payload benchmark endpoint: send the whole body back
+
+def handler(body):
+    """Return the body unchanged, used directly by the warm worker pool."""
+    return body
+
+if __name__ == "__main__":
+    sys.stdout.buffer.write(sys.stdin.buffer.read())
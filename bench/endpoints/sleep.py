@@ -0,0 +1,14 @@
+import sys
+import time
+
+# Sleep-bound benchmark endpoint: stands in for a script waiting on I/O
+DELAY = 0.05
+
+def handler(body):
+    """Sleep for DELAY seconds, used directly by the warm worker pool."""
+    time.sleep(DELAY)
+    return "slept\n"
+
+if __name__ == "__main__":
+    sys.stdin.buffer.read()
+    print(handler(b""), end="")
@@ -0,0 +1,149 @@
+import time
+import asyncio
+
+# Minimal HTTP/1.1 load generator for the benchmark harness. It speaks just
+# enough HTTP to drive the endpoint server over keep-alive connections, so the
+# client costs as little CPU as possible on the same machine as the server.
+
+
+class ResponseError(Exception):
+    pass
+
+
+async def read_response(reader):
+    """Read one response, returning (status, body length)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ResponseError("connection closed")
+    status = int(status_line.split(b" ", 2)[1])
+    length = None
+    chunked = False
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        value = value.strip()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding" and value.lower() == b"chunked":
+            chunked = True
+        elif name == b"connection" and value.lower() == b"close":
+            keep_alive = False
+
+    size = 0
+    if chunked:
+        while True:
+            chunk_size = int((await reader.readline()).split(b";")[0], 16)
+            if chunk_size == 0:
+                # Skip trailers up to the blank line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            await reader.readexactly(chunk_size + 2)
+            size += chunk_size
+    elif length is not None:
+        await reader.readexactly(length)
+        size = length
+    else:
+        size = len(await reader.read())
+        keep_alive = False
+    return status, size, keep_alive
+
+
+class LoadResult:
+    """Latencies and error counts collected over one run."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+        self.bytes_received = 0
+        self.elapsed = 0.0
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self):
+        """Get throughput and latency percentiles (in milliseconds) as a dict."""
+        count = len(self.latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items())},
+            "elapsed_s": round(self.elapsed, 3),
+            "rps": round(count / self.elapsed, 2) if self.elapsed else 0.0,
+            "bytes_received": self.bytes_received,
+            "latency_ms": {
+                "mean": round(sum(self.latencies) / count * 1000, 3) if count else 0.0,
+                "p50": round(self.percentile(0.5) * 1000, 3),
+                "p90": round(self.percentile(0.9) * 1000, 3),
+                "p99": round(self.percentile(0.99) * 1000, 3),
+                "max": round(max(self.latencies) * 1000, 3) if count else 0.0,
+            },
+        }
+
+
+async def worker(host, port, request, deadline, result, record):
+    """Send requests back to back on one keep-alive connection until the deadline."""
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.monotonic()
+            writer.write(request)
+            status, size, keep_alive = await read_response(reader)
+            latency = time.monotonic() - started
+        except (OSError, ValueError, IndexError, ResponseError, asyncio.IncompleteReadError):
+            if record:
+                result.errors += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            # Don't spin if the server is refusing connections
+            await asyncio.sleep(0.01)
+            continue
+        if record:
+            result.latencies.append(latency)
+            result.statuses[status] = result.statuses.get(status, 0) + 1
+            result.bytes_received += size
+            if status >= 400:
+                result.errors += 1
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def build_request(host, port, path, payload):
+    return (f"POST {path} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            f"Content-Type: application/octet-stream\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"\r\n").encode() + payload
+
+
+async def run_load(host, port, path, payload, concurrency, duration, warmup=0.0):
+    """Keep concurrency requests in flight for duration seconds and return a LoadResult.
+
+    Responses during the first warmup seconds are not recorded.
+    """
+    request = build_request(host, port, path, payload)
+    result = LoadResult()
+    if warmup:
+        deadline = time.monotonic() + warmup
+        await asyncio.gather(*(worker(host, port, request, deadline, result, False)
+                               for _ in range(concurrency)))
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(worker(host, port, request, deadline, result, True)
+                           for _ in range(concurrency)))
+    result.elapsed = time.monotonic() - started
+    return result
@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import signal
+import asyncio
+import platform
+import argparse
+import tempfile
+import subprocess
+
+import psutil
+import yaml
+
+from loadgen import run_load
+
+# Benchmark harness: starts the built-in server against a fixed set of endpoints
+# in a scratch directory, drives it at fixed concurrency levels and payload
+# sizes, and saves throughput, latency percentiles, memory use and processes
+# spawned per request as JSON. See "Benchmarks" in README.md.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, "endpoints")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# endpoint -> payload sizes in bytes
+DEFAULT_CASES = {
+    "echo": [64, 4096],
+    "cpu": [64],
+    "sleep": [64],
+    "large": [65536, 1048576],
+}
+DEFAULT_CONCURRENCY = [1, 8, 32]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def prepare_workspace(workspace, port, pool):
+    """Copy the fixture endpoints into workspace and write a config for them."""
+    endpoints_dir = os.path.join(workspace, "endpoints")
+    os.makedirs(endpoints_dir)
+    for name in os.listdir(FIXTURES_DIR):
+        if name.endswith(".py"):
+            shutil.copy(os.path.join(FIXTURES_DIR, name), endpoints_dir)
+    shutil.copy(os.path.join(REPO_DIR, "endpoints", "echo.py"), endpoints_dir)
+
+    config = {
+        "ip": "127.0.0.1",
+        "port": port,
+        "urlprefix": "hooks",
+        "python_executable": sys.executable,
+        "bash_executable": "bash",
+        "worker_pool": {"enabled": pool},
+    }
+    config_file = os.path.join(workspace, "config.yaml")
+    with open(config_file, "w") as f:
+        yaml.safe_dump(config, f)
+    return endpoints_dir, config_file
+
+
+def start_server(workspace, endpoints_dir, config_file, port, timeout=30):
+    """Start `start_server.py serve` against the workspace and wait until it accepts connections."""
+    env = dict(os.environ,
+               EASY_API_ENDPOINTS_DIR=endpoints_dir,
+               EASY_API_CONFIG=config_file,
+               EASY_API_POOL_SOCKET=os.path.join(workspace, "worker_pool.sock"))
+    log = open(os.path.join(workspace, "server.log"), "w")
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "start_server.py"), "serve"],
+                               cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    stop_server(process)
+    with open(os.path.join(workspace, "server.log")) as f:
+        print(f.read())
+    raise SystemExit("Server did not start")
+
+
+def stop_server(process):
+    if process.poll() is None:
+        # SIGINT, so the server stops its worker pool too
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def process_tree_rss(pid):
+    """Total resident memory of a process and its descendants, in bytes."""
+    try:
+        parent = psutil.Process(pid)
+        processes = [parent] + parent.children(recursive=True)
+    except psutil.Error:
+        return 0
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def forks_so_far():
+    """Processes created on this machine since boot, or None where /proc/stat is unavailable."""
+    try:
+        with open("/proc/stat") as f:
+            for line in f:
+                if line.startswith("processes "):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+async def sample_rss(pid, samples, interval=0.1):
+    while True:
+        samples.append(process_tree_rss(pid))
+        await asyncio.sleep(interval)
+
+
+async def run_case(pid, port, endpoint, size, concurrency, duration, warmup):
+    payload = b"x" * size
+    samples = []
+    sampler = asyncio.create_task(sample_rss(pid, samples))
+    try:
+        if warmup:
+            # Warm up separately so forks are only counted for measured requests
+            await run_load("127.0.0.1", port, f"/hooks/{endpoint}", payload, concurrency, warmup)
+        forks_before = forks_so_far()
+        result = await run_load("127.0.0.1", port, f"/hooks/{endpoint}", payload, concurrency, duration)
+        forks_after = forks_so_far()
+    finally:
+        sampler.cancel()
+
+    summary = result.summary()
+    forks_per_request = None
+    if forks_before is not None and forks_after is not None and summary["requests"]:
+        forks_per_request = round((forks_after - forks_before) / summary["requests"], 3)
+    summary.update({
+        "endpoint": endpoint,
+        "payload_bytes": size,
+        "concurrency": concurrency,
+        "rss_peak_mb": round(max(samples, default=0) / 1048576, 1),
+        "rss_mean_mb": round(sum(samples) / len(samples) / 1048576, 1) if samples else 0.0,
+        "processes_per_request": forks_per_request,
+    })
+    return summary
+
+
+def environment_info(pool):
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True,
+                                  text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.TimeoutExpired):
+            return ""
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "worker_pool": pool,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def print_table(results):
+    print(f"{'endpoint':<8} {'bytes':>8} {'conc':>5} {'rps':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>6} {'rss MB':>7} {'procs/req':>9}")
+    for r in results:
+        latency = r["latency_ms"]
+        procs = "n/a" if r["processes_per_request"] is None else f"{r['processes_per_request']:.2f}"
+        print(f"{r['endpoint']:<8} {r['payload_bytes']:>8} {r['concurrency']:>5} {r['rps']:>9.1f} "
+              f"{latency['p50']:>8.2f} {latency['p99']:>8.2f} {r['errors']:>6} "
+              f"{r['rss_peak_mb']:>7.1f} {procs:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the built-in endpoint server.")
+    parser.add_argument("--endpoints", nargs="+", choices=sorted(DEFAULT_CASES), default=list(DEFAULT_CASES),
+                        help="endpoints to benchmark")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=DEFAULT_CONCURRENCY,
+                        help="concurrency levels to run each endpoint at")
+    parser.add_argument("--sizes", nargs="+", type=int,
+                        help="payload sizes in bytes (default: per-endpoint sizes)")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds measured per case")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds of unmeasured load per case")
+    parser.add_argument("--pool", action="store_true", help="enable the warm worker pool")
+    parser.add_argument("--output", help="results file (default: bench/results/<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    info = environment_info(args.pool)
+    port = free_port()
+    workspace = tempfile.mkdtemp(prefix="easy-api-bench-")
+    results = []
+    try:
+        endpoints_dir, config_file = prepare_workspace(workspace, port, args.pool)
+        process = start_server(workspace, endpoints_dir, config_file, port)
+        try:
+            for endpoint in args.endpoints:
+                for size in args.sizes or DEFAULT_CASES[endpoint]:
+                    for concurrency in args.concurrency:
+                        print(f"{endpoint} {size}B x{concurrency}...", flush=True)
+                        results.append(asyncio.run(run_case(process.pid, port, endpoint, size, concurrency,
+                                                            args.duration, args.warmup)))
+        finally:
+            stop_server(process)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{info['commit'] or 'unknown'}.json")
+    with open(output, "w") as f:
+        json.dump({"environment": info, "settings": vars(args), "results": results}, f, indent=2)
+
+    print()
+    print_table(results)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
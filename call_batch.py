@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from call_endpoint import load_manifest, get_timeout, decode_payload, ENDPOINTS_DIR
+from pool_client import call_pool, EndpointTimeout
+
+# Runs the _batch hook under webhook: reads a JSON array of {"endpoint", "body"}
+# items from the payload file, runs them concurrently and prints one JSON array
+# of results. The built-in server answers _batch itself (http_server.py).
+
+
+def result(item, status, stdout=b"", stderr=b"", duration=0.0):
+    return {
+        "endpoint": item.get("endpoint") if isinstance(item, dict) else None,
+        "status": status,
+        "stdout": stdout.decode(errors="replace"),
+        "stderr": stderr.decode(errors="replace"),
+        "duration": round(duration, 6),
+    }
+
+
+def spawn(command, payload, timeout):
+    """Run an endpoint in its own process group and return (exit_code, stdout, stderr)."""
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               start_new_session=os.name != 'nt')
+    try:
+        stdout, stderr = process.communicate(payload, timeout or None)
+    except subprocess.TimeoutExpired:
+        raise EndpointTimeout(f"Endpoint timed out after {timeout:g} seconds")
+    finally:
+        # Also stops anything the script left running in the background
+        if os.name == 'nt':
+            subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)], capture_output=True)
+        else:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        process.wait()
+    return process.returncode, stdout, stderr
+
+
+def run_item(manifest, item):
+    """Run one call of the batch and describe its outcome like a response to it would."""
+    started = time.monotonic()
+    if not isinstance(item, dict) or not isinstance(item.get("endpoint"), str):
+        return result(item, 400, stderr=b"Each item needs an \"endpoint\"\n")
+    entry = manifest["endpoints"].get(item["endpoint"])
+    if entry is None:
+        return result(item, 404, stderr=b"Hook not found.\n")
+
+    command, script_path, options = entry
+    body = item.get("body", "")
+    payload = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+    timeout = get_timeout(options)
+    if timeout is None:
+        return result(item, 504, stderr=b"Request deadline passed before it could run\n")
+    try:
+        outcome = None
+        if options.get("pool"):
+            script_name = os.path.relpath(script_path, ENDPOINTS_DIR).replace('\\', '/')
+            try:
+                outcome = call_pool(script_name, payload, manifest["pool_socket"], None, timeout,
+                                    os.environ.get("EASY_API_REQUEST_ID"))
+            except OSError:
+                if options.get("persistent") or not manifest.get("pool_fallback", True):
+                    raise
+        if outcome is None and options.get("persistent"):
+            message = f"{item['endpoint']} is persistent but not loaded in the worker pool\n"
+            return result(item, 500, stderr=message.encode(), duration=time.monotonic() - started)
+        if outcome is None:
+            outcome = spawn(command, payload, timeout)
+    except EndpointTimeout as e:
+        return result(item, 504, stderr=f"{e}\n".encode(), duration=time.monotonic() - started)
+    except OSError as e:
+        return result(item, 500, stderr=f"Error executing script: {str(e)}\n".encode(),
+                      duration=time.monotonic() - started)
+
+    exit_code, stdout, stderr = outcome
+    return result(item, 200 if exit_code == 0 else 500, stdout, stderr, time.monotonic() - started)
+
+
+def main():
+    manifest = load_manifest()
+    if manifest is None:
+        print("Error: endpoints.manifest is missing, restart start_server.py")
+        sys.exit(1)
+    batch = manifest.get("batch") or {}
+    error = decode_payload(os.environ.get('WEBHOOK_PAYLOAD', ''), os.environ.get('REQUEST_CONTENT_ENCODING', ''),
+                           manifest.get("max_request_size", 0))
+    if error:
+        print(f"Error: {error}")
+        sys.exit(1)
+    try:
+        with open(os.environ.get('WEBHOOK_PAYLOAD', ''), 'rb') as f:
+            items = json.loads(f.read())
+    except (OSError, ValueError):
+        items = None
+    if not isinstance(items, list):
+        print("Batch body must be a JSON array")
+        sys.exit(1)
+    max_items = batch.get("max_items", 100)
+    if max_items and len(items) > max_items:
+        print(f"Batches are limited to {max_items} calls")
+        sys.exit(1)
+
+    with ThreadPoolExecutor(max(1, batch.get("max_parallel", 8))) as executor:
+        results = list(executor.map(lambda item: run_item(manifest, item), items))
+    for index, item_result in enumerate(results):
+        item_result["index"] = index
+    print(json.dumps(results))
@@ -1,65 +1,324 @@
 import sys
 import os
-import subprocess
-from start_server import CONFIG
-
-# Check if script name is provided as argument
-if len(sys.argv) < 2:
-    print("Error: No script specified")
-    sys.exit(1)
-
-# Get the script name from the argument (now includes relative path)
-script_name = sys.argv[1]
-script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "endpoints", script_name)
-
-# Check if the script exists
-if not os.path.exists(script_path):
-    print(f"Error: Script {script_name} not found at {script_path}")
-    sys.exit(1)
-
-# Get the file path from the environment variable
-payload_file = os.environ.get('WEBHOOK_PAYLOAD', '')
-
-# Read the content from the file
-try:
-    with open(payload_file, 'r') as f:
-        payload_content = f.read()
-except Exception as e:
-    print(f"Error reading payload file: {str(e)}")
-    sys.exit(1)
-
-# Determine how to execute the script based on its extension
-if script_name.endswith('.py'):
-    cmd = [sys.executable, script_path]
-elif script_name.endswith('.sh'):
-    cmd = [CONFIG['bash_executable'], script_path]
-elif script_name.endswith('.bat'):
-    cmd = ['cmd.exe', '/c', script_path]
-elif script_name.endswith('.ps1'):
-    cmd = ['powershell.exe', '-ExecutionPolicy', 'Bypass', '-File', script_path]
-else:
-    cmd = [script_path]
-
-# Run the script and pipe the payload to its stdin
-try:
-    process = subprocess.Popen(
-        cmd,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-    stdout, stderr = process.communicate(input=payload_content)
-    
-    # Print the script's output
-    print(stdout, end='')
-    
-    # If there was an error, print it to stderr
+import marshal
+
+# This runs once per request, so it deliberately imports nothing beyond
+# os/sys/marshal (and the builtin time module); everything else is looked up
+# in the manifest that start_server.py precompiles.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_FILE = os.path.join(SCRIPT_DIR, "endpoints.manifest")
+# Resolved the same way as in start_server.py
+ENDPOINTS_DIR = os.environ.get("EASY_API_ENDPOINTS_DIR") or os.path.join(SCRIPT_DIR, "endpoints")
+# Bytes read from and inflated into the payload file at a time
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+def load_manifest():
+    """Load the routing manifest written by start_server.py, or None if it is missing."""
+    try:
+        # marshal.load() on a file reads it in many small pieces, so read it whole
+        with open(MANIFEST_FILE, 'rb') as f:
+            return marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def lookup_endpoint(manifest, script_name):
+    """Get (command, script path, options) for an endpoint, or None if it doesn't exist."""
+    hook_id = os.path.splitext(script_name)[0].replace('\\', '/')
+    if manifest is not None:
+        entry = manifest["endpoints"].get(hook_id)
+        if entry is not None:
+            return entry
+
+    # Slow path for scripts added since the manifest was written
+    script_path = os.path.join(ENDPOINTS_DIR, script_name)
+    if not os.path.exists(script_path):
+        return None
+    # The launcher runs with -S, so set up site-packages before importing yaml
+    import site
+    site.main()
+    from start_server import build_endpoint_command
+    return build_endpoint_command(script_path), script_path, {}
+
+
+def get_timeout(options):
+    """Get how long the endpoint may run for, from its timeout and the client's X-Request-Deadline.
+
+    Returns None if the deadline has already passed.
+    """
+    timeout = options.get("timeout") or 0
+    deadline = os.environ.get('REQUEST_DEADLINE')
+    if deadline:
+        import time
+        try:
+            remaining = float(deadline) - time.time()
+        except ValueError:
+            return timeout
+        if remaining <= 0:
+            return None
+        timeout = min(timeout, remaining) if timeout else remaining
+    return timeout
+
+
+def start_trace(tracing, script_name, entered, looked_up):
+    """Start tracing this request, if tracing is on.
+
+    The first span runs from webhook finishing writing the payload file to
+    this launcher running, which covers webhook starting us and interpreter
+    startup. The request ID is put in the environment for the endpoint.
+    """
+    import time
+    from tracing import Tracer, REQUEST_ID_ENV
+    hook_id = os.path.splitext(script_name)[0].replace('\\', '/')
+    trace = Tracer(tracing["file"]).start(os.environ.get(REQUEST_ID_ENV), hook_id, "launcher")
+    os.environ[REQUEST_ID_ENV] = trace.request_id
+    try:
+        written = os.stat(os.environ.get('WEBHOOK_PAYLOAD', '')).st_mtime_ns / 1e9
+        trace.add("startup", time.monotonic() - (time.time() - written), entered)
+    except OSError:
+        pass
+    trace.add("manifest", entered, looked_up)
+    return trace
+
+
+def finish(exit_code, trace=None):
+    """Write out the trace, if any, and exit."""
+    if trace:
+        trace.finish()
+    sys.exit(exit_code)
+
+
+def run_in_pool(manifest, script_name, payload_fd, timeout, trace=None, persistent=False):
+    """Run an endpoint in the warm worker pool. Returns False if it should be spawned instead.
+
+    Persistent endpoints only run in the pool, so for them there is no fallback.
+    """
+    import time
+    from pool_client import call_pool, EndpointTimeout
+
+    # Hand the worker our payload file descriptor instead of copying the body
+    started = time.monotonic()
+    try:
+        result = call_pool(script_name.replace('\\', '/'), None, manifest["pool_socket"], payload_fd, timeout,
+                           trace.request_id if trace else None)
+    except EndpointTimeout as e:
+        print(f"Error: {str(e)}")
+        finish(124, trace)
+    except OSError as e:
+        if persistent or not manifest.get("pool_fallback", True):
+            print(f"Error reaching worker pool: {str(e)}")
+            finish(1, trace)
+        result = None
+    if result is None and persistent:
+        print(f"Error: {script_name} is persistent but not loaded in the worker pool")
+        finish(1, trace)
+    if result is None:
+        # The worker shares our file offset, so rewind before spawning instead
+        os.lseek(payload_fd, 0, os.SEEK_SET)
+        return False
+
+    if trace:
+        trace.add("pool", started)
+    exit_code, stdout, stderr = result
+    sys.stdout.buffer.write(stdout)
+    sys.stdout.flush()
     if stderr:
-        print(stderr, file=sys.stderr, end='')
-    
-    # Exit with the same code as the script
-    sys.exit(process.returncode)
-except Exception as e:
-    print(f"Error executing script: {str(e)}")
-    sys.exit(1)
\ No newline at end of file
+        sys.stderr.buffer.write(stderr)
+        sys.stderr.flush()
+    finish(exit_code, trace)
+
+
+def run_script(cmd, payload_fd):
+    """Run the endpoint with the payload file as its stdin and exit with its exit code."""
+    try:
+        if os.name == 'nt':
+            # Windows has no real exec(), so stay around as the parent process
+            import subprocess
+            sys.exit(subprocess.call(cmd, stdin=payload_fd))
+
+        # Replace the launcher with the endpoint: its stdout/stderr go straight
+        # back to webhook and its exit code becomes ours
+        os.dup2(payload_fd, 0)
+        os.execvp(cmd[0], cmd)
+    except OSError as e:
+        print(f"Error executing script: {str(e)}")
+        sys.exit(1)
+
+
+class LauncherTimeout(Exception):
+    pass
+
+
+def run_script_and_wait(cmd, payload_fd, timeout=0, trace=None):
+    """Run the endpoint as a child process and return its exit code.
+
+    Used instead of run_script when the launcher has to outlive the endpoint:
+    to kill its whole process tree after timeout seconds (returning 124, like
+    timeout(1)), or to time it for a trace.
+    """
+    import time
+    started = time.monotonic()
+    if os.name == 'nt':
+        import subprocess
+        process = subprocess.Popen(cmd, stdin=payload_fd)
+        spawned = time.monotonic()
+        try:
+            exit_code = process.wait(timeout or None)
+        except subprocess.TimeoutExpired:
+            subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)], capture_output=True)
+            process.wait()
+            exit_code = None
+    else:
+        import signal
+        # Closed on exec, so reading it to EOF tells us when the endpoint has started
+        exec_read, exec_write = os.pipe()
+        try:
+            pid = os.fork()
+        except OSError as e:
+            print(f"Error executing script: {str(e)}")
+            sys.exit(1)
+        if pid == 0:
+            os.close(exec_read)
+            # Own process group, so anything the script starts is killed with it
+            os.setsid()
+            run_script(cmd, payload_fd)
+        os.close(exec_write)
+        os.read(exec_read, 1)
+        os.close(exec_read)
+        spawned = time.monotonic()
+
+        def expire(signum, frame):
+            raise LauncherTimeout()
+
+        exit_code = None
+        if timeout:
+            signal.signal(signal.SIGALRM, expire)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            _, status = os.waitpid(pid, 0)
+            exit_code = os.waitstatus_to_exitcode(status)
+        except LauncherTimeout:
+            pass
+        finally:
+            if timeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            try:
+                # Don't leave anything the script started in the background running
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        if exit_code is None:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        elif exit_code < 0:
+            # Killed by a signal, report it the way a shell would
+            exit_code = 128 - exit_code
+
+    if trace:
+        trace.add("spawn", started, spawned)
+        trace.add("script", spawned)
+    if exit_code is None:
+        print(f"Error: Endpoint timed out after {timeout:g} seconds")
+        sys.stdout.flush()
+        return 124
+    return exit_code
+
+
+def decode_payload(payload_file, encoding, max_size):
+    """Decompress a gzip request body in place, so endpoints read the original bytes.
+
+    The body is inflated a chunk at a time into a file next to the payload,
+    which then replaces it, so a large body never has to fit in memory.
+    Returns an error message, or None on success.
+    """
+    if encoding.strip().lower() in ("", "identity"):
+        return None
+    if encoding.strip().lower() != "gzip":
+        return f"Unsupported Content-Encoding: {encoding}"
+    import zlib
+    decoded_file = payload_file + ".decoded"
+    try:
+        with open(payload_file, 'rb') as src, open(decoded_file, 'wb') as dst:
+            decompressor = zlib.decompressobj(31)
+            size = 0
+            while not decompressor.eof:
+                data = decompressor.unconsumed_tail or src.read(DECODE_CHUNK_SIZE)
+                if not data:
+                    return "Truncated gzip body"
+                inflated = decompressor.decompress(data, DECODE_CHUNK_SIZE)
+                size += len(inflated)
+                if max_size and size > max_size:
+                    return f"Decompressed body is larger than {max_size} bytes"
+                dst.write(inflated)
+        os.replace(decoded_file, payload_file)
+    except zlib.error as e:
+        return f"Malformed gzip body: {e}"
+    except OSError as e:
+        return f"Error reading payload file: {str(e)}"
+    finally:
+        try:
+            os.remove(decoded_file)
+        except OSError:
+            pass
+    return None
+
+
+def main():
+    import time
+    entered = time.monotonic()
+
+    # Check if script name is provided as argument
+    if len(sys.argv) < 2:
+        print("Error: No script specified")
+        sys.exit(1)
+
+    # Get the script name from the argument (now includes relative path)
+    script_name = sys.argv[1]
+    manifest = load_manifest()
+    endpoint = lookup_endpoint(manifest, script_name)
+    looked_up = time.monotonic()
+
+    # Check if the script exists
+    if endpoint is None:
+        script_path = os.path.join(ENDPOINTS_DIR, script_name)
+        print(f"Error: Script {script_name} not found at {script_path}")
+        sys.exit(1)
+    cmd, script_path, options = endpoint
+
+    trace = None
+    if manifest is not None and manifest.get("tracing"):
+        trace = start_trace(manifest["tracing"], script_name, entered, looked_up)
+
+    # Open the payload file from the environment variable
+    payload_file = os.environ.get('WEBHOOK_PAYLOAD', '')
+    opened = time.monotonic()
+    if os.environ.get('REQUEST_CONTENT_ENCODING'):
+        error = decode_payload(payload_file, os.environ['REQUEST_CONTENT_ENCODING'],
+                               manifest.get("max_request_size", 0) if manifest else 0)
+        if error:
+            print(f"Error: {error}")
+            finish(1, trace)
+    try:
+        payload_fd = os.open(payload_file, os.O_RDONLY)
+    except OSError as e:
+        print(f"Error reading payload file: {str(e)}")
+        finish(1, trace)
+    if trace:
+        trace.add("payload_open", opened)
+
+    timeout = get_timeout(options)
+    if timeout is None:
+        print("Error: Request deadline passed before it could run")
+        finish(124, trace)
+    if options.get("pool"):
+        run_in_pool(manifest, script_name, payload_fd, timeout, trace, options.get("persistent", False))
+    if timeout or trace:
+        finish(run_script_and_wait(cmd, payload_fd, timeout, trace), trace)
+    run_script(cmd, payload_fd)
+
+
+if __name__ == "__main__":
+    main()
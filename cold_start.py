@@ -0,0 +1,162 @@
+import os
+import ast
+import subprocess
+import py_compile
+import importlib.util
+
+# Reduces and measures the start-up cost of Python endpoints, which run as a
+# fresh interpreter per request unless the worker pool serves them.
+
+# Imports the modules named in its arguments, so none of the endpoint's own code runs
+IMPORT_PROBE = """import sys
+for module in sys.argv[1:]:
+    try:
+        __import__(module)
+    except Exception:
+        pass"""
+
+
+def find_local_modules(script_path):
+    """Find the modules next to a script that it imports, directly or through each other."""
+    root = os.path.dirname(script_path)
+    found = set()
+    pending = [script_path]
+    while pending:
+        try:
+            with open(pending.pop(), 'rb') as f:
+                tree = ast.parse(f.read())
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                # "from pkg import mod" can name a submodule as well as an attribute
+                names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+            else:
+                continue
+            for name in names:
+                parts = name.split(".")
+                for depth in range(1, len(parts) + 1):
+                    base = os.path.join(root, *parts[:depth])
+                    for candidate in (base + ".py", os.path.join(base, "__init__.py")):
+                        if os.path.isfile(candidate) and candidate not in found:
+                            found.add(candidate)
+                            pending.append(candidate)
+    return found
+
+
+def is_compiled(path):
+    """Check whether a source file's cached bytecode is at least as new as the file."""
+    try:
+        return os.stat(importlib.util.cache_from_source(path)).st_mtime_ns >= os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+
+
+def precompile_endpoints(endpoint_files):
+    """Compile Python endpoints and the local modules they import to bytecode.
+
+    Imported modules then load from __pycache__ on every run, and a syntax
+    error shows up here instead of as a failed request. Returns how many
+    files were compiled.
+    """
+    sources = set()
+    for path in endpoint_files:
+        if path.endswith(".py"):
+            sources.add(path)
+            sources.update(find_local_modules(path))
+
+    compiled = 0
+    for path in sorted(sources):
+        if is_compiled(path):
+            continue
+        try:
+            py_compile.compile(path, doraise=True)
+            compiled += 1
+        except py_compile.PyCompileError as e:
+            print(f"Could not compile {path}: {e.msg.strip()}")
+        except OSError:
+            pass
+    return compiled
+
+
+def parse_import_times(stderr):
+    """Parse -X importtime output into {module: (self_us, cumulative_us, top_level)}."""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        # Nested imports are indented under their parent
+        name = fields[2][1:]
+        try:
+            imports[name.strip()] = (int(fields[0]), int(fields[1]), not name.startswith(" "))
+        except ValueError:
+            continue
+    return imports
+
+
+def measure_imports(python_command, script_path, runs):
+    """Import an endpoint's modules runs times in a fresh interpreter and return {module: median cumulative µs}.
+
+    The modules are the top-level imports worker_pool finds in the script's
+    source. Only imports the endpoint pulls in are counted, not the probe's own.
+    """
+    from worker_pool import get_imports
+    with open(script_path, 'rb') as f:
+        modules = get_imports(ast.parse(f.read(), script_path))
+
+    def run(args):
+        result = subprocess.run(python_command + ["-X", "importtime", "-c", IMPORT_PROBE] + args,
+                                cwd=os.path.dirname(script_path), stdin=subprocess.DEVNULL,
+                                capture_output=True, text=True, timeout=60)
+        return parse_import_times(result.stderr)
+
+    baseline = run([])
+    samples = {}
+    for _ in range(runs):
+        for name, (_, cumulative_us, top_level) in run(modules).items():
+            if top_level and name not in baseline:
+                samples.setdefault(name, []).append(cumulative_us)
+    return {name: sorted(times)[len(times) // 2] for name, times in samples.items()}
+
+
+def import_report(endpoints, runs=3, top=5, budget_ms=0):
+    """Print the import cost of each Python endpoint, heaviest first, and the heaviest imports overall.
+
+    endpoints is a list of (hook_id, python_command, script_path). Returns
+    True if every endpoint is within budget_ms (0 = no budget).
+    """
+    totals = []
+    overall = {}
+    for hook_id, python_command, script_path in endpoints:
+        try:
+            imports = measure_imports(python_command, script_path, runs)
+        except (OSError, SyntaxError, ValueError, subprocess.TimeoutExpired) as e:
+            print(f"  {hook_id}: could not measure imports ({e})")
+            continue
+        totals.append((sum(imports.values()), hook_id, imports))
+        for name, cumulative_us in imports.items():
+            users = overall.setdefault(name, [0, 0])
+            users[0] += cumulative_us
+            users[1] += 1
+
+    within_budget = True
+    print(f"Import time per endpoint (median of {runs} runs):")
+    for total_us, hook_id, imports in sorted(totals, key=lambda entry: entry[0], reverse=True):
+        over = budget_ms and total_us / 1000 > budget_ms
+        within_budget = within_budget and not over
+        print(f"  {hook_id}: {total_us / 1000:.2f} ms{' OVER BUDGET' if over else ''}")
+        for name, cumulative_us in sorted(imports.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f"      {cumulative_us / 1000:8.2f} ms  {name}")
+
+    if overall:
+        print("Heaviest imports across endpoints:")
+        for name, (total_us, count) in sorted(overall.items(), key=lambda item: item[1][0], reverse=True)[:top]:
+            print(f"  {total_us / 1000:8.2f} ms  {name} (in {count} endpoint{'s' if count != 1 else ''})")
+    if budget_ms:
+        print(f"Budget: {budget_ms} ms per endpoint")
+    return within_budget
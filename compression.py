@@ -0,0 +1,155 @@
+import zlib
+
+# zstd and brotli are used when their modules are installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+# Capping how far a brotli body inflates needs output_buffer_limit, new in brotli 1.1
+BROTLI_OUTPUT_LIMIT = brotli is not None and hasattr(brotli.Decompressor, "can_accept_more_data")
+
+
+class GzipEncoder:
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data, flush=False):
+        """Compress a piece of the body. With flush, everything so far can be decoded by the client."""
+        out = self.compressor.compress(data)
+        return out + self.compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class ZstdEncoder:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data, flush=False):
+        out = self.compressor.compress(data)
+        return out + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else out
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data, flush=False):
+        out = self.compressor.process(data)
+        return out + self.compressor.flush() if flush else out
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+# Content-Encoding -> (encoder class, default level), most preferred first
+ENCODERS = {}
+if zstandard:
+    ENCODERS["zstd"] = (ZstdEncoder, 3)
+if brotli:
+    ENCODERS["br"] = (BrotliEncoder, 4)
+ENCODERS["gzip"] = (GzipEncoder, 6)
+
+
+class DecodeError(Exception):
+    """Raised when a compressed request body is malformed."""
+
+
+class BodyTooLarge(DecodeError):
+    """Raised when a compressed request body inflates past the allowed size."""
+
+
+# The most a zstd frame can inflate per input byte: a 4-byte RLE block decodes to 128 KiB
+ZSTD_MAX_RATIO = 128 * 1024 // 4
+# Smallest piece of input fed to the zstd decompressor at a time when the size is capped
+ZSTD_MIN_STEP = 16
+
+
+class Decoder:
+    """Decompresses a request body piece by piece, refusing to inflate it past max_size bytes."""
+
+    def __init__(self, encoding, max_size=0):
+        if encoding == "gzip":
+            self.decompressor = zlib.decompressobj(31)
+        elif encoding == "zstd" and zstandard:
+            self.decompressor = zstandard.ZstdDecompressor().decompressobj()
+        elif encoding == "br" and brotli:
+            if max_size and not BROTLI_OUTPUT_LIMIT:
+                raise ValueError("Unsupported Content-Encoding: br (needs brotli 1.1 or newer)")
+            self.decompressor = brotli.Decompressor()
+        else:
+            raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+        self.encoding = encoding
+        self.max_size = max_size
+        self.size = 0
+
+    def decompress(self, data):
+        # Never inflate more than one byte past the limit, however well the data compresses
+        limit = self.max_size - self.size + 1 if self.max_size else 0
+        try:
+            if not limit:
+                out = self.decompressor.process(data) if self.encoding == "br" else self.decompressor.decompress(data)
+            elif self.encoding == "gzip":
+                out = self.decompressor.decompress(data, limit)
+                while self.decompressor.unconsumed_tail and len(out) < limit:
+                    out += self.decompressor.decompress(self.decompressor.unconsumed_tail, limit - len(out))
+            elif self.encoding == "zstd":
+                # zstandard has no output limit, so feed it pieces too small to overshoot by much
+                out = b""
+                position = 0
+                while position < len(data) and len(out) < limit:
+                    step = max(ZSTD_MIN_STEP, (limit - len(out)) // ZSTD_MAX_RATIO)
+                    out += self.decompressor.decompress(data[position:position + step])
+                    position += step
+            else:
+                out = self.decompressor.process(data, output_buffer_limit=limit)
+                while len(out) < limit and not self.decompressor.can_accept_more_data():
+                    out += self.decompressor.process(b"", output_buffer_limit=limit - len(out))
+        except Exception as e:
+            raise DecodeError(f"Malformed {self.encoding} body: {e}")
+        self.size += len(out)
+        if self.max_size and self.size > self.max_size:
+            raise BodyTooLarge(f"Decompressed body is larger than {self.max_size} bytes")
+        return out
+
+    def finished(self):
+        """Whether the whole compressed stream has been seen."""
+        if self.encoding == "br":
+            return self.decompressor.is_finished()
+        return getattr(self.decompressor, "eof", True)
+
+
+def negotiate(accept_encoding, allowed):
+    """Pick the encoding to use for a client's Accept-Encoding header, or None to send the body as is.
+
+    Among the encodings the client accepts (q > 0), the first in allowed wins.
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in allowed:
+        if encoding in ENCODERS and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def create_encoder(encoding, level=None):
+    encoder_class, default_level = ENCODERS[encoding]
+    return encoder_class(default_level if level is None else level)
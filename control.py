@@ -0,0 +1,128 @@
+import os
+import json
+import socket
+import threading
+
+# Local control channel of a running start_server.py. A client sends one JSON
+# request line, e.g. {"command": "status", "token": "..."}, and gets one JSON
+# line back with "ok" and either the command's result or an "error".
+
+# Seconds a control connection may take to send its request or read the reply
+CONTROL_TIMEOUT = 5
+# Largest request the server reads
+MAX_REQUEST_SIZE = 64 * 1024
+
+
+def read_line(conn, limit=0):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+        if limit and len(data) > limit:
+            raise ValueError("Request too large")
+    return data
+
+
+class ControlServer:
+    """Answers control commands in a background thread.
+
+    Listens on a Unix socket that only this user can open, or on a loopback
+    TCP port where Unix sockets aren't available. Either way each request
+    must carry the token, which is only written to the (private) state file.
+    handlers maps command names to functions taking the request and returning
+    a dict to send back.
+    """
+
+    def __init__(self, socket_path, handlers):
+        self.handlers = handlers
+        self.token = os.urandom(16).hex()
+        self.socket_path = None
+        if hasattr(socket, "AF_UNIX") and os.name != 'nt':
+            # Left behind by a server that didn't exit cleanly
+            try:
+                os.remove(socket_path)
+            except OSError:
+                pass
+            self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            old_umask = os.umask(0o177)
+            try:
+                self.listener.bind(socket_path)
+            finally:
+                os.umask(old_umask)
+            self.socket_path = socket_path
+            self.address = {"unix": socket_path}
+        else:
+            self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.listener.bind(("127.0.0.1", 0))
+            self.address = {"tcp": list(self.listener.getsockname())}
+        self.listener.listen(8)
+
+    def start(self):
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return  # Closed
+            with conn:
+                try:
+                    conn.settimeout(CONTROL_TIMEOUT)
+                    response = self.handle(json.loads(read_line(conn, MAX_REQUEST_SIZE)))
+                except (OSError, ValueError) as e:
+                    response = {"ok": False, "error": str(e)}
+                try:
+                    conn.sendall((json.dumps(response) + "\n").encode())
+                except OSError:
+                    pass
+
+    def handle(self, request):
+        if not isinstance(request, dict) or request.get("token") != self.token:
+            return {"ok": False, "error": "Invalid token"}
+        handler = self.handlers.get(request.get("command"))
+        if handler is None:
+            return {"ok": False, "error": f"Unknown command: {request.get('command')}"}
+        try:
+            result = handler(request)
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+        return dict(result or {}, ok=True)
+
+    def close(self):
+        self.listener.close()
+        if self.socket_path:
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+
+def send_command(state, command, timeout=CONTROL_TIMEOUT, **arguments):
+    """Send a command to the server described by a state file entry and return its response.
+
+    Raises OSError if the server can't be reached.
+    """
+    address = state.get("control") or {}
+    if "unix" in address and hasattr(socket, "AF_UNIX"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(address["unix"])
+        except OSError:
+            sock.close()
+            raise
+    elif "tcp" in address:
+        sock = socket.create_connection(tuple(address["tcp"]), timeout)
+    else:
+        raise OSError("The server has no control socket")
+    with sock:
+        sock.settimeout(timeout)
+        request = dict(arguments, command=command, token=state.get("token"))
+        sock.sendall((json.dumps(request) + "\n").encode())
+        response = read_line(sock)
+    if not response:
+        raise OSError("The server closed the control connection")
+    return json.loads(response)
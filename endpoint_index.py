@@ -0,0 +1,122 @@
+import os
+import time
+import marshal
+
+# File types that are served as endpoints
+ENDPOINT_EXTENSIONS = ('.py', '.sh', '.bat', '.ps1')
+
+# Directories scanned less than this long after their last change are scanned
+# again next time, in case they changed again within the same mtime tick
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+class EndpointIndex:
+    """Index of the endpoint files under a directory, cached on disk between runs.
+
+    Each directory is stored with its mtime, subdirectories and endpoint files.
+    Adding, removing or renaming a file changes its directory's mtime, so on
+    refresh only directories whose mtime changed are listed again; the rest
+    are reused from the cache after a single stat. File mtimes and sizes are
+    as of the last time their directory was listed.
+    """
+
+    def __init__(self, endpoints_dir, index_file):
+        self.endpoints_dir = endpoints_dir
+        self.index_file = index_file
+        self.directories = {}  # relative dir -> (mtime_ns, scanned_at_ns, subdirs, files)
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """Load the cached index, ignoring it if it is missing, unreadable or for another directory."""
+        try:
+            # marshal.load() on a file reads it in many small pieces, so read it whole
+            with open(self.index_file, 'rb') as f:
+                data = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return
+        if isinstance(data, dict) and data.get("endpoints_dir") == self.endpoints_dir:
+            self.directories = data["directories"]
+
+    def save(self):
+        """Write the index back to disk if the last refresh changed it."""
+        if not self.dirty:
+            return
+        try:
+            with open(self.index_file + ".tmp", 'wb') as f:
+                marshal.dump({"endpoints_dir": self.endpoints_dir, "directories": self.directories}, f)
+            os.replace(self.index_file + ".tmp", self.index_file)
+        except OSError:
+            return
+        self.dirty = False
+
+    def scan_directory(self, path):
+        """List one directory with os.scandir, returning (subdirs, files)."""
+        subdirs = []
+        files = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                # Skip hidden entries like glob does, and bytecode caches
+                if entry.name.startswith('.') or entry.name == '__pycache__':
+                    continue
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                    elif os.path.normcase(entry.name).endswith(ENDPOINT_EXTENSIONS):
+                        stat = entry.stat()
+                        files.append((entry.name, stat.st_mtime_ns, stat.st_size))
+                except OSError:
+                    continue
+        return sorted(subdirs), sorted(files)
+
+    def refresh(self):
+        """Bring the index up to date and return its entries (see entries())."""
+        directories = {}
+        now_ns = time.time_ns()
+        seen = set()
+        pending = ['']
+        while pending:
+            relative_dir = pending.pop()
+            path = os.path.join(self.endpoints_dir, relative_dir) if relative_dir else self.endpoints_dir
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            # Don't loop forever on symlinks pointing back up the tree
+            if (stat.st_dev, stat.st_ino) in seen:
+                continue
+            seen.add((stat.st_dev, stat.st_ino))
+            mtime_ns = stat.st_mtime_ns
+
+            cached = self.directories.get(relative_dir)
+            if cached and cached[0] == mtime_ns and cached[1] - mtime_ns > RACY_WINDOW_NS:
+                directories[relative_dir] = cached
+            else:
+                try:
+                    subdirs, files = self.scan_directory(path)
+                except OSError:
+                    continue
+                directories[relative_dir] = (mtime_ns, now_ns, subdirs, files)
+                self.dirty = True
+
+            for name in directories[relative_dir][2]:
+                pending.append(os.path.join(relative_dir, name) if relative_dir else name)
+
+        if directories.keys() != self.directories.keys():
+            self.dirty = True
+        self.directories = directories
+        return self.entries()
+
+    def entries(self):
+        """Get (path, hook_id, mtime_ns, size) for every endpoint file, sorted by hook ID."""
+        entries = []
+        base = os.path.join(self.endpoints_dir, '')
+        for relative_dir, (_, _, _, files) in self.directories.items():
+            prefix = relative_dir + os.sep if relative_dir else ''
+            id_prefix = prefix.replace('\\', '/')
+            for name, mtime_ns, size in files:
+                # Every indexed file has one of the endpoint extensions
+                hook_id = id_prefix + name[:name.rindex('.')]
+                entries.append((base + prefix + name, hook_id, mtime_ns, size))
+        entries.sort(key=lambda entry: entry[1])
+        return entries
@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import select
+import asyncio
+import threading
+
+# inotify event flags (see inotify(7))
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+
+class Inotify:
+    """Minimal ctypes binding to Linux inotify, used only to wake up when a directory changes."""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def watch_tree(self, top):
+        """Watch top and every directory below it.
+
+        Watching a directory that is already watched is a no-op, so this is
+        simply called again after each change to pick up new subdirectories.
+        """
+        for root, dirs, _ in os.walk(top):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            self.libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+
+    def drain(self):
+        """Discard queued events; the watcher rescans instead of decoding them."""
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class EndpointWatcher:
+    """Reports endpoint files added, changed or removed since the last check.
+
+    Sleeps on inotify where it is available and falls back to rescanning every
+    poll_interval seconds. list_files is the function that lists the endpoint
+    files (start_server.get_endpoint_files), so the watcher sees exactly the
+    files that would be served. A manual watcher only wakes up when wake() is
+    called, e.g. for a "reload" control command.
+    """
+
+    def __init__(self, endpoints_dir, list_files, poll_interval=1.0, debounce=0.2, manual=False):
+        self.endpoints_dir = endpoints_dir
+        self.list_files = list_files
+        self.poll_interval = poll_interval
+        # Editors often write a file in several steps, so wait for them to settle
+        self.debounce = debounce
+        self.manual = manual
+        self.snapshot = self.scan()
+        self.woken = threading.Event()
+        # Lets wake() interrupt a select() or the event loop where pipes can be waited on
+        self.wake_fds = None
+        if os.name != 'nt':
+            self.wake_fds = os.pipe()
+            os.set_blocking(self.wake_fds[0], False)
+
+        self.inotify = None
+        if not manual and sys.platform.startswith("linux"):
+            try:
+                self.inotify = Inotify()
+                self.inotify.watch_tree(endpoints_dir)
+            except (OSError, AttributeError):
+                self.inotify = None
+
+    @property
+    def mode(self):
+        if self.manual:
+            return "on reload only"
+        return "inotify" if self.inotify else f"polling every {self.poll_interval:g}s"
+
+    def wake(self):
+        """Make wait() return now so the endpoints are rescanned. Safe to call from a signal handler."""
+        self.woken.set()
+        if self.wake_fds:
+            os.write(self.wake_fds[1], b"x")
+
+    def clear_wake(self):
+        self.woken.clear()
+        if self.wake_fds:
+            try:
+                while os.read(self.wake_fds[0], 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def scan(self):
+        """Get {path: (mtime_ns, size)} for every endpoint file."""
+        snapshot = {}
+        for path in self.list_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout=None):
+        """Block until the endpoints may have changed. Returns False if timeout seconds pass first."""
+        if self.inotify is None:
+            interval = None if self.manual else self.poll_interval
+            if timeout is not None:
+                interval = timeout if interval is None else min(timeout, interval)
+            woken = self.woken.wait(interval)
+            self.clear_wake()
+            return woken or not self.manual
+        ready, _, _ = select.select([self.inotify.fd, self.wake_fds[0]], [], [], timeout)
+        if not ready:
+            return False
+        if self.inotify.fd in ready:
+            time.sleep(self.debounce)
+            self.inotify.drain()
+        self.clear_wake()
+        return True
+
+    async def wait_async(self):
+        """Like wait(), without blocking the event loop."""
+        if self.wake_fds is None:
+            # No pipe the event loop can wait on (Windows), so look for wake() in between
+            waited = 0.0
+            while not self.woken.is_set() and (self.manual or waited < self.poll_interval):
+                await asyncio.sleep(0.5)
+                waited += 0.5
+            self.clear_wake()
+            return
+        if self.inotify is None and not self.manual:
+            await asyncio.sleep(self.poll_interval)
+            self.clear_wake()
+            return
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        fds = [self.wake_fds[0]] + ([self.inotify.fd] if self.inotify else [])
+        for fd in fds:
+            loop.add_reader(fd, ready.set)
+        try:
+            await ready.wait()
+        finally:
+            for fd in fds:
+                loop.remove_reader(fd)
+        if self.inotify and not self.woken.is_set():
+            await asyncio.sleep(self.debounce)
+            self.inotify.drain()
+        self.clear_wake()
+
+    def changes(self):
+        """Rescan and return (added, changed, removed) lists of endpoint paths."""
+        if self.inotify:
+            self.inotify.watch_tree(self.endpoints_dir)
+        snapshot = self.scan()
+        added = [path for path in snapshot if path not in self.snapshot]
+        removed = [path for path in self.snapshot if path not in snapshot]
+        changed = [path for path in snapshot
+                   if path in self.snapshot and snapshot[path] != self.snapshot[path]]
+        self.snapshot = snapshot
+        return added, changed, removed
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+        if self.wake_fds:
+            for fd in self.wake_fds:
+                os.close(fd)
+            self.wake_fds = None
@@ -1,7 +1,12 @@
 import sys
 
-# Read data from stdin
-input_data = sys.stdin.read()
+def handler(body):
+    """Echo the request body back, used directly by the warm worker pool."""
+    return f"Input: {body.decode()}\n"
 
-# Print the greeting
-print(f"Input: {input_data}") 
\ No newline at end of file
+if __name__ == "__main__":
+    # Read data from stdin
+    input_data = sys.stdin.read()
+
+    # Print the greeting
+    print(f"Input: {input_data}")
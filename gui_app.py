@@ -2,9 +2,9 @@ import tkinter as tk
 from tkinter import messagebox, filedialog
 import threading
 import time
-import random
 import json
 import os
+import queue
 
 # Try to import tray dependencies, fallback if not available
 try:
@@ -14,11 +14,22 @@ try:
 except ImportError:
     TRAY_AVAILABLE = False
 
+from live_stats import LiveStats
+from log_pipeline import read_tail
+
+# Seconds between refreshes of the live panel, and between log reads while hidden to the tray
+LIVE_REFRESH_INTERVAL = 1
+HIDDEN_REFRESH_INTERVAL = 15
+# Endpoints shown in the live panel, busiest first
+LIVE_ROWS = 5
+# Lines shown in the log window
+LOG_TAIL_LINES = 500
+
 class EasyAPIGUI:
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Easy API Endpoints")
-        self.root.geometry("300x200")
+        self.root.geometry("300x338")
         self.root.resizable(False, False)
         self.root.protocol("WM_DELETE_WINDOW", self.on_main_window_close)
         
@@ -28,10 +39,15 @@ class EasyAPIGUI:
         self.endpoint_count = 0
         self.port = 9000
         self.uptime_start = None
-        self.request_count = 0
+        self.live_stats = None  # LiveStats for the running server
+        self.last_log_read = 0
+        self.log_read_pending = False  # Whether new log lines are being read in the background
+        self.refresh_job = None  # Pending Tk after() call for refresh_live
+        self.refresh_count = 0
         self.status_index = 0
         self.status_cycling = True
         self.open_dialogs = []  # Track open modal dialogs
+        self.log_window = None  # Log tail window, if open
         self.server_process = None  # Track server process
         self.tray_icon = None  # System tray icon
         self.is_minimized_to_tray = False
@@ -157,6 +173,10 @@ class EasyAPIGUI:
         )
         self.status_label.pack(fill="both", expand=True)
         
+        # Live panel (below): requests/s, error rate and p95 latency per endpoint
+        self.live_canvas = tk.Canvas(main_frame, bg="#232323", highlightthickness=0)
+        self.live_canvas.place(x=0, y=190, width=284, height=132)
+        
     def toggle_server(self):
         """Toggle server start/stop"""
         if not self.server_running:
@@ -191,28 +211,31 @@ class EasyAPIGUI:
                     creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
                 )
                 
-                # Give it a moment to start
-                time.sleep(3)
+                # Wait for the server to report that it is accepting connections
+                ready, output = self.wait_for_server_ready(self.server_process)
                 
                 # Check if process started successfully
-                if self.server_process.poll() is None:
+                if ready:
                     self.server_running = True
                     self.server_status = "RUNNING"
                     self.uptime_start = time.time()
                     self.endpoint_count = self.count_endpoint_files()
-                    self.request_count = 0
+                    self.live_stats = LiveStats("webhook.log", self.get_url_prefix())
                     
                     self.start_stop_button.config(text="⏸", bg="#4a6a4a")  # Desaturated green
                     self.update_status_messages()
                 else:
-                    # Server failed to start - get error output
-                    stdout, stderr = self.server_process.communicate()
-                    error_msg = stdout or stderr or "Unknown error"
+                    # Server failed to start (or never became ready) - report its output
+                    timed_out = self.server_process.poll() is None
+                    if timed_out:
+                        self.server_process.terminate()
+                    self.server_process.wait()
+                    error_msg = "".join(output) or "Unknown error"
                     
                     self.server_running = False
                     self.server_status = "FAILED"
                     self.start_stop_button.config(text="▶", bg="#6a4a4a")
-                    self.update_status_display("START FAILED", "red")
+                    self.update_status_display("START TIMEOUT" if timed_out else "START FAILED", "red")
                     print(f"Server startup failed with exit code {self.server_process.returncode}")
                     print(f"Error output: {error_msg}")
                     
@@ -225,6 +248,41 @@ class EasyAPIGUI:
             
         threading.Thread(target=startup, daemon=True).start()
         
+    def wait_for_server_ready(self, process, timeout=30):
+        """Wait for start_server.py to print its "Server ready" line.
+
+        Returns (ready, output lines so far). The server's output keeps being
+        read in the background afterwards so its pipe never fills up, but is
+        thrown away once this returns.
+        """
+        lines = queue.Queue()
+        done = threading.Event()
+        
+        def pump():
+            for line in process.stdout:
+                if not done.is_set():
+                    lines.put(line)
+            lines.put(None)
+            
+        threading.Thread(target=pump, daemon=True).start()
+        
+        output = []
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    line = lines.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    return False, output
+                if line is None:
+                    return False, output
+                output.append(line)
+                if line.startswith("Server ready"):
+                    print(line.rstrip())
+                    return True, output
+        finally:
+            done.set()
+    
     def stop_server(self):
         """Stop the server"""
         self.server_status = "STOPPING..."
@@ -234,15 +292,18 @@ class EasyAPIGUI:
         # Stop actual server process
         def shutdown():
             try:
+                import subprocess
+                
                 if self.server_process and self.server_process.poll() is None:
-                    # Terminate the process
-                    self.server_process.terminate()
-                    
-                    # Give it time to terminate gracefully
-                    time.sleep(1)
+                    # Ask the server to stop through its control socket, so it stops its
+                    # children itself; terminate it if it doesn't answer
+                    if not self.send_control("stop"):
+                        self.server_process.terminate()
                     
-                    # Force kill if it's still running
-                    if self.server_process.poll() is None:
+                    # Give it time to terminate gracefully, force kill if it's still running
+                    try:
+                        self.server_process.wait(timeout=5)
+                    except subprocess.TimeoutExpired:
                         self.server_process.kill()
                         self.server_process.wait()
                 
@@ -250,6 +311,7 @@ class EasyAPIGUI:
                 self.server_status = "STOPPED"
                 self.uptime_start = None
                 self.server_process = None
+                self.live_stats = None
                 
                 self.start_stop_button.config(text="▶", bg="#6a4a4a")  # Back to desaturated red
                 self.update_status_messages()
@@ -259,6 +321,7 @@ class EasyAPIGUI:
                 self.server_status = "STOPPED"
                 self.uptime_start = None
                 self.server_process = None
+                self.live_stats = None
                 self.start_stop_button.config(text="▶", bg="#6a4a4a")
                 self.update_status_messages()
                 print(f"Error stopping server: {e}")
@@ -268,21 +331,17 @@ class EasyAPIGUI:
     def count_endpoint_files(self):
         """Count the number of endpoint files in the endpoints directory"""
         try:
-            import glob
             import os
+            from endpoint_index import EndpointIndex
             
             endpoints_dir = getattr(self, 'endpoints_path', './endpoints')
             if not os.path.exists(endpoints_dir):
                 return 0
                 
-            extensions = ['*.py', '*.sh', '*.bat', '*.ps1']
-            count = 0
-            
-            for ext in extensions:
-                pattern = os.path.join(endpoints_dir, '**', ext)
-                files = glob.glob(pattern, recursive=True)
-                count += len(files)
-                
+            # Shares the index start_server.py keeps, so usually nothing is rescanned
+            index = EndpointIndex(os.path.abspath(endpoints_dir), "endpoints.index")
+            count = len(index.refresh())
+            index.save()
             return count
         except:
             return 0
@@ -291,12 +350,16 @@ class EasyAPIGUI:
         """Update the status messages based on server state"""
         if self.server_running:
             uptime_str = self.get_uptime_string()
+            live_stats = self.live_stats
+            total = live_stats.total_requests() if live_stats else 0
+            rate = sum(entry["rps"] for entry in live_stats.summary()) if live_stats else 0.0
             self.status_messages = [
                 ("SERVER RUNNING", "#66ff66"),  # Soft green
                 (f"{self.endpoint_count} ENDPOINTS", "#66ff66"),
                 (f"PORT {self.port}", "#66ff66"),
                 (uptime_str, "#66ff66"),
-                (f"REQUESTS {self.request_count}", "#66ff66")
+                (f"REQUESTS {total}", "#66ff66"),
+                (f"{rate:.1f} REQ/S", "#66ff66")
             ]
         else:
             self.status_messages = [
@@ -313,29 +376,127 @@ class EasyAPIGUI:
         uptime_seconds = int(time.time() - self.uptime_start)
         hours = uptime_seconds // 3600
         minutes = (uptime_seconds % 3600) // 60
+        seconds = uptime_seconds % 60
         
         if hours > 0:
-            return f"UPTIME {hours}:{minutes:02d}"
+            return f"UPTIME {hours}:{minutes:02d}:{seconds:02d}"
         else:
-            return f"UPTIME {minutes}:00"
+            return f"UPTIME {minutes}:{seconds:02d}"
+            
+    def get_url_prefix(self):
+        """Get the URL prefix hooks are served under, to recognise them in the log"""
+        try:
+            from start_server import CONFIG
+            return CONFIG.get("urlprefix", "hooks")
+        except ImportError:
+            return "hooks"
+            
+    def is_hidden(self):
+        """Check whether the window is hidden to the tray or minimized"""
+        return self.is_minimized_to_tray or self.root.state() in ("iconic", "withdrawn")
             
     def start_status_cycling(self):
-        """Start the status cycling thread"""
-        def cycle_status():
-            while True:
+        """Start refreshing the live panel and cycling the status line on the Tk event loop"""
+        self.refresh_job = self.root.after(LIVE_REFRESH_INTERVAL * 1000, self.refresh_live)
+        
+    def refresh_live(self):
+        """Read new requests from the log and redraw.
+
+        While the window is hidden nothing is drawn and the log is only read every
+        HIDDEN_REFRESH_INTERVAL seconds.
+        """
+        hidden = self.is_hidden()
+        now = time.monotonic()
+        live_stats = self.live_stats
+        if live_stats and not self.log_read_pending and (
+                not hidden or now - self.last_log_read >= HIDDEN_REFRESH_INTERVAL):
+            self.log_read_pending = True
+            self.last_log_read = now
+            self.run_in_background(live_stats.tailer.read_lines,
+                                   lambda lines: self.add_log_lines(live_stats, lines))
+            
+        if not hidden:
+            self.refresh_count += 1
+            # The status line moves on every 3 seconds
+            if self.refresh_count % 3 == 0:
+                if self.server_running:
+                    self.update_status_messages()
                 if self.status_cycling and len(self.status_messages) > 1:
                     self.status_index = (self.status_index + 1) % len(self.status_messages)
                     message, color = self.status_messages[self.status_index]
                     self.update_status_display(message, color)
-                    
-                    # Update request count occasionally
-                    if self.server_running and random.random() < 0.3:
-                        self.request_count += random.randint(1, 3)
-                        self.update_status_messages()
-                        
-                time.sleep(3)  # Cycle every 3 seconds
+            self.draw_live_panel()
+            
+        interval = HIDDEN_REFRESH_INTERVAL if hidden else LIVE_REFRESH_INTERVAL
+        self.refresh_job = self.root.after(interval * 1000, self.refresh_live)
+        
+    def add_log_lines(self, live_stats, lines):
+        """Count the log lines read in the background, unless the server has been restarted since"""
+        self.log_read_pending = False
+        if lines and live_stats is self.live_stats:
+            live_stats.add_lines(lines)
+            
+    def run_in_background(self, work, done):
+        """Run work() on a worker thread, then hand its result (None if it failed) to done() on the Tk thread"""
+        def run():
+            try:
+                result = work()
+            except Exception as e:
+                print(f"Error in background task: {e}")
+                result = None
+            try:
+                self.root.after(0, done, result)
+            except (tk.TclError, RuntimeError):
+                pass  # The window was closed meanwhile
                 
-        threading.Thread(target=cycle_status, daemon=True).start()
+        threading.Thread(target=run, daemon=True).start()
+        
+    def draw_live_panel(self):
+        """Draw a row per busy endpoint: rate, error rate, p95 and their sparklines"""
+        canvas = self.live_canvas
+        canvas.delete("all")
+        live_stats = self.live_stats
+        if not live_stats:
+            canvas.create_text(142, 66, text="SERVER STOPPED", fill="#888888", font=("Arial", 9))
+            return
+        summary = live_stats.summary()[:LIVE_ROWS]
+        if not summary:
+            canvas.create_text(142, 66, text="NO REQUESTS YET", fill="#888888", font=("Arial", 9))
+            return
+        
+        canvas.create_text(2, 6, text="ENDPOINT", anchor="w", fill="#888888", font=("Arial", 7))
+        canvas.create_text(66, 6, text="REQ/S  ERR  P95", anchor="w", fill="#888888", font=("Arial", 7))
+        canvas.create_text(282, 6, text="LAST 60S", anchor="e", fill="#888888", font=("Arial", 7))
+        for row, entry in enumerate(summary):
+            y = 14 + row * 24
+            p95_ms = entry["p95"] * 1000
+            p95 = f"{p95_ms:.0f}ms" if p95_ms < 1000 else f"{entry['p95']:.1f}s"
+            error_color = "#ff6666" if entry["error_rate"] > 0 else "#e0e0e0"
+            canvas.create_text(2, y + 10, text=entry["endpoint"][:11], anchor="w", fill="#e0e0e0", font=("Arial", 8))
+            canvas.create_text(66, y + 10, text=f"{entry['rps']:.1f}", anchor="w", fill="#66ff66", font=("Arial", 8))
+            canvas.create_text(98, y + 10, text=f"{entry['error_rate'] * 100:.0f}%", anchor="w", fill=error_color,
+                               font=("Arial", 8))
+            canvas.create_text(124, y + 10, text=p95, anchor="w", fill="#ffaa66", font=("Arial", 8))
+            
+            # Sparklines: errors as red bars, requests/s in green, p95 in orange
+            x, width, height = 180, 102, 20
+            errors = entry["error_series"]
+            peak = max(errors) or 1
+            for i, count in enumerate(errors):
+                if count:
+                    bar_x = x + i * width / len(errors)
+                    canvas.create_line(bar_x, y + height, bar_x, y + height - count / peak * height, fill="#aa4444")
+            self.draw_sparkline(entry["rps_series"], x, y, width, height, "#66ff66")
+            self.draw_sparkline(entry["p95_series"], x, y, width, height, "#ffaa66")
+            
+    def draw_sparkline(self, values, x, y, width, height, color):
+        """Draw values as a line scaled to fill the given box"""
+        peak = max(values) or 1
+        step = width / max(len(values) - 1, 1)
+        points = []
+        for i, value in enumerate(values):
+            points.extend((x + i * step, y + height - value / peak * height))
+        self.live_canvas.create_line(*points, fill=color)
         
     def update_status_display(self, text, color):
         """Update the status label"""
@@ -382,7 +543,65 @@ class EasyAPIGUI:
             messagebox.showerror("Error", f"Endpoints folder '{endpoints_path}' not found!")
         
     def open_logs(self):
-        """Open logs in default editor"""
+        """Show the end of the log, following it while the window is open"""
+        if self.log_window is not None:
+            self.log_window.deiconify()
+            self.log_window.lift()
+            return
+            
+        log_window = tk.Toplevel(self.root)
+        log_window.title("Logs - webhook.log")
+        log_window.geometry("720x400")
+        log_window.configure(bg=self.bg_color)
+        self.log_window = log_window
+        
+        button_frame = tk.Frame(log_window, bg=self.bg_color)
+        button_frame.pack(side="bottom", fill="x", padx=6, pady=6)
+        tk.Button(button_frame, text="Open file", command=self.open_log_file,
+                 bg="#6a6a4a", fg="#e0e0e0", border=0, padx=12).pack(side="right")
+        
+        text = tk.Text(log_window, bg="#1e1e1e", fg="#e0e0e0", font=("Consolas", 9), wrap="none", border=0)
+        scrollbar = tk.Scrollbar(log_window, command=text.yview)
+        text.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        text.pack(fill="both", expand=True)
+        
+        shown = [None]
+        
+        def refresh():
+            if self.log_window is not log_window:
+                return
+            # Asking the server can take a while, so the window is only updated once the lines are in
+            self.run_in_background(fetch, show)
+            
+        def fetch():
+            # The server's in-memory tail if it has one, else read back from the end of the file
+            response = self.send_control("logs", lines=LOG_TAIL_LINES) if self.server_running else None
+            return response["lines"] if response else read_tail("webhook.log", LOG_TAIL_LINES)
+            
+        def show(lines):
+            if self.log_window is not log_window:
+                return
+            if lines != shown[0]:
+                shown[0] = lines
+                at_bottom = text.yview()[1] >= 1.0
+                text.config(state="normal")
+                text.delete("1.0", "end")
+                text.insert("end", "\n".join(lines) if lines else "webhook.log is empty or missing")
+                text.config(state="disabled")
+                if at_bottom:
+                    text.see("end")
+            log_window.after(LIVE_REFRESH_INTERVAL * 1000, refresh)
+            
+        def close():
+            self.log_window = None
+            log_window.destroy()
+            
+        log_window.protocol("WM_DELETE_WINDOW", close)
+        refresh()
+        
+    def open_log_file(self):
+        """Open the whole log in the default editor"""
         import subprocess
         import os
         
@@ -396,11 +615,8 @@ class EasyAPIGUI:
                     # Fallback to notepad (can usually read locked files)
                     subprocess.run(["notepad", log_path], check=True)
                 except (subprocess.CalledProcessError, FileNotFoundError):
-                    # If still locked, show a helpful message
-                    messagebox.showwarning("File Locked", 
-                        f"The log file is currently locked by the running server.\n"
-                        f"You can view it at: {os.path.abspath(log_path)}\n"
-                        f"Try stopping the server first, or use a text editor that can read locked files.")
+                    messagebox.showwarning("Could Not Open Log",
+                        f"You can view it at: {os.path.abspath(log_path)}")
         else:
             messagebox.showerror("Error", f"Log file '{log_path}' not found!")
     
@@ -629,7 +845,7 @@ class EasyAPIGUI:
             pystray.MenuItem("Stop Server", self.tray_stop_server, enabled=lambda item: self.server_running),
             pystray.Menu.SEPARATOR,
             pystray.MenuItem("Open Endpoints", self.open_folder),
-            pystray.MenuItem("Open Logs", self.open_logs),
+            pystray.MenuItem("Open Logs", lambda icon, item: self.root.after(0, self.open_logs)),
             pystray.Menu.SEPARATOR,
             pystray.MenuItem("Quit", self.quit_app)
         )
@@ -642,6 +858,10 @@ class EasyAPIGUI:
         self.root.lift()
         self.root.focus_force()
         self.is_minimized_to_tray = False
+        # Catch up straight away instead of at the next slow hidden refresh
+        if self.refresh_job:
+            self.root.after_cancel(self.refresh_job)
+        self.refresh_job = self.root.after(0, self.refresh_live)
     
     def hide_to_tray(self):
         """Hide window to system tray"""
@@ -688,21 +908,29 @@ class EasyAPIGUI:
         # Otherwise, quit the application
         self.quit_application()
     
+    def send_control(self, command, **arguments):
+        """Send a command to the running server, returning its response or None if it can't be reached"""
+        try:
+            from start_server import send_control_command
+            _, response = send_control_command(command, **arguments)
+        except ImportError:
+            return None
+        return response if response and response.get("ok") else None
+    
     def quit_application(self):
         """Actually quit the application with cleanup"""
-        # Kill ALL webhook processes to prevent orphans
+        if self.server_process and self.server_process.poll() is None and self.send_control("stop"):
+            try:
+                self.server_process.wait(timeout=5)
+            except Exception:
+                pass
+        
+        # Stop every process the server started (by PID) to prevent orphans
         try:
-            import psutil
-            for proc in psutil.process_iter(['pid', 'name']):
-                if 'webhook' in proc.info['name'].lower():
-                    try:
-                        process = psutil.Process(proc.info['pid'])
-                        process.terminate()
-                        print(f"Terminated webhook process with PID {proc.info['pid']}")
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        pass
+            from start_server import kill_server_processes
+            kill_server_processes()
         except ImportError:
-            # Fallback if psutil not available
+            # Fallback if psutil or yaml is not available
             pass
         
         # Stop the server process if running
@@ -0,0 +1,1229 @@
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+from http import HTTPStatus
+from urllib.parse import urlsplit
+from start_server import (CONFIG, ENDPOINTS_DIR, WORKING_DIR, POOL_SOCKET, get_hook_id,
+                          get_endpoint_options, is_streaming, is_persistent, build_endpoint_command,
+                          get_payload_staging_dir, get_max_request_size, SCRIPT_DIR, BATCH_HOOK_ID)
+from response_cache import ResponseCache
+from limits import ConcurrencyLimiter, Overloaded, PRIORITIES
+from pool_client import EndpointTimeout
+from metrics import Metrics
+from tracing import create_tracer, REQUEST_ID_ENV, REQUEST_ID_HEADER
+from jobs import AsyncJobStore, JobOutput, DONE, FAILED, TIMEOUT, FINISHED
+from compression import Decoder, DecodeError, BodyTooLarge, negotiate, create_encoder, ENCODERS
+
+# Seconds an idle keep-alive connection is held open before it is closed
+KEEPALIVE_TIMEOUT = 75
+# Longest request line or header line we accept
+MAX_LINE_SIZE = 64 * 1024
+# Size of the pieces bodies are streamed in
+CHUNK_SIZE = 64 * 1024
+# Built-in routes for following async jobs: /_jobs/<id>, /_jobs/<id>/result and /_jobs/<id>/stream
+JOBS_PREFIX = "/_jobs/"
+# Seconds between checks for jobs queued by other server instances
+JOB_POLL_INTERVAL = 1.0
+# Status codes whose responses never carry a body to compress
+BODYLESS_STATUSES = (204, 304)
+
+
+class Route:
+    """A single endpoint reachable at /<prefix>/<hook_id>."""
+
+    def __init__(self, endpoint_file):
+        self.script_path = os.path.abspath(endpoint_file)
+        self.relative_path = os.path.relpath(endpoint_file, ENDPOINTS_DIR).replace('\\', '/')
+        self.hook_id = get_hook_id(endpoint_file)
+        self.command = build_endpoint_command(self.script_path)
+        self.options = get_endpoint_options(self.hook_id)
+        # Persistent endpoints answer in whole frames, so they are never streamed
+        self.persistent = is_persistent(self.hook_id) and hasattr(os, "fork")
+        self.stream = is_streaming(self.hook_id) and not self.persistent
+        # Run by the worker pool on the same terms as in the manifest webhook mode uses
+        pool_config = CONFIG.get("worker_pool") or {}
+        self.pool = self.persistent or (pool_config.get("enabled", False) and hasattr(os, "fork")
+                                        and self.script_path.endswith(".py") and not self.stream
+                                        and self.hook_id not in pool_config.get("exclude", []))
+        cache_config = CONFIG.get("response_cache") or {}
+        self.cache_ttl = 0 if self.stream else self.options.get("cache_ttl", 0)
+        self.cache_vary = self.options.get("cache_vary", cache_config.get("vary_headers", []))
+        self.coalesce = not self.stream and self.options.get("coalesce", False)
+        self.max_concurrency = self.options.get("max_concurrency", 0)
+        self.max_queue = self.options.get("max_queue", 0)
+        self.priority = self.options.get("priority", "interactive")
+        self.timeout = self.options.get("timeout", CONFIG.get("endpoint_timeout", 0))
+        self.run_async = self.options.get("async", False)
+        self.compress = self.options.get("compress", True)
+        # Part of the cache key, so editing the script invalidates its cached responses
+        try:
+            self.version = os.stat(self.script_path).st_mtime_ns
+        except OSError:
+            self.version = 0
+
+
+class BodyReader:
+    """Reads a request body incrementally, whether sized or chunked.
+
+    Bodies sent with a Content-Encoding are decompressed as they are read, so
+    handlers only ever see the original bytes.
+    """
+
+    def __init__(self, reader, writer, headers):
+        self.reader = reader
+        self.writer = writer
+        self.chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        self.expect_continue = headers.get("expect", "").lower() == "100-continue"
+        self.chunk_left = 0
+        self.max_size = get_max_request_size()
+        self.received = 0
+        content_length = headers.get("content-length", "0").strip()
+        # int() would also take signs, spaces and underscores
+        if not self.chunked and not (content_length.isascii() and content_length.isdigit()):
+            raise BadRequest("Malformed Content-Length")
+        self.remaining = 0 if self.chunked else int(content_length)
+        if self.max_size and self.remaining > self.max_size:
+            raise BadRequest(f"Request body is larger than {self.max_size} bytes", 413)
+        self.done = not self.chunked and self.remaining == 0
+        self.decoder = None
+        encoding = headers.get("content-encoding", "").strip().lower()
+        if encoding and encoding != "identity":
+            try:
+                self.decoder = Decoder(encoding, self.max_size)
+            except ValueError as e:
+                raise BadRequest(str(e), 415)
+
+    async def read_chunk(self):
+        """Read the next piece of the body, or b"" once it has been fully read."""
+        if self.decoder is None:
+            return await self.read_raw_chunk()
+        try:
+            while True:
+                data = await self.read_raw_chunk()
+                if not data:
+                    if not self.decoder.finished():
+                        raise BadRequest(f"Truncated {self.decoder.encoding} body")
+                    return b""
+                # A piece can decompress to nothing until more input arrives
+                data = self.decoder.decompress(data)
+                if data:
+                    return data
+        except BodyTooLarge as e:
+            raise BadRequest(str(e), 413)
+        except DecodeError as e:
+            raise BadRequest(str(e))
+
+    async def read_raw_chunk(self):
+        """Read the next piece of the body as sent by the client."""
+        if self.done:
+            return b""
+        if self.expect_continue:
+            # curl and friends wait for this before sending bodies over 1 KiB
+            self.expect_continue = False
+            self.writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+        if not self.chunked:
+            data = await self.reader.read(min(self.remaining, CHUNK_SIZE))
+            if not data:
+                raise asyncio.IncompleteReadError(b"", self.remaining)
+            self.remaining -= len(data)
+            self.done = self.remaining == 0
+            return data
+
+        if self.chunk_left == 0:
+            size_line = await self.reader.readline()
+            try:
+                self.chunk_left = int(size_line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise BadRequest("Malformed chunk size")
+            if self.chunk_left < 0:
+                raise BadRequest("Malformed chunk size")
+            if self.chunk_left == 0:
+                # Skip any trailers up to the terminating blank line
+                while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                self.done = True
+                return b""
+
+        data = await self.reader.read(min(self.chunk_left, CHUNK_SIZE))
+        if not data:
+            raise asyncio.IncompleteReadError(b"", self.chunk_left)
+        # A chunked body's size is only known once it has been read
+        self.received += len(data)
+        if self.max_size and self.received > self.max_size:
+            raise BadRequest(f"Request body is larger than {self.max_size} bytes", 413)
+        self.chunk_left -= len(data)
+        if self.chunk_left == 0:
+            await self.reader.readexactly(2)
+        return data
+
+    async def chunks(self):
+        """Iterate over the remaining body pieces."""
+        while True:
+            data = await self.read_chunk()
+            if not data:
+                return
+            yield data
+
+    async def read_all(self):
+        """Read the whole remaining body into memory."""
+        return b"".join([data async for data in self.chunks()])
+
+    async def drain(self):
+        """Discard whatever the handler didn't read so the connection can be reused."""
+        async for _ in self.chunks():
+            pass
+
+
+class Request:
+    """A parsed HTTP request."""
+
+    def __init__(self, method, target, version, headers, body_reader):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        self.body_reader = body_reader
+        self.body = None
+        self.route = None
+        self.trace = None
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.query = parts.query
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    async def read_body(self):
+        """Read and cache the whole request body."""
+        if self.body is None:
+            self.body = await self.body_reader.read_all()
+        return self.body
+
+
+class Response:
+    """An HTTP response with a fully buffered body."""
+
+    def __init__(self, status, body=b"", headers=None):
+        self.status = status
+        self.body = body if isinstance(body, bytes) else body.encode()
+        self.headers = headers or {}
+        self.headers.setdefault("Content-Type", "text/plain; charset=utf-8")
+
+
+class StreamingResponse(Response):
+    """An HTTP response whose body is produced incrementally by an async iterator.
+
+    Trailers set while the body is produced are sent after the last chunk.
+    """
+
+    def __init__(self, status, body_iter, headers=None):
+        super().__init__(status, b"", headers)
+        self.body_iter = body_iter
+        self.trailers = {}
+
+
+class BadRequest(Exception):
+    """Raised when a request cannot be parsed."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def stage_payload(payload, staging_dir):
+    """Put a request body in an in-memory file and return a descriptor positioned at its start.
+
+    Uses memfd_create where available, otherwise an unlinked file in the tmpfs
+    staging directory.
+    """
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("payload", os.MFD_CLOEXEC)
+    else:
+        import tempfile
+        fd, path = tempfile.mkstemp(dir=staging_dir)
+        os.unlink(path)
+    view = memoryview(payload)
+    while view:
+        view = view[os.write(fd, view):]
+    os.lseek(fd, 0, os.SEEK_SET)
+    return fd
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self.inflight = {}
+        self.coalesced = 0
+
+    async def run(self, key, func):
+        """Await func(), or the already running call for the same key."""
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shield so one waiter going away doesn't cancel the shared call
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(func())
+        self.inflight[key] = future
+        future.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+
+def create_response_cache():
+    """Create the response cache from the response_cache section of the configuration."""
+    cache_config = CONFIG.get("response_cache") or {}
+    disk_dir = cache_config.get("disk_dir")
+    if disk_dir:
+        disk_dir = os.path.join(SCRIPT_DIR, disk_dir)
+    return ResponseCache(
+        max_entries=cache_config.get("max_entries", 1000),
+        max_bytes=cache_config.get("max_bytes", 64 * 1024 * 1024),
+        disk_dir=disk_dir,
+        disk_max_bytes=cache_config.get("disk_max_bytes", 512 * 1024 * 1024)
+    )
+
+
+def kill_process_tree(pid):
+    """Kill an endpoint and everything it started.
+
+    Endpoints are started in their own session, so on POSIX their process group
+    ID is their PID and killing the group also catches grandchildren.
+    """
+    if os.name == "nt":
+        import subprocess
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(pid)], capture_output=True)
+        return
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def spawn(route, stdin, request_id=None):
+    """Start an endpoint process in its own process group, passing it the request ID if there is one."""
+    env = None
+    if request_id:
+        env = dict(os.environ)
+        env[REQUEST_ID_ENV] = request_id
+    return await asyncio.create_subprocess_exec(
+        *route.command,
+        stdin=stdin,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=WORKING_DIR,
+        env=env,
+        start_new_session=os.name != "nt"
+    )
+
+
+def create_limiter():
+    """Create the concurrency limiter from the limits section of the configuration."""
+    limits_config = CONFIG.get("limits") or {}
+    return ConcurrencyLimiter(
+        max_concurrency=limits_config.get("max_concurrency", 0),
+        max_queue=limits_config.get("max_queue", 100),
+        queue_timeout=limits_config.get("queue_timeout", 30),
+        retry_after=limits_config.get("retry_after", 1)
+    )
+
+
+def build_routes(endpoint_files):
+    """Build the route table, keyed by the same hook IDs generate_hook_config uses."""
+    return {route.hook_id: route for route in map(Route, endpoint_files)}
+
+
+async def read_request(request_line, reader, writer):
+    """Read a request's headers, or return None if the client went away.
+
+    The body is left on the connection and read through request.body_reader.
+    """
+    try:
+        method, target, version = request_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+    except ValueError:
+        raise BadRequest("Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n"):
+            break
+        if not line:
+            return None
+        name, sep, value = line.decode("latin-1").partition(":")
+        if not sep:
+            raise BadRequest("Malformed header line")
+        headers[name.strip().lower()] = value.strip()
+
+    return Request(method, target, version, headers, BodyReader(reader, writer, headers))
+
+
+def format_head(status, headers):
+    """Format the status line and headers of a response."""
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ""
+    head = [f"HTTP/1.1 {status} {reason}"]
+    for name, value in headers.items():
+        head.append(f"{name}: {value}")
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+
+
+async def compress_stream(body_iter, encoder):
+    """Compress a streamed body, flushing after every piece so clients see output as it's produced."""
+    async for data in body_iter:
+        data = encoder.compress(data, flush=True)
+        # An empty chunk would end a chunked body early
+        if data:
+            yield data
+    data = encoder.finish()
+    if data:
+        yield data
+
+
+async def write_response(writer, response, request, keep_alive):
+    """Serialize a response onto the connection. Returns whether the connection can be reused.
+
+    A response to HEAD gets the headers a GET would, and no body.
+    """
+    headers = dict(response.headers)
+    head_only = request is not None and request.method == "HEAD"
+
+    if not isinstance(response, StreamingResponse):
+        headers["Content-Length"] = str(len(response.body))
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        writer.write(format_head(response.status, headers) + (b"" if head_only else response.body))
+        await writer.drain()
+        return keep_alive
+
+    # HTTP/1.0 clients don't understand chunked encoding, so end the body by closing
+    chunked = request.version != "HTTP/1.0"
+    keep_alive = keep_alive and chunked
+    if chunked:
+        headers["Transfer-Encoding"] = "chunked"
+        headers["Trailer"] = "X-Exit-Code"
+    headers["Connection"] = "keep-alive" if keep_alive else "close"
+    writer.write(format_head(response.status, headers))
+
+    if head_only:
+        # Still run the endpoint to the end, as the response's headers describe
+        async for _ in response.body_iter:
+            pass
+        await writer.drain()
+        return keep_alive
+
+    async for data in response.body_iter:
+        if chunked:
+            writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+        else:
+            writer.write(data)
+        await writer.drain()
+
+    if chunked:
+        trailers = "".join(f"{name}: {value}\r\n" for name, value in response.trailers.items())
+        writer.write(b"0\r\n" + trailers.encode("latin-1") + b"\r\n")
+        await writer.drain()
+    return keep_alive
+
+
+class EndpointServer:
+    """Asyncio HTTP/1.1 server that runs endpoint scripts directly."""
+
+    def __init__(self, routes, prefix="hooks"):
+        self.routes = routes
+        self.prefix = f"/{prefix}/" if prefix else "/"
+        self.pool_fallback = (CONFIG.get("worker_pool") or {}).get("fallback_spawn", True)
+        self.staging_dir = get_payload_staging_dir()
+        self.cache = create_response_cache()
+        self.single_flight = SingleFlight()
+        self.limiter = create_limiter()
+        self.metrics = Metrics()
+        self.tracer = create_tracer(CONFIG.get("tracing"), SCRIPT_DIR)
+        self.compression = CONFIG.get("compression") or {}
+        self.jobs = None  # AsyncJobStore, opened the first time jobs are used
+        self.job_outputs = {}  # job ID -> JobOutput, for jobs running in this process
+        self.job_wakeup = asyncio.Event()
+        self.active_requests = 0
+        # Built-in routes answered without running any endpoint
+        self.internal_routes = {
+            "/_health": self.health_route,
+            "/_stats": self.stats_route,
+            "/metrics": self.metrics_route,
+        }
+
+    async def drain(self, timeout):
+        """Wait up to timeout seconds for requests being handled and jobs running here to finish."""
+        deadline = time.monotonic() + timeout
+        while (self.active_requests or self.job_outputs) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def watch(self, watcher, on_change=None):
+        """Keep the route table in step with the endpoint files.
+
+        The table is rebuilt and swapped in one assignment, so new requests see
+        either the old or the new routes, and requests already running keep the
+        Route they started with.
+        """
+        while True:
+            await watcher.wait_async()
+            added, changed, removed = watcher.changes()
+            if not (added or changed or removed):
+                continue
+            routes = dict(self.routes)
+            for path in removed:
+                routes.pop(get_hook_id(path), None)
+            for route in map(Route, added + changed):
+                routes[route.hook_id] = route
+            self.routes = routes
+            if on_change:
+                on_change(added, changed, removed)
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until it closes or goes idle."""
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                    if not request_line:
+                        break
+                    request = await read_request(request_line, reader, writer)
+                    if request is None:
+                        break
+                    started = time.monotonic()
+                    response = None
+                    self.active_requests += 1
+                    try:
+                        response = self.compress_response(request, await self.dispatch(request))
+                        written = time.monotonic()
+                        keep_alive = await write_response(writer, response, request, request.keep_alive)
+                    finally:
+                        self.active_requests -= 1
+                        if request.route:
+                            # Streamed responses count until their last chunk is sent
+                            self.metrics.request_finished(request.route.hook_id,
+                                                          response.status if response else 400,
+                                                          time.monotonic() - started)
+                        if request.trace:
+                            if response:
+                                request.trace.add("write", written)
+                            request.trace.add("total", started)
+                            request.trace.finish()
+                    if not keep_alive:
+                        break
+                    await request.body_reader.drain()
+                except BadRequest as e:
+                    await write_response(writer, Response(e.status, f"{e}\n"), None, False)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request):
+        """Route a request to its endpoint."""
+        internal_route = self.internal_routes.get(request.path)
+        if internal_route:
+            return await internal_route(request)
+        if request.path.startswith(JOBS_PREFIX):
+            return await self.jobs_route(request)
+        if not request.path.startswith(self.prefix):
+            return Response(404, "404 page not found\n")
+        hook_id = request.path[len(self.prefix):]
+        if hook_id == BATCH_HOOK_ID:
+            return await self.batch_route(request)
+        route = self.routes.get(hook_id)
+        if route is None:
+            return Response(404, "Hook not found.\n")
+        request.route = route
+        self.metrics.request_started(route.hook_id)
+        if self.tracer:
+            request.trace = self.tracer.start(request.headers.get(REQUEST_ID_HEADER.lower()), route.hook_id, "server")
+
+        response = await self.run_route(route, request)
+        if request.trace:
+            response.headers[REQUEST_ID_HEADER] = request.trace.request_id
+            if self.tracer.server_timing and request.trace.spans:
+                response.headers["Server-Timing"] = request.trace.server_timing()
+        return response
+
+    def compress_response(self, request, response):
+        """Compress a response body with the best encoding the client accepts.
+
+        Buffered bodies under compression.min_size are sent as they are;
+        streamed bodies are compressed piece by piece as they are produced.
+        HEAD requests go through this too, so their headers match a GET's.
+        """
+        if (not self.compression.get("enabled", True) or (request.route and not request.route.compress)
+                or response.status in BODYLESS_STATUSES
+                or "Content-Encoding" in response.headers):
+            return response
+        response.headers["Vary"] = "Accept-Encoding"
+        streaming = isinstance(response, StreamingResponse)
+        if not streaming and len(response.body) < self.compression.get("min_size", 1024):
+            return response
+        encoding = negotiate(request.headers.get("accept-encoding", ""),
+                             self.compression.get("encodings", list(ENCODERS)))
+        if encoding is None:
+            return response
+
+        encoder = create_encoder(encoding, (self.compression.get("levels") or {}).get(encoding))
+        if streaming:
+            response.body_iter = compress_stream(response.body_iter, encoder)
+        else:
+            response.body = encoder.compress(response.body) + encoder.finish()
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    async def run_route(self, route, request):
+        """Run an endpoint for a request, turning failures into error responses."""
+        try:
+            if route.run_async or "respond-async" in request.headers.get("prefer", "").lower():
+                return await self.enqueue_job(route, request)
+            if route.stream:
+                return await self.execute_streaming(route, request)
+            return await self.respond(route, request)
+        except (BadRequest, asyncio.IncompleteReadError):
+            raise
+        except Overloaded as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after else {}
+            return Response(e.status, f"{e}\n", headers)
+        except EndpointTimeout as e:
+            print(f"{route.relative_path}: {e}", file=sys.stderr)
+            return Response(504, f"{e}\n")
+        except Exception as e:
+            print(f"Error executing {route.relative_path}: {str(e)}", file=sys.stderr)
+            return Response(500, "Error occurred while executing the hook's command.\n")
+
+    async def respond(self, route, request):
+        """Run a buffered endpoint, serving it from the response cache when allowed.
+
+        Clients can skip the cache lookup with "Cache-Control: no-cache", or skip
+        the cache entirely with "Cache-Control: no-store".
+        """
+        started = time.monotonic()
+        payload = await request.read_body()
+        if request.trace:
+            request.trace.add("read_body", started)
+        cache_control = request.headers.get("cache-control", "").lower()
+        use_cache = route.cache_ttl > 0 and "no-store" not in cache_control
+
+        key = None
+        if use_cache or route.coalesce:
+            key = ResponseCache.make_key(f"{route.hook_id}@{route.version}", payload, request.headers,
+                                         route.cache_vary)
+        if use_cache and "no-cache" not in cache_control:
+            body = self.cache.get(key)
+            if body is not None:
+                return Response(200, body, {"X-Cache": "HIT"})
+
+        priority = self.request_priority(route, request)
+        deadline = self.request_deadline(request)
+        if route.coalesce:
+            # Identical requests already in flight share one run of the script
+            exit_code, stdout, _ = await self.single_flight.run(
+                key, lambda: self.run_endpoint(route, payload, priority, deadline, request.trace))
+        else:
+            exit_code, stdout, _ = await self.run_endpoint(route, payload, priority, deadline, request.trace)
+
+        # Only successful runs are cached, so a failing script is retried next time
+        if use_cache and exit_code == 0:
+            self.cache.put(key, stdout, route.cache_ttl)
+            return Response(200, stdout, {"X-Cache": "MISS"})
+        return Response(200 if exit_code == 0 else 500, stdout)
+
+    def request_priority(self, route, request):
+        """Get the priority class from the X-Priority header, falling back to the endpoint's."""
+        priority = request.headers.get("x-priority", "").lower()
+        return priority if priority in PRIORITIES else route.priority
+
+    def request_deadline(self, request):
+        """Get the client's X-Request-Deadline (Unix time in seconds) as a time.monotonic() value."""
+        value = request.headers.get("x-request-deadline")
+        if not value:
+            return None
+        try:
+            return time.monotonic() + float(value) - time.time()
+        except ValueError:
+            return None
+
+    def run_timeout(self, route, deadline):
+        """Get how long the endpoint may run for, from its timeout and the client's deadline."""
+        timeout = route.timeout or 0
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0.001)
+            timeout = min(timeout, remaining) if timeout else remaining
+        return timeout
+
+    def record_phase(self, route, trace, phase, started):
+        """Record how long a phase of running an endpoint took, in the metrics and the request's trace."""
+        ended = time.monotonic()
+        self.metrics.observe_phase(route.hook_id, phase, ended - started)
+        if trace:
+            trace.add(phase, started, ended)
+
+    async def acquire_slot(self, route, priority, deadline, trace=None):
+        """Wait for the limiter to let this endpoint run."""
+        started = time.monotonic()
+        await self.limiter.acquire(route.hook_id, route.max_concurrency, route.max_queue, priority, deadline)
+        self.record_phase(route, trace, "queue", started)
+
+    async def run_endpoint(self, route, payload, priority, deadline, trace=None):
+        """Run the endpoint once a slot is free, log its stderr and return (exit_code, stdout, stderr)."""
+        await self.acquire_slot(route, priority, deadline, trace)
+        try:
+            exit_code, stdout, stderr = await self.execute(route, payload, self.run_timeout(route, deadline), trace)
+        except EndpointTimeout:
+            self.metrics.exit_code(route.hook_id, "timeout")
+            raise
+        finally:
+            self.limiter.release(route.hook_id)
+        self.metrics.exit_code(route.hook_id, exit_code)
+        if stderr:
+            sys.stderr.write(stderr.decode(errors="replace"))
+        return exit_code, stdout, stderr
+
+    async def run_batch_item(self, item, priority, deadline):
+        """Run one call of a batch and describe its outcome like a response to it would."""
+        started = time.monotonic()
+        if not isinstance(item, dict) or not isinstance(item.get("endpoint"), str):
+            return {"endpoint": item.get("endpoint") if isinstance(item, dict) else None, "status": 400,
+                    "stdout": "", "stderr": "Each item needs an \"endpoint\"\n", "duration": 0.0}
+        route = self.routes.get(item["endpoint"])
+        if route is None:
+            return {"endpoint": item["endpoint"], "status": 404, "stdout": "", "stderr": "Hook not found.\n",
+                    "duration": 0.0}
+
+        body = item.get("body", "")
+        payload = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.metrics.request_started(route.hook_id)
+        stdout = stderr = b""
+        try:
+            exit_code, stdout, stderr = await self.run_endpoint(
+                route, payload, priority or route.priority, deadline)
+            status = 200 if exit_code == 0 else 500
+        except Overloaded as e:
+            status, stderr = e.status, f"{e}\n".encode()
+        except EndpointTimeout as e:
+            status, stderr = 504, f"{e}\n".encode()
+        except Exception as e:
+            print(f"Error executing {route.relative_path}: {str(e)}", file=sys.stderr)
+            status, stderr = 500, b"Error occurred while executing the hook's command.\n"
+        duration = time.monotonic() - started
+        self.metrics.request_finished(route.hook_id, status, duration)
+        return {
+            "endpoint": route.hook_id,
+            "status": status,
+            "stdout": stdout.decode(errors="replace"),
+            "stderr": stderr.decode(errors="replace"),
+            "duration": round(duration, 6),
+        }
+
+    async def batch_route(self, request):
+        """Run the calls in a JSON array of {"endpoint", "body"} items and return all their results.
+
+        Calls run concurrently, at most batch.max_parallel at a time, and each
+        still goes through the concurrency limiter. Results come back as a JSON
+        array in request order, or with ?stream=1 as one JSON line per call, in
+        the order they finish.
+        """
+        batch_config = CONFIG.get("batch") or {}
+        try:
+            items = json.loads(await request.read_body())
+        except ValueError:
+            return Response(400, "Batch body must be a JSON array\n")
+        if not isinstance(items, list):
+            return Response(400, "Batch body must be a JSON array\n")
+        max_items = batch_config.get("max_items", 100)
+        if max_items and len(items) > max_items:
+            return Response(413, f"Batches are limited to {max_items} calls\n")
+
+        priority = request.headers.get("x-priority", "").lower()
+        priority = priority if priority in PRIORITIES else None
+        deadline = self.request_deadline(request)
+        parallel = asyncio.Semaphore(max(1, batch_config.get("max_parallel", 8)))
+
+        async def run(index, item):
+            async with parallel:
+                result = await self.run_batch_item(item, priority, deadline)
+            result["index"] = index
+            return result
+
+        tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+        if "stream=1" not in request.query.split("&"):
+            try:
+                results = await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+            return Response(200, json.dumps(results) + "\n", {"Content-Type": "application/json"})
+
+        async def body():
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    yield (json.dumps(await finished) + "\n").encode()
+            finally:
+                # If the client went away, don't keep running its calls
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(200, body(), {"Content-Type": "application/x-ndjson"})
+
+    def job_store(self):
+        """Open the job store and start this process's job workers, the first time jobs are used."""
+        if self.jobs is None:
+            jobs_config = CONFIG.get("jobs") or {}
+            self.jobs = AsyncJobStore(os.path.join(SCRIPT_DIR, jobs_config.get("database", "jobs.db")),
+                                      jobs_config.get("max_result_bytes", 10 * 1024 * 1024),
+                                      jobs_config.get("result_ttl", 86400))
+            asyncio.ensure_future(self.start_job_workers(max(1, jobs_config.get("workers", 2))))
+        return self.jobs
+
+    async def start_job_workers(self, count):
+        """Requeue jobs interrupted by a restart, then start working through the queue."""
+        try:
+            requeued = await self.jobs.recover()
+        except Exception as e:
+            print(f"Error opening the job store: {str(e)}", file=sys.stderr)
+            return
+        if requeued:
+            print(f"Requeued {requeued} job(s) interrupted by a restart")
+        for _ in range(count):
+            asyncio.ensure_future(self.job_worker())
+
+    def resume_jobs(self):
+        """Start working through jobs left queued by a previous run, if there may be any."""
+        database = os.path.join(SCRIPT_DIR, (CONFIG.get("jobs") or {}).get("database", "jobs.db"))
+        if os.path.exists(database) or any(route.run_async for route in self.routes.values()):
+            self.job_store()
+
+    async def enqueue_job(self, route, request):
+        """Queue a run of the endpoint and answer 202 with where to follow it."""
+        jobs_config = CONFIG.get("jobs") or {}
+        payload = await request.read_body()
+        store = self.job_store()
+        max_queued = jobs_config.get("max_queued", 1000)
+        if max_queued and await store.queued() >= max_queued:
+            return Response(503, "Job queue is full\n", {"Retry-After": str(jobs_config.get("retry_after", 5))})
+        job_id = await store.enqueue(route.hook_id, payload)
+        self.job_wakeup.set()
+        status_url = f"{JOBS_PREFIX}{job_id}"
+        body = {
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": status_url,
+            "result_url": f"{status_url}/result",
+            "stream_url": f"{status_url}/stream",
+        }
+        return Response(202, json.dumps(body) + "\n", {"Content-Type": "application/json", "Location": status_url})
+
+    async def job_worker(self):
+        """Run queued jobs one at a time, for as long as the server runs."""
+        purged_at = 0
+        while True:
+            try:
+                job = await self.jobs.claim()
+                if job is None:
+                    if time.monotonic() - purged_at > 60:
+                        purged_at = time.monotonic()
+                        await self.jobs.purge_expired()
+                    self.job_wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.job_wakeup.wait(), JOB_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self.run_job(*job)
+            except Exception as e:
+                print(f"Error running job: {str(e)}", file=sys.stderr)
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    async def run_job(self, job_id, hook_id, payload):
+        """Run one job and store its outcome."""
+        route = self.routes.get(hook_id)
+        if route is None:
+            await self.jobs.finish(job_id, FAILED, None, b"", b"Hook not found.\n")
+            return
+        output = self.job_outputs[job_id] = JobOutput()
+        try:
+            status, exit_code, stderr = await self.execute_job(route, payload, output)
+        finally:
+            output.close()
+            del self.job_outputs[job_id]
+        await self.jobs.finish(job_id, status, exit_code, b"".join(output.chunks), stderr)
+
+    async def execute_job(self, route, payload, output):
+        """Run the endpoint for a job, collecting stdout in output as it is produced.
+
+        Jobs are spawned even for pooled Python endpoints, so their progress
+        can be followed and a long job doesn't hold a pool worker. Persistent
+        endpoints only run in the pool, so their output arrives in one piece.
+        Returns (status, exit_code, stderr).
+        """
+        # Jobs wait behind interactive requests, and wait again rather than fail when shed
+        while True:
+            try:
+                await self.acquire_slot(route, "batch", None)
+                break
+            except Overloaded:
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+
+        if route.persistent:
+            try:
+                exit_code, stdout, stderr = await self.execute(route, payload, route.timeout)
+            except EndpointTimeout as e:
+                self.metrics.exit_code(route.hook_id, "timeout")
+                return TIMEOUT, None, f"{e}\n".encode()
+            finally:
+                self.limiter.release(route.hook_id)
+            output.append(stdout)
+            self.metrics.exit_code(route.hook_id, exit_code)
+            return DONE if exit_code == 0 else FAILED, exit_code, stderr
+
+        max_bytes = self.jobs.max_result_bytes
+        try:
+            process = await spawn(route, asyncio.subprocess.PIPE)
+            stored = 0
+            stderr = []
+
+            async def feed_stdin():
+                try:
+                    process.stdin.write(payload)
+                    await process.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    process.stdin.close()
+
+            async def read_stdout():
+                nonlocal stored
+                while True:
+                    data = await process.stdout.read(CHUNK_SIZE)
+                    if not data:
+                        return
+                    # Keep reading past the cap so the script isn't blocked, but stop storing
+                    if stored <= max_bytes:
+                        output.append(data)
+                        stored += len(data)
+
+            async def read_stderr():
+                while True:
+                    data = await process.stderr.read(CHUNK_SIZE)
+                    if not data:
+                        return
+                    if sum(map(len, stderr)) <= max_bytes:
+                        stderr.append(data)
+
+            try:
+                await asyncio.wait_for(asyncio.gather(feed_stdin(), read_stdout(), read_stderr(), process.wait()),
+                                       route.timeout or None)
+            except asyncio.TimeoutError:
+                self.metrics.exit_code(route.hook_id, "timeout")
+                stderr.append(f"Endpoint timed out after {route.timeout:g} seconds\n".encode())
+                return TIMEOUT, None, b"".join(stderr)
+            finally:
+                kill_process_tree(process.pid)
+                await process.wait()
+        finally:
+            self.limiter.release(route.hook_id)
+        self.metrics.exit_code(route.hook_id, process.returncode)
+        return DONE if process.returncode == 0 else FAILED, process.returncode, b"".join(stderr)
+
+    async def jobs_route(self, request):
+        """Report a job's state, its result, or stream its output as it runs."""
+        job_id, _, action = request.path[len(JOBS_PREFIX):].partition("/")
+        job = await self.job_store().get(job_id)
+        if job is None:
+            return Response(404, "Job not found.\n")
+        status_url = f"{JOBS_PREFIX}{job_id}"
+
+        if action == "":
+            return Response(200, json.dumps(job, indent=2) + "\n", {"Content-Type": "application/json"})
+        if action == "result":
+            if job["status"] not in FINISHED:
+                return Response(202, json.dumps(job) + "\n",
+                                {"Content-Type": "application/json", "Location": status_url, "Retry-After": "1"})
+            stdout, _ = await self.jobs.output(job_id)
+            status = {DONE: 200, TIMEOUT: 504}.get(job["status"], 500)
+            return Response(status, stdout, {"X-Exit-Code": str(job["exit_code"]), "X-Job-Status": job["status"]})
+        if action == "stream":
+            response = StreamingResponse(200, None)
+            response.body_iter = self.follow_job(job_id, response)
+            return response
+        return Response(404, "Job not found.\n")
+
+    async def follow_job(self, job_id, response):
+        """Stream a job's output as it is produced, ending with its exit code in the X-Exit-Code trailer."""
+        while True:
+            output = self.job_outputs.get(job_id)
+            if output:
+                # Running here: relay its output live
+                async for data in output.follow():
+                    yield data
+                job = await self.jobs.get(job_id)
+                break
+            job = await self.jobs.get(job_id)
+            if job is None:
+                return
+            if job["status"] in FINISHED:
+                stdout, _ = await self.jobs.output(job_id)
+                if stdout:
+                    yield stdout
+                break
+            # Queued, or running in another server instance
+            await asyncio.sleep(JOB_POLL_INTERVAL / 4)
+        if job:
+            response.trailers["X-Exit-Code"] = "timeout" if job["status"] == TIMEOUT else str(job["exit_code"])
+
+    async def health_route(self, request):
+        """Answer the supervisor's health check: reaching this at all means the event loop is running."""
+        return Response(200, "ok\n")
+
+    async def handle_health_connection(self, reader, writer):
+        """Answer one health check on an instance's private health port (see serve)."""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+            request = await read_request(request_line, reader, writer) if request_line else None
+            if request is not None:
+                if request.path == "/_health":
+                    response = await self.health_route(request)
+                else:
+                    response = Response(404, "404 page not found\n")
+                await write_response(writer, response, request, False)
+        except (BadRequest, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ValueError, ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def stats_route(self, request):
+        """Report server statistics as JSON."""
+        stats = {
+            "cache": self.cache.stats(),
+            "coalesced": self.single_flight.coalesced,
+            "coalescing_in_flight": len(self.single_flight.inflight),
+            "queues": self.limiter.stats(),
+            "jobs": await self.jobs.stats() if self.jobs else None,
+            "endpoints": self.metrics.summary(),
+        }
+        return Response(200, json.dumps(stats, indent=2) + "\n", {"Content-Type": "application/json"})
+
+    async def metrics_route(self, request):
+        """Export the request metrics in the Prometheus text format."""
+        return Response(200, self.metrics.render(), {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def execute(self, route, payload, timeout=0, trace=None):
+        """Run the endpoint and return (exit_code, stdout, stderr).
+
+        Raises EndpointTimeout if it runs longer than timeout seconds, after
+        killing its whole process tree. When tracing, the endpoint gets the
+        request ID in its environment.
+        """
+        request_id = trace.request_id if trace else None
+        if route.pool:
+            from pool_client import call_pool_async
+            started = time.monotonic()
+            try:
+                result = await call_pool_async(route.relative_path, payload, POOL_SOCKET, timeout, request_id)
+            except EndpointTimeout:
+                self.record_phase(route, trace, "exec", started)
+                raise
+            except OSError:
+                # A persistent endpoint can't be spawned per request instead
+                if not self.pool_fallback or route.persistent:
+                    raise
+                result = None
+            if result is None and route.persistent:
+                raise OSError(f"{route.relative_path} is not loaded in the worker pool")
+            if result is not None:
+                # Pool workers are already running, so it's all execution time
+                self.record_phase(route, trace, "exec", started)
+                return result
+
+        started = time.monotonic()
+        if self.staging_dir:
+            # Give the script an in-memory file as stdin instead of pumping the
+            # body through a pipe from the event loop
+            payload_fd = stage_payload(payload, self.staging_dir)
+            try:
+                process = await spawn(route, payload_fd, request_id)
+            finally:
+                os.close(payload_fd)
+            payload = None
+        else:
+            process = await spawn(route, asyncio.subprocess.PIPE, request_id)
+        self.record_phase(route, trace, "spawn", started)
+        spawned = time.monotonic()
+
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(payload), timeout or None)
+        except asyncio.TimeoutError:
+            raise EndpointTimeout(f"Endpoint timed out after {timeout:g} seconds")
+        finally:
+            # Also reaps anything the script left running in the background
+            kill_process_tree(process.pid)
+            await process.wait()
+            self.record_phase(route, trace, "exec", spawned)
+        return process.returncode, stdout, stderr
+
+    async def execute_streaming(self, route, request):
+        """Run the endpoint, piping the body in and relaying stdout as it is produced.
+
+        The status is decided when the first output arrives: 200 if the script
+        produced output, otherwise 200/500 from its exit code. The exit code is
+        always sent in the X-Exit-Code trailer.
+        """
+        deadline = self.request_deadline(request)
+        trace = request.trace
+        await self.acquire_slot(route, self.request_priority(route, request), deadline, trace)
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.limiter.release(route.hook_id)
+
+        started = time.monotonic()
+        try:
+            process = await spawn(route, asyncio.subprocess.PIPE, trace.request_id if trace else None)
+        except BaseException:
+            release()
+            raise
+        self.record_phase(route, trace, "spawn", started)
+        spawned = time.monotonic()
+
+        # Kill the whole process tree if it runs past its timeout
+        timeout = self.run_timeout(route, deadline)
+        timed_out = False
+
+        def expire():
+            nonlocal timed_out
+            timed_out = True
+            kill_process_tree(process.pid)
+
+        watchdog = asyncio.get_running_loop().call_later(timeout, expire) if timeout else None
+
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            if watchdog:
+                watchdog.cancel()
+            kill_process_tree(process.pid)
+            release()
+            self.record_phase(route, trace, "exec", spawned)
+            if timed_out:
+                self.metrics.exit_code(route.hook_id, "timeout")
+            elif process.returncode is not None:
+                self.metrics.exit_code(route.hook_id, process.returncode)
+
+        async def feed_stdin():
+            try:
+                async for data in request.body_reader.chunks():
+                    process.stdin.write(data)
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # The script stopped reading; the rest of the body is drained later
+                pass
+            finally:
+                process.stdin.close()
+
+        async def relay_stderr():
+            while True:
+                data = await process.stderr.read(CHUNK_SIZE)
+                if not data:
+                    return
+                sys.stderr.write(data.decode(errors="replace"))
+
+        feeder = asyncio.ensure_future(feed_stdin())
+        stderr_relay = asyncio.ensure_future(relay_stderr())
+
+        try:
+            first = await process.stdout.read(CHUNK_SIZE)
+            if not first:
+                await asyncio.gather(feeder, stderr_relay)
+                await process.wait()
+                finish()
+                if timed_out:
+                    raise EndpointTimeout(f"Endpoint timed out after {timeout:g} seconds")
+                return Response(200 if process.returncode == 0 else 500, b"",
+                                {"X-Exit-Code": str(process.returncode)})
+        except BaseException:
+            feeder.cancel()
+            stderr_relay.cancel()
+            finish()
+            raise
+
+        response = StreamingResponse(200, None)
+
+        async def body():
+            try:
+                data = first
+                while data:
+                    yield data
+                    data = await process.stdout.read(CHUNK_SIZE)
+                await asyncio.gather(feeder, stderr_relay)
+                await process.wait()
+                response.trailers["X-Exit-Code"] = "timeout" if timed_out else str(process.returncode)
+            finally:
+                # If the client went away mid-stream, don't leave the script running
+                if process.returncode is None:
+                    feeder.cancel()
+                    stderr_relay.cancel()
+                finish()
+
+        response.body_iter = body()
+        return response
+
+
+async def serve(routes, host, port, prefix, watcher=None, on_change=None, on_ready=None, reuse_port=False,
+                health_port=None):
+    """Run the server until cancelled, reloading routes as the watcher reports changes.
+
+    on_ready is called once the listening socket is bound. With reuse_port,
+    other instances can listen on the same port (SO_REUSEPORT). Since a
+    request to the shared port can reach any of them, health_port gives this
+    instance a loopback port of its own that only answers /_health. On SIGTERM the
+    server stops accepting connections and returns once the requests in
+    progress have finished, or after drain_timeout seconds.
+    """
+    server = EndpointServer(routes, prefix)
+    server.resume_jobs()
+    listener = await asyncio.start_server(server.handle_connection, host, port, limit=MAX_LINE_SIZE,
+                                          reuse_port=reuse_port or None)
+    health_listener = None
+    if health_port:
+        health_listener = await asyncio.start_server(server.handle_health_connection, "127.0.0.1", health_port,
+                                                     limit=MAX_LINE_SIZE)
+    if on_ready:
+        on_ready()
+    if watcher:
+        asyncio.ensure_future(server.watch(watcher, on_change))
+    loop = asyncio.get_running_loop()
+    draining = loop.create_future()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, lambda: draining.done() or draining.set_result(None))
+    except (NotImplementedError, RuntimeError):
+        pass  # Windows: SIGTERM ends the process at once
+    try:
+        await draining
+    finally:
+        listener.close()
+        if health_listener:
+            health_listener.close()
+    # Idle keep-alive connections are closed when asyncio.run cancels their handlers
+    await server.drain(CONFIG.get("drain_timeout", 30))
@@ -0,0 +1,216 @@
+import os
+import time
+import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# States a job moves through. Jobs end "done" (exit code 0), "failed" or "timeout".
+QUEUED, RUNNING, DONE, FAILED, TIMEOUT = "queued", "running", "done", "failed", "timeout"
+FINISHED = (DONE, FAILED, TIMEOUT)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL,
+    owner INTEGER,
+    exit_code INTEGER,
+    stdout BLOB,
+    stderr BLOB,
+    truncated INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at);
+"""
+
+# Columns reported by JobStore.get(), in order
+JOB_FIELDS = ("id", "endpoint", "status", "exit_code", "truncated", "created_at", "started_at", "finished_at",
+              "expires_at", "stdout_bytes")
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class JobStore:
+    """Jobs for async endpoints, kept in SQLite so queued work survives a restart.
+
+    Several server instances can share one database: a job is claimed by
+    flipping it from queued to running in a single write transaction.
+    """
+
+    def __init__(self, path, max_result_bytes=10 * 1024 * 1024, result_ttl=86400):
+        self.path = path
+        self.max_result_bytes = max_result_bytes
+        self.result_ttl = result_ttl
+        # Autocommit, with explicit transactions where a read and write must be atomic
+        self.db = sqlite3.connect(path, isolation_level=None, timeout=5)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def recover(self):
+        """Requeue jobs left running by a server process that no longer exists.
+
+        They are run again from the start. Returns how many were requeued.
+        """
+        stale = [job_id for job_id, owner in
+                 self.db.execute("SELECT id, owner FROM jobs WHERE status = ?", (RUNNING,))
+                 if not owner or owner == os.getpid() or not process_alive(owner)]
+        for job_id in stale:
+            self.db.execute("UPDATE jobs SET status = ?, owner = NULL, started_at = NULL WHERE id = ? AND status = ?",
+                            (QUEUED, job_id, RUNNING))
+        return len(stale)
+
+    def enqueue(self, endpoint, payload):
+        """Add a job to the queue and return its ID."""
+        job_id = os.urandom(12).hex()
+        self.db.execute("INSERT INTO jobs (id, endpoint, payload, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (job_id, endpoint, payload, QUEUED, time.time()))
+        return job_id
+
+    def queued(self):
+        return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def claim(self):
+        """Take the oldest queued job for this process. Returns (id, endpoint, payload), or None."""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute("SELECT id, endpoint, payload FROM jobs WHERE status = ? "
+                                  "ORDER BY created_at LIMIT 1", (QUEUED,)).fetchone()
+            if row:
+                self.db.execute("UPDATE jobs SET status = ?, owner = ?, started_at = ? WHERE id = ?",
+                                (RUNNING, os.getpid(), time.time(), row[0]))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return row
+
+    def finish(self, job_id, status, exit_code, stdout, stderr):
+        """Store a job's outcome. Output past max_result_bytes is cut off and the job marked truncated."""
+        truncated = len(stdout) > self.max_result_bytes or len(stderr) > self.max_result_bytes
+        now = time.time()
+        self.db.execute("UPDATE jobs SET status = ?, exit_code = ?, stdout = ?, stderr = ?, truncated = ?, "
+                        "finished_at = ?, expires_at = ?, payload = x'' WHERE id = ?",
+                        (status, exit_code, stdout[:self.max_result_bytes], stderr[:self.max_result_bytes],
+                         int(truncated), now, now + self.result_ttl, job_id))
+
+    def get(self, job_id):
+        """Get a job's state as a dict, or None if it doesn't exist or has expired."""
+        row = self.db.execute("SELECT id, endpoint, status, exit_code, truncated, created_at, started_at, "
+                              "finished_at, expires_at, LENGTH(stdout) FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (row[8] and row[8] < time.time()):
+            return None
+        job = dict(zip(JOB_FIELDS, row))
+        job["truncated"] = bool(job["truncated"])
+        job["stdout_bytes"] = job["stdout_bytes"] or 0
+        return job
+
+    def output(self, job_id):
+        """Get (stdout, stderr) of a finished job."""
+        row = self.db.execute("SELECT stdout, stderr FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return (row[0] or b"", row[1] or b"") if row else (b"", b"")
+
+    def purge_expired(self):
+        """Delete finished jobs whose results have expired."""
+        return self.db.execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def stats(self):
+        counts = dict.fromkeys((QUEUED, RUNNING) + FINISHED, 0)
+        for status, count in self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    def close(self):
+        self.db.close()
+
+
+class AsyncJobStore:
+    """A JobStore used from the event loop, running on a thread of its own.
+
+    Waiting on another instance's write lock and writing large payloads and
+    results then never hold up other connections. sqlite3 connections belong
+    to the thread that opened them, and a single thread also runs the calls in
+    the order they were made.
+    """
+
+    def __init__(self, path, max_result_bytes=10 * 1024 * 1024, result_ttl=86400):
+        self.max_result_bytes = max_result_bytes
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="jobs")
+        # Opened on the store's thread; calls made meanwhile queue up behind it
+        self.opened = self.executor.submit(JobStore, path, max_result_bytes, result_ttl)
+
+    async def call(self, method, *args):
+        def run():
+            return getattr(self.opened.result(), method)(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, run)
+
+    async def recover(self):
+        return await self.call("recover")
+
+    async def enqueue(self, endpoint, payload):
+        return await self.call("enqueue", endpoint, payload)
+
+    async def queued(self):
+        return await self.call("queued")
+
+    async def claim(self):
+        return await self.call("claim")
+
+    async def finish(self, job_id, status, exit_code, stdout, stderr):
+        return await self.call("finish", job_id, status, exit_code, stdout, stderr)
+
+    async def get(self, job_id):
+        return await self.call("get", job_id)
+
+    async def output(self, job_id):
+        return await self.call("output", job_id)
+
+    async def purge_expired(self):
+        return await self.call("purge_expired")
+
+    async def stats(self):
+        return await self.call("stats")
+
+
+class JobOutput:
+    """Output of a job running in this process, for clients following its progress."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.changed = asyncio.Event()
+
+    def append(self, data):
+        self.chunks.append(data)
+        self.notify()
+
+    def close(self):
+        self.done = True
+        self.notify()
+
+    def notify(self):
+        # A fresh event each time, so every follower waiting on the old one wakes up
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self):
+        """Yield the output so far, then each new piece until the job finishes."""
+        sent = 0
+        while True:
+            while sent < len(self.chunks):
+                yield self.chunks[sent]
+                sent += 1
+            if self.done:
+                return
+            await self.changed.wait()
@@ -1,4 +1,4 @@
 #!/usr/bin/env bash
-:; kill -9 $(ps aux | grep "run-server.py" | awk '{print $2}') ; exit 0
+:; python start_server.py ctl stop ; exit 0
 cls
-taskkill /IM webhook.exe /F
\ No newline at end of file
+python start_server.py ctl stop
@@ -0,0 +1,159 @@
+import time
+import asyncio
+import itertools
+
+# Lower numbers are served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of queued."""
+
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Waiter:
+    """A request queued for an endpoint slot."""
+
+    def __init__(self, hook_id, endpoint_limit, priority, seq):
+        self.hook_id = hook_id
+        self.endpoint_limit = endpoint_limit
+        self.priority = priority
+        self.seq = seq
+        self.future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.monotonic()
+
+
+class ConcurrencyLimiter:
+    """Bounds how many endpoints run at once, globally and per endpoint.
+
+    Requests that can't run immediately wait in a bounded queue and are
+    admitted by priority class, then arrival order. When the queue is full the
+    request is rejected straight away: 503 if the whole server is saturated,
+    429 if only its endpoint's own queue is full.
+    """
+
+    def __init__(self, max_concurrency=0, max_queue=100, queue_timeout=30, retry_after=1):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self.running = 0
+        self.running_by_endpoint = {}
+        self.waiting = []
+        self.seq = itertools.count()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.expired = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def has_capacity(self, hook_id, endpoint_limit):
+        if self.max_concurrency and self.running >= self.max_concurrency:
+            return False
+        if endpoint_limit and self.running_by_endpoint.get(hook_id, 0) >= endpoint_limit:
+            return False
+        return True
+
+    def take(self, hook_id):
+        self.running += 1
+        self.running_by_endpoint[hook_id] = self.running_by_endpoint.get(hook_id, 0) + 1
+        self.admitted += 1
+
+    def queued_for(self, hook_id):
+        return sum(1 for waiter in self.waiting if waiter.hook_id == hook_id)
+
+    async def acquire(self, hook_id, endpoint_limit=0, endpoint_queue=0, priority="interactive", deadline=None):
+        """Wait for a slot to run hook_id, or raise Overloaded.
+
+        deadline is a time.monotonic() value after which the client no longer
+        wants the result; the request is then dropped with a 504 instead of run.
+        """
+        if deadline is not None and time.monotonic() >= deadline:
+            self.expired += 1
+            raise Overloaded(504, "Request deadline passed before it could run", None)
+        if self.has_capacity(hook_id, endpoint_limit) and not self.queued_for(hook_id):
+            self.take(hook_id)
+            return
+
+        if len(self.waiting) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(503, "Server is overloaded, try again later", self.retry_after)
+        if endpoint_queue and self.queued_for(hook_id) >= endpoint_queue:
+            self.rejected += 1
+            raise Overloaded(429, "Too many requests for this endpoint, try again later", self.retry_after)
+
+        waiter = Waiter(hook_id, endpoint_limit, PRIORITIES.get(priority, 0), next(self.seq))
+        self.waiting.append(waiter)
+        timeout = self.queue_timeout or None
+        if deadline is not None:
+            timeout = min(timeout or float("inf"), deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            self.abandon(waiter)
+            if deadline is not None and time.monotonic() >= deadline:
+                self.expired += 1
+                raise Overloaded(504, "Request deadline passed while waiting in the queue", None)
+            self.timed_out += 1
+            raise Overloaded(503, "Timed out waiting for a free slot", self.retry_after)
+        except asyncio.CancelledError:
+            self.abandon(waiter)
+            raise
+
+        waited = time.monotonic() - waiter.queued_at
+        self.wait_count += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def abandon(self, waiter):
+        """Take a waiter out of the queue, giving back its slot if it was granted one."""
+        if waiter in self.waiting:
+            self.waiting.remove(waiter)
+        elif waiter.future.done():
+            self.release(waiter.hook_id)
+
+    def release(self, hook_id):
+        """Free a slot and hand it to the best queued request that can now run."""
+        self.running -= 1
+        self.running_by_endpoint[hook_id] -= 1
+        if not self.running_by_endpoint[hook_id]:
+            del self.running_by_endpoint[hook_id]
+
+        for waiter in sorted(self.waiting, key=lambda w: (w.priority, w.seq)):
+            if not self.has_capacity(waiter.hook_id, waiter.endpoint_limit):
+                if self.max_concurrency and self.running >= self.max_concurrency:
+                    break
+                continue
+            self.waiting.remove(waiter)
+            self.take(waiter.hook_id)
+            waiter.future.set_result(None)
+
+    def stats(self):
+        """Get queue depth, running counts and wait time figures."""
+        queued_by_priority = {name: 0 for name in PRIORITIES}
+        queued_by_endpoint = {}
+        names = {value: name for name, value in PRIORITIES.items()}
+        for waiter in self.waiting:
+            queued_by_priority[names[waiter.priority]] += 1
+            queued_by_endpoint[waiter.hook_id] = queued_by_endpoint.get(waiter.hook_id, 0) + 1
+        return {
+            "running": self.running,
+            "running_by_endpoint": dict(self.running_by_endpoint),
+            "queued": len(self.waiting),
+            "queued_by_priority": queued_by_priority,
+            "queued_by_endpoint": queued_by_endpoint,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "deadline_expired": self.expired,
+            "wait_avg_ms": round(self.wait_total / self.wait_count * 1000, 3) if self.wait_count else 0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }
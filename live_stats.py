@@ -0,0 +1,174 @@
+import os
+import re
+import time
+
+# Per-endpoint request rates, error rates and latencies for the GUI's live
+# panel, read from the request lines webhook writes to webhook.log (verbose).
+
+# Seconds of history kept per endpoint, one bucket per second
+WINDOW = 60
+# Seconds the headline rate, error rate and p95 are averaged over
+RECENT = 10
+# Most unread log the tailer catches up on; older lines are outside WINDOW anyway
+MAX_BACKLOG = 8 * 1024 * 1024
+
+# "[webhook] 2024/05/01 12:00:00 [a1b2c3] 200 | 24 B | 1.845ms | localhost:9000 | POST /hooks/echo"
+REQUEST_LINE = re.compile(r"\[webhook\] (\d{4}/\d\d/\d\d \d\d:\d\d:\d\d) (?:\[[^\]]*\] )?(\d{3}) \| [^|]* \| "
+                          r"([^|]+?) \| [^|]* \| [A-Z]+ (\S+)")
+# Go duration strings, e.g. "850µs", "1.845ms", "1m2.5s"
+DURATION_PART = re.compile(r"([\d.]+)(ns|us|µs|ms|s|m|h)")
+DURATION_UNITS = {"ns": 1e-9, "us": 1e-6, "µs": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(text):
+    """Convert a Go duration string to seconds, or None if it isn't one."""
+    parts = DURATION_PART.findall(text)
+    if not parts:
+        return None
+    return sum(float(value) * DURATION_UNITS[unit] for value, unit in parts)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class LogTailer:
+    """Reads the lines appended to a log file since the last call.
+
+    The file is reopened on each read and read from the last offset, so only new
+    data is ever read. A file that was rotated (replaced or shrank) is read
+    again from the start. With from_end, what's already in the file is skipped.
+    """
+
+    def __init__(self, path, from_end=False):
+        self.path = path
+        self.offset = 0
+        self.partial = b""
+        self.file_id = None
+        if from_end:
+            try:
+                stat = os.stat(path)
+                self.offset, self.file_id = stat.st_size, (stat.st_dev, stat.st_ino)
+            except OSError:
+                pass
+
+    def read_lines(self):
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return []
+        with f:
+            stat = os.fstat(f.fileno())
+            size, file_id = stat.st_size, (stat.st_dev, stat.st_ino)
+            if size < self.offset or file_id != self.file_id:
+                self.offset, self.partial = 0, b""
+            self.file_id = file_id
+            skip_partial = False
+            if size - self.offset > MAX_BACKLOG:
+                self.offset, self.partial = size - MAX_BACKLOG, b""
+                skip_partial = True
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        self.offset += len(data)
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        if skip_partial and lines:
+            # Started reading mid-line
+            lines.pop(0)
+        return [line.decode(errors="replace").rstrip("\r") for line in lines]
+
+
+class EndpointSeries:
+    """Requests, errors (5xx) and latencies of one endpoint, in one-second buckets."""
+
+    def __init__(self):
+        self.buckets = {}  # second -> [requests, errors, latencies]
+        self.total = 0
+
+    def add(self, second, status, duration):
+        bucket = self.buckets.get(second)
+        if bucket is None:
+            bucket = self.buckets[second] = [0, 0, []]
+        bucket[0] += 1
+        bucket[1] += status >= 500
+        bucket[2].append(duration)
+        self.total += 1
+
+    def prune(self, oldest):
+        for second in [second for second in self.buckets if second < oldest]:
+            del self.buckets[second]
+
+
+class LiveStats:
+    """Live per-endpoint statistics built from webhook.log as it grows."""
+
+    def __init__(self, log_path, prefix="hooks"):
+        # Only requests from now on; the log keeps earlier runs
+        self.tailer = LogTailer(log_path, from_end=True)
+        self.prefix = f"/{prefix}/" if prefix else "/"
+        self.endpoints = {}
+
+    def poll(self):
+        """Read the requests logged since the last poll. Returns how many there were."""
+        return self.add_lines(self.tailer.read_lines())
+
+    def add_lines(self, lines):
+        """Count the requests in lines read from the log by self.tailer. Returns how many there were."""
+        count = 0
+        for line in lines:
+            match = REQUEST_LINE.search(line)
+            if not match:
+                continue
+            logged_at, status, elapsed, target = match.groups()
+            path = target.split("?", 1)[0]
+            duration = parse_duration(elapsed)
+            if not path.startswith(self.prefix) or duration is None:
+                continue
+            try:
+                second = int(time.mktime(time.strptime(logged_at, "%Y/%m/%d %H:%M:%S")))
+            except ValueError:
+                second = int(time.time())
+            hook_id = path[len(self.prefix):]
+            series = self.endpoints.get(hook_id)
+            if series is None:
+                series = self.endpoints[hook_id] = EndpointSeries()
+            series.add(second, int(status), duration)
+            count += 1
+
+        oldest = int(time.time()) - WINDOW + 1
+        for series in self.endpoints.values():
+            series.prune(oldest)
+        return count
+
+    def total_requests(self):
+        return sum(series.total for series in self.endpoints.values())
+
+    def summary(self):
+        """Get each endpoint's recent rate, error rate and p95 latency, with per-second series for sparklines.
+
+        Busiest endpoints come first.
+        """
+        now = int(time.time())
+        seconds = range(now - WINDOW + 1, now + 1)
+        summary = []
+        for hook_id, series in self.endpoints.items():
+            empty = (0, 0, [])
+            buckets = [series.buckets.get(second, empty) for second in seconds]
+            recent = buckets[-RECENT:]
+            requests = sum(bucket[0] for bucket in recent)
+            errors = sum(bucket[1] for bucket in recent)
+            summary.append({
+                "endpoint": hook_id,
+                "total": series.total,
+                "rps": requests / RECENT,
+                "error_rate": errors / requests if requests else 0.0,
+                "p95": percentile([latency for bucket in recent for latency in bucket[2]], 0.95),
+                "rps_series": [bucket[0] for bucket in buckets],
+                "error_series": [bucket[1] for bucket in buckets],
+                "p95_series": [percentile(bucket[2], 0.95) for bucket in buckets],
+            })
+        summary.sort(key=lambda entry: (entry["rps"], entry["total"]), reverse=True)
+        return summary
@@ -0,0 +1,143 @@
+import os
+import gzip
+import time
+import shutil
+import threading
+from collections import deque
+
+# Block size used when reading a log backwards for its last lines
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+class LogPipeline:
+    """Copies server output from pipes into a rotating log file, off the request path.
+
+    A reader thread per pipe only appends lines to memory, so a server writing
+    its log never waits on the disk; a single writer thread writes them out and
+    rotates the file by size and age. If the writer falls more than queue_lines
+    behind, new lines are dropped (and counted) rather than held up. The last
+    buffer_lines lines are also kept in memory for showing a quick tail.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5, rotate_interval=0, compress=False,
+                 buffer_lines=1000, queue_lines=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_interval = rotate_interval
+        self.compress = compress
+        self.queue_lines = queue_lines
+        self.recent = deque(maxlen=buffer_lines)
+        self.queue = []
+        self.dropped = 0
+        self.closed = False
+        self.readers = []
+        self.condition = threading.Condition()
+        # Appended to, so a restart keeps the earlier log instead of truncating it
+        self.file = open(path, 'ab')
+        self.opened_at = time.time()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def attach(self, stream):
+        """Read lines from a binary pipe (e.g. a server's stdout) until it closes."""
+        def read():
+            for line in iter(stream.readline, b""):
+                self.put(line)
+            stream.close()
+
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        self.readers.append(reader)
+
+    def put(self, line):
+        with self.condition:
+            self.recent.append(line.decode(errors="replace").rstrip("\r\n"))
+            if len(self.queue) >= self.queue_lines:
+                self.dropped += 1
+                return
+            self.queue.append(line)
+            self.condition.notify()
+
+    def tail(self, count=None):
+        """Get the most recent lines, oldest first."""
+        with self.condition:
+            lines = list(self.recent)
+        return lines[-count:] if count else lines
+
+    def write_loop(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.closed:
+                    self.condition.wait()
+                lines, self.queue = self.queue, []
+                dropped, self.dropped = self.dropped, 0
+                if not lines and self.closed:
+                    return
+            if dropped:
+                lines.append(f"[log] {dropped} lines dropped, the log writer fell behind\n".encode())
+            try:
+                if self.file.closed:
+                    # A failed rotation couldn't reopen the log, try again
+                    self.file = open(self.path, 'ab')
+                self.file.write(b"".join(lines))
+                self.file.flush()
+                if self.should_rotate():
+                    self.rotate()
+            except (OSError, ValueError) as e:
+                print(f"Error writing {self.path}: {str(e)}")
+
+    def should_rotate(self):
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            return True
+        return bool(self.rotate_interval) and time.time() - self.opened_at >= self.rotate_interval
+
+    def backup_name(self, number):
+        return f"{self.path}.{number}{'.gz' if self.compress else ''}"
+
+    def rotate(self):
+        """Move the log to .1 (compressing it if enabled), shifting older backups up and dropping the oldest."""
+        self.file.close()
+        try:
+            if self.backup_count:
+                for number in range(self.backup_count - 1, 0, -1):
+                    if os.path.exists(self.backup_name(number)):
+                        os.replace(self.backup_name(number), self.backup_name(number + 1))
+                os.replace(self.path, f"{self.path}.1")
+                if self.compress:
+                    with open(f"{self.path}.1", 'rb') as source, gzip.open(self.backup_name(1), 'wb') as target:
+                        shutil.copyfileobj(source, target)
+                    os.remove(f"{self.path}.1")
+            else:
+                os.remove(self.path)
+        finally:
+            # Keep logging to the same file if the log couldn't be moved
+            self.file = open(self.path, 'ab')
+            self.opened_at = time.time()
+
+    def close(self, timeout=5):
+        """Wait for the pipes to close, write out what's left and close the file."""
+        for reader in self.readers:
+            reader.join(timeout)
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.writer.join(timeout)
+        self.file.close()
+
+
+def read_tail(path, count):
+    """Read the last count lines of a file without reading the rest of it."""
+    try:
+        with open(path, 'rb') as f:
+            position = f.seek(0, os.SEEK_END)
+            data = b""
+            while position > 0 and data.count(b"\n") <= count:
+                step = min(TAIL_BLOCK_SIZE, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+    except OSError:
+        return []
+    lines = data.decode(errors="replace").splitlines()
+    return lines[-count:]
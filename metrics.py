@@ -0,0 +1,163 @@
+import bisect
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Where a request's time goes: waiting for a concurrency slot, starting the
+# endpoint process (or reaching the worker pool), and running it
+PHASES = ("queue", "spawn", "exec")
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram.
+
+    Recording is a bisect and two additions, and the server records from its
+    event loop thread only, so there is no locking at all.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating within the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+
+class EndpointMetrics:
+    """Request counters, in-flight gauges and phase latencies for one endpoint."""
+
+    def __init__(self):
+        self.requests = {}  # HTTP status -> count
+        self.exit_codes = {}  # exit code (or "timeout") -> count
+        self.in_flight = 0
+        self.duration = Histogram()
+        self.phases = {phase: Histogram() for phase in PHASES}
+
+
+class Metrics:
+    """Per-endpoint metrics for the built-in server, exported as Prometheus text."""
+
+    def __init__(self):
+        self.endpoints = {}
+
+    def get(self, hook_id):
+        metrics = self.endpoints.get(hook_id)
+        if metrics is None:
+            metrics = self.endpoints[hook_id] = EndpointMetrics()
+        return metrics
+
+    def request_started(self, hook_id):
+        self.get(hook_id).in_flight += 1
+
+    def request_finished(self, hook_id, status, duration):
+        metrics = self.get(hook_id)
+        metrics.in_flight -= 1
+        metrics.requests[status] = metrics.requests.get(status, 0) + 1
+        metrics.duration.observe(duration)
+
+    def observe_phase(self, hook_id, phase, duration):
+        self.get(hook_id).phases[phase].observe(duration)
+
+    def exit_code(self, hook_id, exit_code):
+        metrics = self.get(hook_id)
+        metrics.exit_codes[exit_code] = metrics.exit_codes.get(exit_code, 0) + 1
+
+    def summary(self):
+        """Get request counts and p50/p95/p99 latencies in milliseconds, per endpoint."""
+        summary = {}
+        for hook_id, metrics in sorted(self.endpoints.items()):
+            latency = {}
+            for name, histogram in [("total", metrics.duration)] + list(metrics.phases.items()):
+                latency[name] = {f"p{round(q * 100)}": round(histogram.quantile(q) * 1000, 3) for q in QUANTILES}
+            summary[hook_id] = {
+                "requests": sum(metrics.requests.values()),
+                "in_flight": metrics.in_flight,
+                "status": {str(status): count for status, count in metrics.requests.items()},
+                "exit_codes": {str(code): count for code, count in metrics.exit_codes.items()},
+                "latency_ms": latency,
+            }
+        return summary
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        endpoints = sorted(self.endpoints.items())
+
+        family("easy_api_requests_total", "counter", "Requests handled, by endpoint and HTTP status.")
+        for hook_id, metrics in endpoints:
+            for status, count in sorted(metrics.requests.items(), key=str):
+                lines.append(f'easy_api_requests_total{{endpoint="{escape(hook_id)}",status="{status}"}} {count}')
+
+        family("easy_api_exit_codes_total", "counter", "Endpoint runs, by exit code.")
+        for hook_id, metrics in endpoints:
+            for code, count in sorted(metrics.exit_codes.items(), key=str):
+                lines.append(f'easy_api_exit_codes_total{{endpoint="{escape(hook_id)}",code="{code}"}} {count}')
+
+        family("easy_api_requests_in_flight", "gauge", "Requests currently being handled.")
+        for hook_id, metrics in endpoints:
+            lines.append(f'easy_api_requests_in_flight{{endpoint="{escape(hook_id)}"}} {metrics.in_flight}')
+
+        family("easy_api_request_duration_seconds", "histogram", "Time from request to response sent.")
+        for hook_id, metrics in endpoints:
+            render_histogram(lines, "easy_api_request_duration_seconds", f'endpoint="{escape(hook_id)}"',
+                             metrics.duration)
+
+        family("easy_api_phase_duration_seconds", "histogram", "Time spent queued, spawning and executing.")
+        for hook_id, metrics in endpoints:
+            for phase, histogram in metrics.phases.items():
+                render_histogram(lines, "easy_api_phase_duration_seconds",
+                                 f'endpoint="{escape(hook_id)}",phase="{phase}"', histogram)
+
+        family("easy_api_phase_duration_quantile_seconds", "gauge",
+               "Estimated p50/p95/p99 of each phase, from the histograms.")
+        for hook_id, metrics in endpoints:
+            for phase, histogram in [("total", metrics.duration)] + list(metrics.phases.items()):
+                for q in QUANTILES:
+                    lines.append(f'easy_api_phase_duration_quantile_seconds{{endpoint="{escape(hook_id)}",'
+                                 f'phase="{phase}",quantile="{q}"}} {histogram.quantile(q):.6f}')
+
+        return "\n".join(lines) + "\n"
+
+
+def render_histogram(lines, name, labels, histogram):
+    """Append a histogram's cumulative buckets, sum and count."""
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+def escape(value):
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
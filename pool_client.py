@@ -0,0 +1,117 @@
+# Client side of the warm worker pool protocol. This must not import
+# start_server (yaml, psutil) so the launcher stays cheap to start.
+import json
+import struct
+import socket
+
+class EndpointTimeout(Exception):
+    """Raised when an endpoint runs longer than its timeout."""
+
+
+# Extra seconds the client waits past the timeout for the worker to report it
+TIMEOUT_GRACE = 5
+
+# Frames are a 4-byte big-endian length followed by the payload bytes
+FRAME_HEADER = struct.Struct(">I")
+
+
+def send_frame(sock, data):
+    """Send one length-prefixed frame."""
+    sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+
+def recv_exact(sock, size):
+    """Read exactly size bytes from the socket."""
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise ConnectionError("Connection closed mid-frame")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock):
+    """Receive one length-prefixed frame."""
+    (size,) = FRAME_HEADER.unpack(recv_exact(sock, FRAME_HEADER.size))
+    return recv_exact(sock, size)
+
+
+def recv_frame_with_fds(sock, maxfds=1):
+    """Receive one length-prefixed frame plus any file descriptors passed with it."""
+    data, fds, _, _ = socket.recv_fds(sock, FRAME_HEADER.size, maxfds)
+    if len(data) < FRAME_HEADER.size:
+        data += recv_exact(sock, FRAME_HEADER.size - len(data))
+    (size,) = FRAME_HEADER.unpack(data)
+    return recv_exact(sock, size), fds
+
+
+def call_pool(script_name, payload, address, payload_fd=None, timeout=0, request_id=None):
+    """Run an endpoint through the warm pool and return (exit_code, stdout, stderr).
+
+    If payload_fd is given, the file descriptor itself is passed to the worker
+    (SCM_RIGHTS) and payload is ignored, so the body never passes through us.
+
+    Returns None when the pool does not know the script (e.g. it was added after
+    the pool started), so the caller can fall back to spawning it. Raises
+    EndpointTimeout if the endpoint runs longer than timeout seconds.
+    request_id is handed to the endpoint when tracing.
+    """
+    request = {"script": script_name, "timeout": timeout, "request_id": request_id}
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+        if timeout:
+            sock.settimeout(timeout + TIMEOUT_GRACE)
+        if payload_fd is not None:
+            request["fd"] = True
+            header = json.dumps(request).encode()
+            socket.send_fds(sock, [FRAME_HEADER.pack(len(header)) + header], [payload_fd])
+        else:
+            send_frame(sock, json.dumps(request).encode())
+            send_frame(sock, payload)
+        header = json.loads(recv_frame(sock))
+        if not header.get("preloaded", True):
+            return None
+        if header.get("timed_out"):
+            raise EndpointTimeout(f"Endpoint timed out after {timeout} seconds")
+        stdout = recv_frame(sock)
+        stderr = recv_frame(sock)
+        return header["exit_code"], stdout, stderr
+    except socket.timeout:
+        raise EndpointTimeout(f"Endpoint timed out after {timeout} seconds")
+    finally:
+        sock.close()
+
+
+async def call_pool_async(script_name, payload, address, timeout=0, request_id=None):
+    """Asyncio version of call_pool for the native HTTP server."""
+    import asyncio
+    reader, writer = await asyncio.open_unix_connection(address)
+
+    async def exchange():
+        header = json.dumps({"script": script_name, "timeout": timeout, "request_id": request_id}).encode()
+        writer.write(FRAME_HEADER.pack(len(header)) + header)
+        writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+        await writer.drain()
+
+        async def read_frame():
+            (size,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+            return await reader.readexactly(size)
+
+        header = json.loads(await read_frame())
+        if not header.get("preloaded", True):
+            return None
+        if header.get("timed_out"):
+            raise EndpointTimeout(f"Endpoint timed out after {timeout} seconds")
+        stdout = await read_frame()
+        stderr = await read_frame()
+        return header["exit_code"], stdout, stderr
+
+    try:
+        return await asyncio.wait_for(exchange(), timeout + TIMEOUT_GRACE if timeout else None)
+    except asyncio.TimeoutError:
+        raise EndpointTimeout(f"Endpoint timed out after {timeout} seconds")
+    finally:
+        writer.close()
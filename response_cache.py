@@ -0,0 +1,157 @@
+import os
+import time
+import hashlib
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """LRU cache of endpoint output with per-entry TTLs and an optional on-disk tier.
+
+    The memory tier is bounded by max_entries and max_bytes. Entries evicted
+    from memory are demoted to disk_dir (if set), which is bounded by
+    disk_max_bytes and looked up when the memory tier misses.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024, disk_dir=None,
+                 disk_max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (expires_at, body)
+        self.bytes = 0
+
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_entries = OrderedDict()  # key -> size, oldest first
+        self.disk_bytes = 0
+        if disk_dir:
+            self.load_disk_index()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(hook_id, payload, headers, vary=()):
+        """Key a response on the endpoint, a hash of the body and any selected headers."""
+        digest = hashlib.sha256(payload)
+        digest.update(hook_id.encode())
+        for name in vary:
+            digest.update(b"\0" + name.lower().encode() + b"=" + headers.get(name.lower(), "").encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Get a cached body, or None on a miss."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, body = entry
+            if expires_at > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return body
+            self.remove(key)
+
+        if self.disk_dir and key in self.disk_entries:
+            entry = self.read_disk(key)
+            if entry is not None:
+                # Promote back into memory with the remaining TTL
+                expires_at, body = entry
+                self.store(key, expires_at, body)
+                self.disk_hits += 1
+                return body
+
+        self.misses += 1
+        return None
+
+    def put(self, key, body, ttl):
+        """Cache a body for ttl seconds."""
+        if len(body) > self.max_bytes:
+            return
+        self.store(key, time.time() + ttl, body)
+
+    def store(self, key, expires_at, body):
+        """Insert into the memory tier, evicting least recently used entries to fit."""
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = (expires_at, body)
+        self.bytes += len(body)
+
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            old_key, (old_expires_at, old_body) = self.entries.popitem(last=False)
+            self.bytes -= len(old_body)
+            self.evictions += 1
+            if self.disk_dir and old_expires_at > time.time():
+                self.write_disk(old_key, old_expires_at, old_body)
+
+    def remove(self, key):
+        """Drop an entry from the memory tier."""
+        _, body = self.entries.pop(key)
+        self.bytes -= len(body)
+
+    def disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def load_disk_index(self):
+        """Index entries left on disk by a previous run, oldest first."""
+        found = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+        for _, key, size in sorted(found):
+            self.disk_entries[key] = size
+            self.disk_bytes += size
+
+    def write_disk(self, key, expires_at, body):
+        """Demote an entry to the disk tier, evicting the oldest files to fit."""
+        path = self.disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(f"{expires_at}\n".encode() + body)
+        except OSError:
+            return
+        size = os.path.getsize(path)
+        self.disk_bytes += size - self.disk_entries.pop(key, 0)
+        self.disk_entries[key] = size
+
+        while self.disk_bytes > self.disk_max_bytes and self.disk_entries:
+            self.remove_disk(next(iter(self.disk_entries)))
+
+    def read_disk(self, key):
+        """Read (expires_at, body) from the disk tier, dropping it if it has expired."""
+        try:
+            with open(self.disk_path(key), "rb") as f:
+                expires_at = float(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            self.remove_disk(key)
+            return None
+        if expires_at <= time.time():
+            self.remove_disk(key)
+            return None
+        return expires_at, body
+
+    def remove_disk(self, key):
+        """Delete an entry from the disk tier."""
+        self.disk_bytes -= self.disk_entries.pop(key, 0)
+        try:
+            os.remove(self.disk_path(key))
+        except OSError:
+            pass
+
+    def stats(self):
+        """Get hit/miss counters and current usage."""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "disk_entries": len(self.disk_entries),
+            "disk_bytes": self.disk_bytes,
+        }
@@ -1 +1,5 @@
-python start_server.py &
\ No newline at end of file
+# ./run.sh starts the server in the background; ./run.sh status|stop|drain|reload|logs controls it
+case "$1" in
+  status|stop|drain|reload|logs) python start_server.py ctl "$@" ;;
+  *) python start_server.py "$@" & ;;
+esac
@@ -1,21 +1,58 @@
 import os
 import sys
-import glob
+import json
 import yaml
 import subprocess
 import time
+import socket
 import signal
+import threading
 import psutil
+import marshal
+import py_compile
+import shlex
 
-# Fixed paths
+# Fixed paths (the EASY_API_* environment variables let the benchmark harness
+# run a separate server against its own endpoints and configuration)
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-ENDPOINTS_DIR = os.path.join(SCRIPT_DIR, "endpoints")
+ENDPOINTS_DIR = os.environ.get("EASY_API_ENDPOINTS_DIR") or os.path.join(SCRIPT_DIR, "endpoints")
 HOOKS_FILE = os.path.join(SCRIPT_DIR, "hooks.yaml")
 LAUNCHER_SCRIPT = os.path.join(SCRIPT_DIR, "call_endpoint.py")
+# Importing the launcher (instead of running it as a script) lets Python use its
+# cached bytecode, and -S skips site initialisation the launcher doesn't need
+LAUNCHER_ARGS = ["-S", "-c", "from call_endpoint import main; main()"]
+BATCH_ARGS = ["-S", "-c", "from call_batch import main; main()"]
+# Built-in hook that runs several endpoints in one request
+BATCH_HOOK_ID = "_batch"
+POOL_SCRIPT = os.path.join(SCRIPT_DIR, "worker_pool.py")
+POOL_SOCKET = os.environ.get("EASY_API_POOL_SOCKET") or os.path.join(SCRIPT_DIR, "worker_pool.sock")
+MANIFEST_FILE = os.path.join(SCRIPT_DIR, "endpoints.manifest")
+INDEX_FILE = os.path.join(SCRIPT_DIR, "endpoints.index")
 WORKING_DIR = SCRIPT_DIR
 
+# When this process started, for reporting time-to-ready
+STARTED_AT = time.monotonic()
+
 # Configuration file
-CONFIG_FILE = os.path.join(SCRIPT_DIR, "config.yaml")
+CONFIG_FILE = os.environ.get("EASY_API_CONFIG") or os.path.join(SCRIPT_DIR, "config.yaml")
+# PIDs of the processes started for this configuration, so the next start (or
+# the GUI) stops exactly those instead of everything named like the server
+PIDS_FILE = os.path.join(os.path.dirname(CONFIG_FILE), "server.pids")
+# Describes the running server (PID, mode, port, state and how to reach its
+# control socket) for "start_server.py ctl", run.sh, kill.bat and the GUI
+STATE_FILE = os.path.join(os.path.dirname(CONFIG_FILE), "server.state")
+CONTROL_SOCKET = os.path.join(os.path.dirname(CONFIG_FILE), "server.sock")
+CONTROL_COMMANDS = ("status", "stop", "drain", "reload", "logs")
+SERVER_STATE = {}
+STATE_LOCK = threading.Lock()
+# Set by the "drain" command: finish requests in progress before stopping
+DRAIN_REQUESTED = threading.Event()
+# Set in the server instances start_server.py starts itself: "reuseport" to
+# share the configured port, or "host:port" to listen behind the balancer
+INSTANCE_ENV = "EASY_API_INSTANCE"
+# Set alongside it for instances sharing the port: the loopback port on which
+# the instance answers the supervisor's health checks
+HEALTH_PORT_ENV = "EASY_API_HEALTH_PORT"
 
 def load_config():
     """Load configuration from YAML file."""
@@ -39,16 +76,57 @@ def load_config():
 CONFIG = load_config()
 
 def get_endpoint_files():
-    """Get all files in the endpoints directory recursively."""
-    files = []
-    extensions = ['*.py', '*.sh', '*.bat', '*.ps1']
-    
-    for ext in extensions:
-        pattern = os.path.join(ENDPOINTS_DIR, '**', ext)
-        files.extend(glob.glob(pattern, recursive=True))
-    
+    """Get all files in the endpoints directory recursively.
+
+    Uses the on-disk endpoint index, so only directories that changed since
+    the last run are listed again.
+    """
+    from endpoint_index import EndpointIndex
+    index = EndpointIndex(ENDPOINTS_DIR, INDEX_FILE)
+    files = [path for path, _, _, _ in index.refresh()]
+    index.save()
     return files
 
+def get_hook_id(endpoint_file):
+    """Get the hook ID (path without extension, forward slashes) for an endpoint file."""
+    relative_path = os.path.relpath(endpoint_file, ENDPOINTS_DIR)
+    return os.path.splitext(relative_path)[0].replace('\\', '/')
+
+def build_endpoint_command(script_path):
+    """Determine how to execute the script based on its extension."""
+    if script_path.endswith('.py'):
+        return [sys.executable] + get_python_flags(get_hook_id(script_path)) + [script_path]
+    elif script_path.endswith('.sh'):
+        return [CONFIG['bash_executable'], script_path]
+    elif script_path.endswith('.bat'):
+        return ['cmd.exe', '/c', script_path]
+    elif script_path.endswith('.ps1'):
+        return ['powershell.exe', '-ExecutionPolicy', 'Bypass', '-File', script_path]
+    else:
+        return [script_path]
+
+def get_endpoint_options(hook_id):
+    """Get the per-endpoint options from the "endpoints" section of the configuration."""
+    return dict((CONFIG.get("endpoints") or {}).get(hook_id) or {})
+
+def get_python_flags(hook_id):
+    """Get the interpreter flags a Python endpoint is started with, e.g. ["-S", "-X", "frozen_modules=on"]."""
+    flags = get_endpoint_options(hook_id).get("python_flags", CONFIG.get("python_flags", []))
+    return shlex.split(flags) if isinstance(flags, str) else list(flags)
+
+def is_persistent(hook_id):
+    """Check whether an endpoint runs as a long-lived process hosted by the worker pool."""
+    return get_endpoint_options(hook_id).get("persistent", False)
+
+def has_persistent_endpoints():
+    """Check whether any endpoint is configured as persistent."""
+    return any(isinstance(options, dict) and options.get("persistent", False)
+               for options in (CONFIG.get("endpoints") or {}).values())
+
+def is_streaming(hook_id):
+    """Check whether an endpoint streams its request and response bodies."""
+    return get_endpoint_options(hook_id).get("stream", CONFIG.get("stream_responses", False))
+
 def generate_hook_config(endpoint_files):
     """Generate the hooks.yaml configuration based on the endpoint files."""
     hooks = []
@@ -58,7 +136,7 @@ def generate_hook_config(endpoint_files):
         relative_path = os.path.relpath(endpoint_file, ENDPOINTS_DIR)
         
         # Get the path without extension for the hook ID
-        hook_id = os.path.splitext(relative_path)[0].replace('\\', '/')
+        hook_id = get_hook_id(endpoint_file)
         
         # Create the hook configuration
         hook = {
@@ -67,8 +145,9 @@ def generate_hook_config(endpoint_files):
             "pass-arguments-to-command": [
                 {
                     "source": "string",
-                    "name": LAUNCHER_SCRIPT
-                },
+                    "name": arg
+                } for arg in LAUNCHER_ARGS
+            ] + [
                 {
                     "source": "string",
                     "name": relative_path  # Pass full path, not just filename
@@ -81,91 +160,942 @@ def generate_hook_config(endpoint_files):
                     "base64decode": False
                 }
             ],
-            "command-working-directory": WORKING_DIR,
-            "include-command-output-in-response": True
+            # Lets the launcher stop the endpoint once the client has given up
+            "pass-environment-to-command": [
+                {
+                    "source": "header",
+                    "name": "X-Request-Deadline",
+                    "envname": "REQUEST_DEADLINE"
+                },
+                # Lets traces from the client, launcher and endpoint share one request ID
+                {
+                    "source": "header",
+                    "name": "X-Request-Id",
+                    "envname": "EASY_API_REQUEST_ID"
+                },
+                # Compressed bodies are decompressed by the launcher
+                {
+                    "source": "header",
+                    "name": "Content-Encoding",
+                    "envname": "REQUEST_CONTENT_ENCODING"
+                }
+            ],
+            "command-working-directory": WORKING_DIR
         }
         
+        # Streamed hooks relay output to the client as the script produces it
+        if is_streaming(hook_id):
+            hook["stream-command-output"] = True
+        else:
+            hook["include-command-output-in-response"] = True
+        
         hooks.append(hook)
     
     return hooks
 
+def generate_batch_hook():
+    """Generate the hook that runs a JSON array of endpoint calls through call_batch.py."""
+    return {
+        "id": BATCH_HOOK_ID,
+        "execute-command": CONFIG["python_executable"],
+        "pass-arguments-to-command": [{"source": "string", "name": arg} for arg in BATCH_ARGS],
+        "pass-file-to-command": [
+            {
+                "source": "raw-request-body",
+                "envname": "WEBHOOK_PAYLOAD",
+                "base64decode": False
+            }
+        ],
+        "pass-environment-to-command": [
+            {
+                "source": "header",
+                "name": "X-Request-Deadline",
+                "envname": "REQUEST_DEADLINE"
+            },
+            {
+                "source": "header",
+                "name": "X-Request-Id",
+                "envname": "EASY_API_REQUEST_ID"
+            },
+            {
+                "source": "header",
+                "name": "Content-Encoding",
+                "envname": "REQUEST_CONTENT_ENCODING"
+            }
+        ],
+        "command-working-directory": WORKING_DIR,
+        "include-command-output-in-response": True,
+        "response-headers": [{"name": "Content-Type", "value": "application/json"}]
+    }
+
+def read_file(path, mode='r'):
+    """Get a file's contents, or None if it can't be read."""
+    try:
+        with open(path, mode) as f:
+            return f.read()
+    except OSError:
+        return None
+
 def write_hooks_file(hooks):
-    """Write the hooks configuration to the YAML file."""
-    with open(HOOKS_FILE, 'w') as f:
-        yaml.dump(hooks, f, default_flow_style=False)
+    """Write the hooks configuration to the YAML file.
+
+    The new file is written alongside and swapped in, so a running webhook
+    (-hotreload) never reads a half-written file. webhook treats the old file
+    being renamed away as an overwrite and keeps its current hooks until the
+    new one is in place.
+    """
+    # The C dumper is much faster on large hook lists when libyaml is available
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+    content = yaml.dump(hooks, Dumper=dumper, default_flow_style=False)
+    if read_file(HOOKS_FILE) == content:
+        print(f"{HOOKS_FILE} is up to date with {len(hooks)} hooks")
+        return
+
+    temp_file = HOOKS_FILE + ".tmp"
+    old_file = HOOKS_FILE + ".old"
+    try:
+        with open(temp_file, 'w') as f:
+            f.write(content)
+        if os.path.exists(HOOKS_FILE):
+            os.replace(HOOKS_FILE, old_file)
+        os.replace(temp_file, HOOKS_FILE)
+    except OSError:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    # Only needed for the swap, and stale once the new file is in place
+    if os.path.exists(old_file):
+        os.remove(old_file)
     print(f"Generated {HOOKS_FILE} with {len(hooks)} hooks")
 
-def kill_webhook_processes():
-    """Kill any existing webhook processes."""
-    for proc in psutil.process_iter(['pid', 'name']):
-        if 'webhook' in proc.info['name'].lower():
-            try:
-                process = psutil.Process(proc.info['pid'])
+def update_hooks(hooks, added, removed):
+    """Diff-update a hook list: add hooks for new endpoint files and drop removed ones."""
+    removed_ids = {get_hook_id(path) for path in removed}
+    hooks = [hook for hook in hooks if hook["id"] not in removed_ids]
+    return hooks + generate_hook_config(added)
+
+def write_manifest(endpoint_files):
+    """Write the precompiled routing manifest read by call_endpoint.py.
+
+    The manifest maps each hook ID to (command, absolute path, options) and is
+    stored with marshal so the launcher can load it without importing anything.
+    Returns whether the manifest changed.
+    """
+    pool_config = CONFIG.get("worker_pool") or {}
+    pool_enabled = pool_config.get("enabled", False) and hasattr(os, "fork")
+    pool_exclude = pool_config.get("exclude", [])
+
+    endpoints = {}
+    for endpoint_file in endpoint_files:
+        hook_id = get_hook_id(endpoint_file)
+        script_path = os.path.abspath(endpoint_file)
+        options = get_endpoint_options(hook_id)
+        options.setdefault("timeout", CONFIG.get("endpoint_timeout", 0))
+        # The pool buffers whole bodies, so streamed endpoints are always spawned.
+        # Persistent endpoints only exist inside the pool.
+        options["pool"] = (pool_enabled and script_path.endswith(".py") and hook_id not in pool_exclude
+                           and not is_streaming(hook_id))
+        if is_persistent(hook_id) and hasattr(os, "fork"):
+            options["pool"] = options["persistent"] = True
+        endpoints[hook_id] = (build_endpoint_command(script_path), script_path, options)
+
+    tracing_config = CONFIG.get("tracing") or {}
+    batch_config = CONFIG.get("batch") or {}
+    manifest = {
+        "endpoints": endpoints,
+        "batch": {"max_parallel": batch_config.get("max_parallel", 8),
+                  "max_items": batch_config.get("max_items", 100)},
+        "pool_socket": POOL_SOCKET,
+        "pool_fallback": pool_config.get("fallback_spawn", True),
+        "max_request_size": get_max_request_size(),
+        "tracing": {"file": os.path.join(SCRIPT_DIR, tracing_config.get("file", "traces.jsonl"))}
+                   if tracing_config.get("enabled", False) else None,
+    }
+    content = marshal.dumps(manifest)
+    if read_file(MANIFEST_FILE, 'rb') == content:
+        return False
+    # Swap the file in whole so a launcher running right now never reads half of it
+    with open(MANIFEST_FILE + ".tmp", 'wb') as f:
+        f.write(content)
+    os.replace(MANIFEST_FILE + ".tmp", MANIFEST_FILE)
+
+    # Precompile the launcher so each request loads it from bytecode
+    for module in (LAUNCHER_SCRIPT, os.path.join(SCRIPT_DIR, "pool_client.py"), os.path.join(SCRIPT_DIR, "tracing.py"),
+                   os.path.join(SCRIPT_DIR, "call_batch.py")):
+        py_compile.compile(module)
+    return True
+
+def check_launcher_import_time():
+    """Measure the launcher's import cost with -X importtime and compare it to the budget.
+
+    It is measured with python_executable, the interpreter webhook runs the
+    launcher with. Returns True if the launcher is within launcher_import_budget_ms.
+    """
+    budget_ms = CONFIG.get("launcher_import_budget_ms", 5)
+    try:
+        result = subprocess.run(
+            [CONFIG["python_executable"], "-S", "-X", "importtime", "-c", "import call_endpoint"],
+            cwd=SCRIPT_DIR,
+            capture_output=True,
+            text=True
+        )
+    except OSError as e:
+        print(f"Could not measure launcher import time: {str(e)}")
+        return False
+
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    launcher_us = None
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        cumulative_us = int(fields[1])
+        # Nested imports are indented under their parent, so only count top-level ones
+        name = fields[2][1:]
+        if not name.startswith(" "):
+            total_us += cumulative_us
+        if name.strip() == "call_endpoint":
+            launcher_us = cumulative_us
+
+    if launcher_us is None:
+        print("Could not measure launcher import time")
+        if result.stderr:
+            print(result.stderr.strip().splitlines()[-1])
+        return False
+
+    launcher_ms = launcher_us / 1000
+    within_budget = launcher_ms <= budget_ms
+    status = "OK" if within_budget else "OVER BUDGET"
+    print(f"Launcher import time: {launcher_ms:.2f} ms of {total_us / 1000:.2f} ms total imports "
+          f"(budget {budget_ms} ms) {status}")
+    return within_budget
+
+def report_endpoint_imports(endpoint_files, only=None):
+    """Measure the import time of each Python endpoint (or just the named ones) with -X importtime.
+
+    Returns True if all of them are within endpoint_import_budget_ms.
+    """
+    from cold_start import import_report
+    report_config = CONFIG.get("import_report") or {}
+    endpoints = []
+    for path in endpoint_files:
+        hook_id = get_hook_id(path)
+        if path.endswith(".py") and (not only or hook_id in only):
+            endpoints.append((hook_id, [sys.executable] + get_python_flags(hook_id), path))
+    if not endpoints:
+        print("No Python endpoints to measure")
+        return True
+    return import_report(endpoints, report_config.get("runs", 3), report_config.get("top", 5),
+                         CONFIG.get("endpoint_import_budget_ms", 0))
+
+def precompile(endpoint_files):
+    """Compile Python endpoints and their local imports to bytecode."""
+    from cold_start import precompile_endpoints
+    compiled = precompile_endpoints(endpoint_files)
+    if compiled:
+        print(f"Compiled {compiled} Python file{'s' if compiled != 1 else ''} to bytecode")
+
+def track_pids(*pids):
+    """Add processes to the PID file, with their start times."""
+    try:
+        with open(PIDS_FILE, 'r') as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = []
+    for pid in pids:
+        try:
+            entries.append([pid, psutil.Process(pid).create_time()])
+        except psutil.NoSuchProcess:
+            pass
+    with open(PIDS_FILE, 'w') as f:
+        json.dump(entries, f)
+
+def kill_server_processes(timeout=5):
+    """Stop the processes recorded in the PID file and wait for them to exit.
+
+    A process is only stopped if its start time still matches, so a PID that
+    has since been reused by something else is left alone. Processes still
+    running after timeout seconds are killed outright.
+    """
+    try:
+        with open(PIDS_FILE, 'r') as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return
+    terminated = []
+    for pid, create_time in entries:
+        if pid == os.getpid():
+            continue
+        try:
+            process = psutil.Process(pid)
+            if process.create_time() != create_time:
+                continue
+            process.terminate()
+            terminated.append(process)
+            print(f"Terminated server process with PID {pid}")
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+    _, alive = psutil.wait_procs(terminated, timeout=timeout)
+    for process in alive:
+        try:
+            process.kill()
+            print(f"Killed server process with PID {process.pid}")
+        except psutil.NoSuchProcess:
+            pass
+    psutil.wait_procs(alive, timeout=timeout)
+    try:
+        os.remove(PIDS_FILE)
+    except OSError:
+        pass
+
+def write_state(**changes):
+    """Update the state file describing this server. It holds the control token, so only this user can read it."""
+    with STATE_LOCK:
+        SERVER_STATE.update(changes)
+        fd = os.open(STATE_FILE + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(SERVER_STATE, f, indent=2)
+        os.replace(STATE_FILE + ".tmp", STATE_FILE)
+
+def read_state():
+    """Read the state of the server running for this configuration, or None if none is running."""
+    try:
+        with open(STATE_FILE, 'r') as f:
+            state = json.load(f)
+        # A PID reused by another process doesn't count
+        if psutil.Process(state["pid"]).create_time() != state["create_time"]:
+            return None
+    except (OSError, ValueError, KeyError, TypeError, psutil.Error):
+        return None
+    return state
+
+def remove_state():
+    try:
+        os.remove(STATE_FILE)
+    except OSError:
+        pass
+
+def request_shutdown(drain=False):
+    """Stop the server from another thread, as Ctrl+C would.
+
+    With drain, requests in progress are finished first (for up to drain_timeout seconds).
+    """
+    write_state(state="draining" if drain else "stopping")
+    if drain:
+        DRAIN_REQUESTED.set()
+    # A single built-in server drains itself on SIGTERM; everything else is
+    # stopped from the main thread, which Ctrl+C interrupts
+    if drain and SERVER_STATE.get("mode") == "serve" and SERVER_STATE.get("instances") == 1 and os.name != 'nt':
+        signal.raise_signal(signal.SIGTERM)
+    else:
+        signal.raise_signal(signal.SIGINT)
+
+def start_control_server(mode, watcher):
+    """Start answering control commands and write the state file."""
+    from control import ControlServer
+
+    def status(request):
+        status = {key: value for key, value in SERVER_STATE.items() if key != "token"}
+        status["uptime"] = round(time.time() - status["started_at"], 1)
+        status["endpoints"] = len(watcher.snapshot)
+        try:
+            with open(PIDS_FILE, 'r') as f:
+                status["processes"] = [pid for pid, _ in json.load(f) if psutil.pid_exists(pid)]
+        except (OSError, ValueError):
+            status["processes"] = [os.getpid()]
+        return {"status": status}
+
+    def stop(request):
+        request_shutdown()
+        return {"message": "Stopping"}
+
+    def drain(request):
+        request_shutdown(drain=True)
+        return {"message": f"Draining for up to {CONFIG.get('drain_timeout', 30)}s"}
+
+    def reload(request):
+        watcher.wake()
+        return {"message": "Rescanning endpoints"}
+
+    def logs(request):
+        raise RuntimeError("The built-in server writes its log to its console")
+
+    control = ControlServer(CONTROL_SOCKET, {"status": status, "stop": stop, "drain": drain, "reload": reload,
+                                             "logs": logs})
+    control.start()
+    write_state(pid=os.getpid(), create_time=psutil.Process().create_time(), mode=mode,
+                port=CONFIG.get("port", 9000), instances=get_instance_count(), state="starting",
+                started_at=time.time(), control=control.address, token=control.token)
+    return control
+
+def send_control_command(command, **arguments):
+    """Send a command to the running server's control socket.
+
+    Returns the (state, response) pair, with response None if no server answers.
+    """
+    from control import send_command
+    state = read_state()
+    if not state:
+        return state, None
+    try:
+        return state, send_command(state, command, **arguments)
+    except (OSError, ValueError) as e:
+        print(f"Could not reach the server's control socket: {str(e)}")
+        return state, None
+
+def run_control_command(args):
+    """Send a control command (status, stop, drain, reload or logs [lines]) to the running server.
+
+    Returns the exit code. If no server answers, "stop" falls back to stopping
+    the processes in the PID file.
+    """
+    if not args or args[0] not in CONTROL_COMMANDS:
+        print(f"Usage: start_server.py ctl {{{'|'.join(CONTROL_COMMANDS)}}} [lines]")
+        return 2
+    command = args[0]
+    arguments = {"lines": int(args[1])} if command == "logs" and len(args) > 1 else {}
+    state, response = send_control_command(command, **arguments)
+    if response is None:
+        if command == "stop":
+            kill_server_processes()
+            return 0
+        print("No server is running")
+        return 1
+    if not response.get("ok"):
+        print(f"Error: {response.get('error')}")
+        return 1
+
+    if command == "status":
+        print(json.dumps(response["status"], indent=2))
+    elif command == "logs":
+        print("\n".join(response["lines"]))
+    elif command in ("stop", "drain"):
+        print(response["message"])
+        try:
+            psutil.Process(state["pid"]).wait(CONFIG.get("drain_timeout", 30) + 10)
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.TimeoutExpired:
+            print("The server is still shutting down")
+            return 1
+        print("Server stopped")
+    else:
+        print(response["message"])
+    return 0
+
+def get_instance_count():
+    """Get how many server instances to run: the instances setting ("auto" for one per CPU), or 1 by default."""
+    # Instances keep their own cache, limits and metrics, so running several is opt-in
+    instances = CONFIG.get("instances", 1)
+    if instances is None:
+        return 1
+    if instances == "auto":
+        return os.cpu_count() or 1
+    return max(1, int(instances))
+
+def get_free_port():
+    """Pick an unused loopback port for a server instance behind the balancer."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def get_probe_address():
+    """Get the (host, port) to connect to when checking that the server is up."""
+    host = CONFIG.get("ip", "0.0.0.0")
+    # A wildcard bind address accepts connections on loopback
+    if host in ("", "0.0.0.0"):
+        host = "127.0.0.1"
+    elif host == "::":
+        host = "::1"
+    return host, CONFIG.get("port", 9000)
+
+def wait_until_listening(process, timeout, address=None):
+    """Wait until the server accepts TCP connections on its port (or on address).
+
+    Returns False if the process exits or timeout seconds pass first.
+    """
+    address = address or get_probe_address()
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(address, timeout=1):
+                return True
+        except OSError:
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 0.2)
+    return False
+
+def report_ready():
+    """Print the time-to-ready line (the GUI waits for this line)."""
+    print(f"Server ready on port {CONFIG.get('port', 9000)} in {time.monotonic() - STARTED_AT:.2f}s")
+    sys.stdout.flush()
+    if SERVER_STATE:
+        write_state(state="running")
+
+def start_worker_pool():
+    """Start the warm worker pool if it is enabled or there are persistent endpoints to host."""
+    pool_config = CONFIG.get("worker_pool") or {}
+    if not pool_config.get("enabled", False) and not has_persistent_endpoints():
+        return None
+    if not hasattr(os, "fork"):
+        print("Worker pool requires fork(); Python endpoints will be spawned per request")
+        if has_persistent_endpoints():
+            print("Persistent endpoints are not available without the worker pool")
+        return None
+
+    # Clear a socket left behind by a pool that did not shut down cleanly
+    if os.path.exists(POOL_SOCKET):
+        os.unlink(POOL_SOCKET)
+    process = subprocess.Popen([sys.executable, POOL_SCRIPT], cwd=WORKING_DIR)
+
+    # Wait for the pool to bind its socket before webhook starts sending requests
+    for _ in range(100):
+        if os.path.exists(POOL_SOCKET) or process.poll() is not None:
+            break
+        time.sleep(0.05)
+
+    if process.poll() is not None:
+        print(f"Worker pool exited with code {process.returncode}, falling back to spawning endpoints")
+        return None
+    track_pids(process.pid)
+    return process
+
+def reload_worker_pool(process, paths):
+    """Tell the worker pool to reload its endpoints if any of paths is a Python or persistent endpoint."""
+    if process and process.poll() is None and any(path.endswith(".py") or is_persistent(get_hook_id(path))
+                                                  for path in paths):
+        process.send_signal(signal.SIGHUP)
+
+def stop_worker_pool(process):
+    """Stop the worker pool started by start_worker_pool."""
+    if process and process.poll() is None:
+        process.terminate()
+        process.wait()
+
+def get_max_request_size():
+    """Get the largest request body accepted, as sent or once decompressed (0 = no limit).
+
+    compression.max_request_size is still read for configurations written before
+    the setting applied to uncompressed bodies too.
+    """
+    default = (CONFIG.get("compression") or {}).get("max_request_size", 64 * 1024 * 1024)
+    return CONFIG.get("max_request_size", default)
+
+def get_payload_staging_dir():
+    """Get the in-memory directory request bodies are staged in, or None to use the default temp directory.
+
+    With payload_staging: memory, webhook writes each body to a tmpfs directory
+    (payload_tmpfs_dir, /dev/shm by default) so it never touches a physical disk.
+    """
+    if CONFIG.get("payload_staging", "disk") != "memory":
+        return None
+    tmpfs_dir = CONFIG.get("payload_tmpfs_dir", "/dev/shm")
+    if not os.path.isdir(tmpfs_dir):
+        print(f"Payload staging directory {tmpfs_dir} not found, using the default temp directory")
+        return None
+    staging_dir = os.path.join(tmpfs_dir, "easy-api-endpoints")
+    os.makedirs(staging_dir, exist_ok=True)
+    return staging_dir
+
+def create_watcher(announce=True):
+    """Create the endpoint watcher.
+
+    In watch mode (the --watch argument or "watch: true" in the configuration)
+    it follows changes by itself; otherwise endpoints are only rescanned on a
+    "reload" control command.
+    """
+    from endpoint_watcher import EndpointWatcher
+    watch = "--watch" in sys.argv or CONFIG.get("watch", False)
+    watcher = EndpointWatcher(ENDPOINTS_DIR, get_endpoint_files, CONFIG.get("watch_interval", 1.0), manual=not watch)
+    if announce and watch:
+        print(f"Watching {ENDPOINTS_DIR} for changes ({watcher.mode})")
+    return watcher
+
+def print_endpoint_changes(added, changed, removed):
+    """Print which endpoints a reload picked up."""
+    prefix = CONFIG.get("urlprefix", "hooks")
+    url_prefix = f"/{prefix}" if prefix else ""
+    for label, paths in (("Added", added), ("Updated", changed), ("Removed", removed)):
+        for path in paths:
+            print(f"{label} {os.path.relpath(path, ENDPOINTS_DIR)} -> {url_prefix}/{get_hook_id(path)}")
+    sys.stdout.flush()
+
+def build_webhook_command(port, ip=None, hotreload=False):
+    """Build the command line for one webhook instance."""
+    cmd = [CONFIG["webhook_executable"], "-hooks", HOOKS_FILE, "-port", str(port)]
+    if ip:
+        cmd.extend(["-ip", ip])
+    if CONFIG.get("verbose", False):
+        cmd.append("-verbose")
+    if CONFIG.get("urlprefix") is not None:
+        cmd.extend(["-urlprefix", CONFIG.get("urlprefix")])
+    if hotreload:
+        cmd.append("-hotreload")
+    return cmd
+
+def start_balancer(backends, timeout):
+    """Start the least-connections balancer on the configured port in a background thread.
+
+    Returns False if it isn't listening within timeout seconds.
+    """
+    import asyncio
+    from balancer import run_balancer
+
+    ready = threading.Event()
+    failed = []
+
+    def run():
+        try:
+            asyncio.run(run_balancer(CONFIG.get("ip", "0.0.0.0"), CONFIG.get("port", 9000), backends, ready.set))
+        except Exception as e:
+            print(f"Error starting balancer: {str(e)}")
+            failed.append(e)
+            ready.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return ready.wait(timeout) and not failed
+
+def create_supervisor():
+    """Create the supervisor that restarts crashed or hung server processes, or None if it is disabled."""
+    from supervisor import Supervisor
+    supervisor_config = CONFIG.get("supervisor") or {}
+    if not supervisor_config.get("enabled", True):
+        return None
+
+    def record(status):
+        # Shown by "ctl status"
+        if SERVER_STATE:
+            write_state(supervisor=status)
+
+    return Supervisor(
+        health_interval=supervisor_config.get("health_interval", 5),
+        unhealthy_after=supervisor_config.get("unhealthy_after", 3),
+        backoff_initial=supervisor_config.get("backoff_initial", 1),
+        backoff_max=supervisor_config.get("backoff_max", 60),
+        startup_timeout=CONFIG.get("startup_timeout", 10),
+        on_change=record,
+    )
+
+def create_health_probe(address, path):
+    """Create a health check that GETs path from the server at address."""
+    from supervisor import probe_http
+    timeout = (CONFIG.get("supervisor") or {}).get("health_timeout", 2)
+    return lambda: probe_http(address, path, timeout)
+
+def run_until_interrupted(watcher=None, on_change=None, supervisor=None):
+    """Keep running until Ctrl+C, calling on_change(added, changed, removed) as endpoint files change.
+
+    The supervisor, if any, checks on the server processes about once a second.
+    """
+    if supervisor:
+        supervisor.report()
+    try:
+        while True:
+            if watcher is None:
+                time.sleep(1)
+            elif watcher.wait(1):
+                added, changed, removed = watcher.changes()
+                if added or changed or removed:
+                    on_change(added, changed, removed)
+            if supervisor:
+                supervisor.check()
+    except KeyboardInterrupt:
+        pass
+
+def stop_processes(processes, drain=False):
+    """Stop server processes and wait for them to exit.
+
+    Built-in server instances finish the requests they are handling when sent
+    SIGTERM, so unless drain is set they get SIGINT and stop straight away.
+    """
+    for process in processes:
+        if process.poll() is None:
+            if drain or os.name == 'nt':
                 process.terminate()
-                print(f"Terminated webhook process with PID {proc.info['pid']}")
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
+            else:
+                process.send_signal(signal.SIGINT)
+    for process in processes:
+        process.wait()
 
-def start_webhook_server():
-    """Start the webhook server with the generated hooks file."""
+def wait_for_running_endpoints(processes, timeout):
+    """Wait up to timeout seconds until no webhook process is running an endpoint.
+
+    webhook can't stop accepting requests by itself, so new ones may still
+    arrive; this returns as soon as there is a moment with none running.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            busy = any(psutil.Process(process.pid).children() for process in processes if process.poll() is None)
+        except psutil.Error:
+            busy = False
+        if not busy:
+            return True
+        time.sleep(0.1)
+    return False
+
+def create_log_pipeline():
+    """Create the pipeline that writes webhook's output to its rotating log file."""
+    from log_pipeline import LogPipeline
+    log_config = CONFIG.get("log") or {}
+    return LogPipeline(
+        os.path.join(WORKING_DIR, log_config.get("file", "webhook.log")),
+        max_bytes=log_config.get("max_bytes", 10 * 1024 * 1024),
+        backup_count=log_config.get("backup_count", 5),
+        rotate_interval=log_config.get("rotate_interval", 0),
+        compress=log_config.get("compress", False),
+        buffer_lines=log_config.get("buffer_lines", 1000),
+    )
+
+def start_webhook_server(watcher=None, on_change=None, control=None):
+    """Start the webhook server with the generated hooks file.
+
+    With several instances, each webhook listens on its own loopback port and
+    the balancer listens on the configured port, since webhook can't share a
+    port. With a watcher, webhook runs with -hotreload and on_change(added,
+    changed, removed) is called whenever endpoint files change. Instances
+    that crash or hang are restarted (see create_supervisor).
+    """
     try:
-        # Kill any existing webhook processes
-        kill_webhook_processes()
-        time.sleep(1)  # Give processes time to terminate
-        
-        # Build the command
-        cmd = [CONFIG["webhook_executable"], "-hooks", HOOKS_FILE]
-        
-        # Add optional parameters
-        if CONFIG.get("port"):
-            cmd.extend(["-port", str(CONFIG["port"])])
-        if CONFIG.get("verbose", False):
-            cmd.append("-verbose")
-        if CONFIG.get("urlprefix") is not None:
-            cmd.extend(["-urlprefix", CONFIG.get("urlprefix")])
-        if CONFIG.get("urlprefix") is not None:
-            cmd.extend(["-urlprefix", CONFIG.get("urlprefix")])
-        
-        print(f"Starting webhook server with command: {' '.join(cmd)}")
-        
-        # Use Popen to start the process and redirect output
-        with open("webhook.log", "w") as log_file:
+        count = get_instance_count()
+        if count == 1:
+            backends = [(None, CONFIG.get("port", 9000))]
+        else:
+            backends = [("127.0.0.1", get_free_port()) for _ in range(count)]
+
+        # webhook's output goes through a pipe to the log pipeline, which
+        # writes and rotates the log file in its own thread
+        log_pipeline = create_log_pipeline()
+        processes = []
+        # webhook writes request bodies to os.TempDir(), which follows TMPDIR
+        env = os.environ.copy()
+        staging_dir = get_payload_staging_dir()
+        if staging_dir:
+            env["TMPDIR"] = staging_dir
+
+        def start_instance(index):
+            ip, port = backends[index]
+            cmd = build_webhook_command(port, ip, watcher is not None)
+            print(f"Starting webhook server with command: {' '.join(cmd)}")
             process = subprocess.Popen(
                 cmd, 
-                stdout=log_file, 
+                stdout=subprocess.PIPE, 
                 stderr=subprocess.STDOUT,
-                text=True
+                env=env
             )
-        
-        # Wait a moment to see if the process starts successfully
-        time.sleep(2)
-        
-        # Check if the process is still running
-        if process.poll() is None:
-            print("Webhook server started successfully")
-            print(f"Server is running with PID {process.pid}")
-            print(f"Server is listening on port {CONFIG.get('port', 9000)}")
+            log_pipeline.attach(process.stdout)
+            track_pids(process.pid)
+            # Restarts replace the instance in place, so processes always holds the running ones
+            if index < len(processes):
+                processes[index] = process
+            else:
+                processes.append(process)
+            return process
+
+        for index in range(count):
+            start_instance(index)
+        if control:
+            control.handlers["logs"] = lambda request: {"lines": log_pipeline.tail(request.get("lines", 200))}
+
+        # Wait for webhook to accept connections instead of assuming it has
+        startup_timeout = CONFIG.get("startup_timeout", 10)
+        deadline = time.monotonic() + startup_timeout
+        ready = all(wait_until_listening(process, max(deadline - time.monotonic(), 0), (ip, port) if ip else None)
+                    for process, (ip, port) in zip(processes, backends))
+        if ready and count > 1:
+            ready = start_balancer(backends, max(deadline - time.monotonic(), 0))
+
+        if ready:
+            report_ready()
+            if count == 1:
+                print(f"Server is running with PID {processes[0].pid}")
+            else:
+                pids = ", ".join(str(process.pid) for process in processes)
+                print(f"Server is running {count} webhook instances (PIDs {pids}) behind the balancer")
             print("Press Ctrl+C to stop the server")
-            
-            # Keep the script running until interrupted
-            try:
-                while True:
-                    time.sleep(1)
-            except KeyboardInterrupt:
-                print("\nStopping webhook server...")
-                process.terminate()
-                process.wait()
-                print("Webhook server stopped")
-        else:
+            supervisor = create_supervisor()
+            if supervisor:
+                for index, (ip, port) in enumerate(backends):
+                    address = (ip, port) if ip else get_probe_address()
+                    name = "webhook" if count == 1 else f"webhook instance {index + 1}"
+                    # webhook answers "/" with "OK" without running anything
+                    supervisor.add(name, processes[index], lambda index=index: start_instance(index),
+                                   create_health_probe(address, "/"), f"{address[0]}:{address[1]}")
+            run_until_interrupted(watcher, on_change, supervisor)
+            if DRAIN_REQUESTED.is_set():
+                print("\nDraining webhook server...")
+                wait_for_running_endpoints(processes, CONFIG.get("drain_timeout", 30))
+            print("\nStopping webhook server...")
+            stop_processes(processes)
+            log_pipeline.close()
+            print("Webhook server stopped")
+            return
+
+        exited = [process for process in processes if process.poll() is not None]
+        if exited:
             print("Failed to start webhook server")
-            print(f"Exit code: {process.returncode}")
-            print("Check webhook.log for details")
+            print(f"Exit code: {exited[0].returncode}")
+        else:
+            print(f"Webhook server did not start listening within {startup_timeout}s")
+        stop_processes(processes)
+        log_pipeline.close()
+        print(f"Last lines of {os.path.basename(log_pipeline.path)}:")
+        for line in log_pipeline.tail(20):
+            print(f"  {line}")
     
     except Exception as e:
         print(f"Error starting webhook server: {str(e)}")
 
+def start_native_server(endpoint_files, watcher=None, on_change=None, instance=None):
+    """Serve the endpoints with the built-in asyncio HTTP server instead of webhook.
+
+    With a watcher, the route table is updated in place as endpoint files change.
+    instance is set when this is one of the instances started by
+    start_native_instances (see INSTANCE_ENV).
+    """
+    import asyncio
+    from http_server import build_routes, serve
+
+    routes = build_routes(endpoint_files)
+    host = CONFIG.get("ip", "0.0.0.0")
+    port = CONFIG.get("port", 9000)
+    prefix = CONFIG.get("urlprefix", "hooks")
+
+    if instance:
+        reuse_port = instance == "reuseport"
+        if not reuse_port:
+            host, port = instance.rsplit(":", 1)
+        health_port = int(os.environ.get(HEALTH_PORT_ENV) or 0) or None
+        # The parent asks for a rescan when it reloads
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: watcher.wake())
+        try:
+            asyncio.run(serve(routes, host, int(port), prefix, watcher, on_change, reuse_port=reuse_port,
+                              health_port=health_port))
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            print(f"Error starting native server instance: {str(e)}")
+        return
+
+    print(f"Starting native server with {len(routes)} endpoints on {host}:{port}")
+    print("Press Ctrl+C to stop the server")
+    try:
+        asyncio.run(serve(routes, host, port, prefix, watcher, on_change, report_ready))
+    except KeyboardInterrupt:
+        print("\nNative server stopped")
+    except Exception as e:
+        print(f"Error starting native server: {str(e)}")
+
+def start_native_instances(endpoint_files, count, watcher=None, on_change=None):
+    """Run count built-in server instances as child processes until Ctrl+C.
+
+    The instances share the configured port with SO_REUSEPORT, so the kernel
+    spreads connections across their accept loops. Where SO_REUSEPORT is
+    missing they listen on loopback ports behind the balancer instead. Each
+    instance follows endpoint changes itself; on_change is called here.
+    """
+    host = CONFIG.get("ip", "0.0.0.0")
+    port = CONFIG.get("port", 9000)
+    if hasattr(socket, "SO_REUSEPORT"):
+        backends = None
+        instances = ["reuseport"] * count
+        # A request to the shared port could reach any instance, so each answers
+        # health checks on a loopback port of its own
+        health_addresses = [("127.0.0.1", get_free_port()) for _ in range(count)]
+    else:
+        backends = [("127.0.0.1", get_free_port()) for _ in range(count)]
+        instances = [f"{ip}:{backend_port}" for ip, backend_port in backends]
+        health_addresses = backends
+
+    print(f"Starting {count} native server instances with {len(endpoint_files)} endpoints on {host}:{port}")
+    processes = []
+
+    def start_instance(index):
+        env = dict(os.environ, **{INSTANCE_ENV: instances[index]})
+        if not backends:
+            env[HEALTH_PORT_ENV] = str(health_addresses[index][1])
+        process = subprocess.Popen([sys.executable, os.path.join(SCRIPT_DIR, "start_server.py")] + sys.argv[1:],
+                                   env=env)
+        track_pids(process.pid)
+        # Restarts replace the instance in place, so processes always holds the running ones
+        if index < len(processes):
+            processes[index] = process
+        else:
+            processes.append(process)
+        return process
+
+    for index in range(count):
+        start_instance(index)
+
+    startup_timeout = CONFIG.get("startup_timeout", 10)
+    deadline = time.monotonic() + startup_timeout
+    ready = all(wait_until_listening(process, max(deadline - time.monotonic(), 0), address)
+                for process, address in zip(processes, health_addresses))
+    if backends:
+        ready = ready and start_balancer(backends, max(deadline - time.monotonic(), 0))
+
+    if ready:
+        report_ready()
+        print(f"Server is running with PIDs {', '.join(str(process.pid) for process in processes)}")
+        print("Press Ctrl+C to stop the server")
+
+        def reload_instances(added, changed, removed):
+            # Instances only rescan by themselves in watch mode, so ask them to
+            if hasattr(signal, "SIGHUP"):
+                for process in processes:
+                    if process.poll() is None:
+                        process.send_signal(signal.SIGHUP)
+            if on_change:
+                on_change(added, changed, removed)
+
+        supervisor = create_supervisor()
+        if supervisor:
+            for index, address in enumerate(health_addresses):
+                supervisor.add(f"native server instance {index + 1}", processes[index],
+                               lambda index=index: start_instance(index), create_health_probe(address, "/_health"),
+                               f"{address[0]}:{address[1]}")
+        run_until_interrupted(watcher, reload_instances, supervisor)
+        if DRAIN_REQUESTED.is_set():
+            print("\nDraining native server instances...")
+        stop_processes(processes, DRAIN_REQUESTED.is_set())
+        print("\nNative server stopped")
+        return
+    print(f"Native server instances did not start listening within {startup_timeout}s")
+    stop_processes(processes)
+
 def main():
-    """Main function to update hooks and start the webhook server."""
+    """Main function to update hooks and start the webhook server.
+
+    Run with the "serve" argument to use the built-in HTTP server instead of webhook,
+    "check-launcher" to only run the launcher import time check,
+    "import-report [hook_id ...]" to measure the import time of Python endpoints, or
+    "ctl <command>" to control the running server (see run_control_command).
+    """
+    native = len(sys.argv) > 1 and sys.argv[1] == "serve"
+    if len(sys.argv) > 1 and sys.argv[1] == "ctl":
+        sys.exit(run_control_command(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "check-launcher":
+        sys.exit(0 if check_launcher_import_time() else 1)
+    if len(sys.argv) > 1 and sys.argv[1] == "import-report":
+        endpoint_files = get_endpoint_files()
+        precompile(endpoint_files)
+        sys.exit(0 if report_endpoint_imports(endpoint_files, sys.argv[2:]) else 1)
+
+    # One of several built-in server instances: the parent did everything else
+    instance = os.environ.get(INSTANCE_ENV)
+    if instance:
+        start_native_server(get_endpoint_files(), create_watcher(announce=False), instance=instance)
+        return
+
     # Create endpoints directory if it doesn't exist
     if not os.path.exists(ENDPOINTS_DIR):
         os.makedirs(ENDPOINTS_DIR)
@@ -184,14 +1114,64 @@ def main():
     
     for file in endpoint_files:
         relative_path = os.path.relpath(file, ENDPOINTS_DIR)
-        hook_id = os.path.splitext(relative_path)[0].replace('\\', '/')
-        print(f"  - {relative_path} -> {url_prefix}/{hook_id}")
+        print(f"  - {relative_path} -> {url_prefix}/{get_hook_id(file)}")
+    precompile(endpoint_files)
+    watcher = create_watcher()
+
+    # Stop whatever the last run for this configuration left behind
+    kill_server_processes()
+    track_pids(os.getpid())
+    control = start_control_server("serve" if native else "webhook", watcher)
+    try:
+        run_server(native, endpoint_files, watcher, control)
+    finally:
+        control.close()
+        remove_state()
+
+def run_server(native, endpoint_files, watcher, control):
+    """Start the worker pool and the server in the chosen mode, and run until stopped."""
+    if native:
+        pool_process = start_worker_pool()
+
+        def reload_native(added, changed, removed):
+            print_endpoint_changes(added, changed, removed)
+            precompile(added + changed)
+            reload_worker_pool(pool_process, added + changed + removed)
+
+        count = get_instance_count()
+        try:
+            if count > 1:
+                start_native_instances(endpoint_files, count, watcher, reload_native)
+            else:
+                start_native_server(endpoint_files, watcher, reload_native)
+        finally:
+            stop_worker_pool(pool_process)
+        return
+
     # Generate and write hooks configuration
-    hooks = generate_hook_config(endpoint_files)
+    hooks = generate_hook_config(endpoint_files) + [generate_batch_hook()]
     write_hooks_file(hooks)
+    # Measured once per manifest rather than on every start; check-launcher runs it on demand
+    if write_manifest(endpoint_files):
+        check_launcher_import_time()
     
-    # Start the webhook server
-    start_webhook_server()
+    pool_process = start_worker_pool()
+
+    def reload_webhook(added, changed, removed):
+        nonlocal hooks
+        print_endpoint_changes(added, changed, removed)
+        precompile(added + changed)
+        # Edited scripts keep the same hook, so only new and deleted ones touch hooks.yaml
+        if added or removed:
+            write_manifest(list(watcher.snapshot))
+            hooks = update_hooks(hooks, added, removed)
+            write_hooks_file(hooks)
+        reload_worker_pool(pool_process, added + changed + removed)
+
+    try:
+        start_webhook_server(watcher, reload_webhook, control)
+    finally:
+        stop_worker_pool(pool_process)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,188 @@
+import time
+import socket
+import subprocess
+
+# Keeps the server processes start_server.py runs alive: notices when one
+# exits or stops answering its health check, and starts it again with
+# exponential backoff, recording how often and for how long each was down.
+
+# Downtimes remembered per process
+DOWNTIME_HISTORY = 20
+# Seconds a hung process gets to exit after SIGTERM before it is killed
+KILL_TIMEOUT = 5
+
+
+def probe_http(address, path, timeout):
+    """Check that the server at address answers GET path with a 2xx status within timeout seconds."""
+    try:
+        with socket.create_connection(address, timeout) as sock:
+            sock.settimeout(timeout)
+            sock.sendall(f"GET {path} HTTP/1.0\r\nHost: {address[0]}\r\n\r\n".encode())
+            status_line = sock.makefile('rb').readline()
+    except OSError:
+        return False
+    parts = status_line.split()
+    return len(parts) >= 2 and parts[0].startswith(b"HTTP/") and parts[1].startswith(b"2")
+
+
+class Child:
+    """One supervised process, and its restart history."""
+
+    def __init__(self, name, process, start, probe=None, health_address=None):
+        self.name = name
+        self.process = process
+        self.start = start  # Starts a replacement and returns its Popen
+        self.probe = probe  # Returns whether the process is healthy, or None for exit-only supervision
+        self.health_address = health_address  # Where probe checks, for status()
+        self.state = "up"
+        self.up_since = time.monotonic()
+        self.down_since = None
+        self.restart_at = None
+        self.failed_probes = 0
+        self.failing_since = None
+        self.backoff = 0
+        self.restarts = 0
+        self.last_exit_code = None
+        self.downtimes = []
+        self.total_downtime = 0.0
+
+    def status(self):
+        return {
+            "name": self.name,
+            "pid": self.process.pid,
+            "state": self.state,
+            "health_address": self.health_address,
+            "restarts": self.restarts,
+            "last_exit_code": self.last_exit_code,
+            "downtime_total": round(self.total_downtime, 2),
+            "downtimes": self.downtimes,
+        }
+
+
+class Supervisor:
+    """Restarts crashed or hung server processes.
+
+    check() is called about once a second from the main loop. A process that
+    has exited (found with a non-blocking waitpid) or has failed
+    unhealthy_after health probes in a row is started again after a backoff
+    that doubles from backoff_initial up to backoff_max with each restart, and
+    drops back once the process has stayed up for backoff_max seconds.
+    Downtime is counted from the exit (or a hung process's first failed probe)
+    until the replacement passes a health probe. on_change is called with
+    status() whenever something changes.
+    """
+
+    def __init__(self, health_interval=5, unhealthy_after=3, backoff_initial=1, backoff_max=60, startup_timeout=10,
+                 on_change=None):
+        self.health_interval = health_interval
+        self.unhealthy_after = unhealthy_after
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.startup_timeout = startup_timeout
+        self.on_change = on_change
+        self.children = []
+        self.next_probe = time.monotonic() + health_interval
+
+    def add(self, name, process, start, probe=None, health_address=None):
+        self.children.append(Child(name, process, start, probe, health_address))
+
+    def check(self):
+        now = time.monotonic()
+        probing = self.health_interval and now >= self.next_probe
+        if probing:
+            self.next_probe = now + self.health_interval
+        changed = False
+        for child in self.children:
+            if child.state == "down":
+                if now >= child.restart_at:
+                    self.restart(child, now)
+                    changed = True
+                continue
+
+            exit_code = child.process.poll()
+            if exit_code is not None:
+                print(f"{child.name} (PID {child.process.pid}) exited with code {exit_code}")
+                child.last_exit_code = exit_code
+                self.mark_down(child, now)
+                changed = True
+            elif child.state == "starting":
+                if child.probe is None or child.probe():
+                    self.mark_up(child, time.monotonic())
+                    changed = True
+                elif now - child.up_since > self.startup_timeout:
+                    print(f"{child.name} (PID {child.process.pid}) did not become healthy "
+                          f"within {self.startup_timeout}s")
+                    self.stop(child)
+                    self.mark_down(child, now)
+                    changed = True
+            elif probing and child.probe is not None:
+                if child.probe():
+                    child.failed_probes = 0
+                else:
+                    child.failed_probes += 1
+                    if child.failed_probes == 1:
+                        child.failing_since = now
+                    if child.failed_probes >= self.unhealthy_after:
+                        print(f"{child.name} (PID {child.process.pid}) failed {child.failed_probes} health checks "
+                              f"in a row, restarting it")
+                        self.stop(child)
+                        child.last_exit_code = child.process.returncode
+                        self.mark_down(child, now, since=child.failing_since)
+                        changed = True
+        if changed:
+            self.report()
+
+    def report(self):
+        if self.on_change:
+            self.on_change(self.status())
+
+    def mark_down(self, child, now, since=None):
+        if child.state == "up":
+            # A replacement that fails to come up doesn't end the outage
+            child.down_since = since or now
+            if now - child.up_since >= self.backoff_max:
+                # It had been fine for a while: not part of a crash loop
+                child.backoff = 0
+        child.backoff = min(child.backoff * 2, self.backoff_max) if child.backoff else self.backoff_initial
+        child.state = "down"
+        child.restart_at = now + child.backoff
+        child.failed_probes = 0
+        print(f"Restarting {child.name} in {child.backoff:g}s")
+
+    def restart(self, child, now):
+        try:
+            child.process = child.start()
+        except Exception as e:
+            print(f"Error restarting {child.name}: {str(e)}")
+            self.mark_down(child, now)
+            return
+        child.restarts += 1
+        child.state = "starting"
+        child.up_since = now
+        print(f"Restarted {child.name} with PID {child.process.pid} (restart {child.restarts})")
+
+    def mark_up(self, child, now):
+        downtime = now - child.down_since
+        child.state = "up"
+        child.up_since = now
+        child.downtimes = (child.downtimes + [round(downtime, 2)])[-DOWNTIME_HISTORY:]
+        child.total_downtime += downtime
+        print(f"{child.name} is back up after {downtime:.2f}s")
+
+    def stop(self, child):
+        process = child.process
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(KILL_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def status(self):
+        children = [child.status() for child in self.children]
+        return {
+            "restarts": sum(child["restarts"] for child in children),
+            "downtime_total": round(sum(child.total_downtime for child in self.children), 2),
+            "children": children,
+        }
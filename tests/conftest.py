@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# The server modules load their configuration on import, so point them at a
+# minimal one of their own instead of whatever config.yaml the checkout has.
+CONFIG_DIR = tempfile.mkdtemp(prefix="easy-api-tests-")
+with open(os.path.join(CONFIG_DIR, "config.yaml"), "w") as f:
+    f.write("python_executable: python3\nbash_executable: bash\n")
+os.environ["EASY_API_CONFIG"] = os.path.join(CONFIG_DIR, "config.yaml")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from http_server import (BadRequest, EndpointServer, Response, StreamingResponse, read_request,
+                         write_response)
+from start_server import CONFIG
+
+
+class Connection:
+    """The writing side of a client connection, keeping what the server sends."""
+
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def make_reader(data):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def parse(data):
+    """Read one request and its body from data."""
+    async def run():
+        reader = make_reader(data)
+        request = await read_request(await reader.readline(), reader, Connection())
+        return request, await request.read_body()
+    return asyncio.run(run())
+
+
+def serve(data):
+    """Run a connection carrying data through the server and return what it answered."""
+    async def run():
+        connection = Connection()
+        await EndpointServer({}).handle_connection(make_reader(data), connection)
+        return connection
+    return asyncio.run(run())
+
+
+def split_responses(data):
+    """Split the server's output into (status, headers, body) by Content-Length."""
+    responses = []
+    while data:
+        head, _, data = data.partition(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        headers = dict(line.split(": ", 1) for line in lines[1:])
+        size = int(headers.get("Content-Length", 0))
+        responses.append((int(lines[0].split()[1]), headers, data[:size]))
+        data = data[size:]
+    return responses
+
+
+@pytest.fixture
+def max_request_size():
+    saved = CONFIG.get("max_request_size")
+    CONFIG["max_request_size"] = 16
+    yield 16
+    if saved is None:
+        CONFIG.pop("max_request_size")
+    else:
+        CONFIG["max_request_size"] = saved
+
+
+def test_sized_body():
+    request, body = parse(b"POST /hooks/echo?x=1 HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello")
+    assert (request.method, request.path, request.query) == ("POST", "/hooks/echo", "x=1")
+    assert body == b"hello"
+
+
+@pytest.mark.parametrize("value", ["-5", "+5", "5_0", "0x5", "five", "", "1e3"])
+def test_malformed_content_length(value):
+    with pytest.raises(BadRequest) as error:
+        parse(f"POST / HTTP/1.1\r\nContent-Length: {value}\r\n\r\nhello".encode())
+    assert error.value.status == 400
+
+
+def test_content_length_over_limit(max_request_size):
+    with pytest.raises(BadRequest) as error:
+        parse(b"POST / HTTP/1.1\r\nContent-Length: 17\r\n\r\n" + b"x" * 17)
+    assert error.value.status == 413
+
+
+def test_malformed_request_line():
+    with pytest.raises(BadRequest):
+        parse(b"GARBAGE\r\n\r\n")
+
+
+def test_chunked_body_with_extensions_and_trailers():
+    request, body = parse(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+                          b"4\r\nWiki\r\n5;name=value\r\npedia\r\n0\r\nX-Checksum: 1\r\n\r\n")
+    assert body == b"Wikipedia"
+
+
+@pytest.mark.parametrize("size", [b"-5", b"zz", b""])
+def test_malformed_chunk_size(size):
+    with pytest.raises(BadRequest) as error:
+        parse(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n" + size + b"\r\nhello\r\n0\r\n\r\n")
+    assert error.value.status == 400
+
+
+def test_chunked_body_over_limit(max_request_size):
+    with pytest.raises(BadRequest) as error:
+        parse(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+              b"10\r\n" + b"x" * 16 + b"\r\n1\r\nx\r\n0\r\n\r\n")
+    assert error.value.status == 413
+
+
+def test_pipelined_requests():
+    responses = split_responses(serve(
+        b"GET /_health HTTP/1.1\r\n\r\n"
+        b"POST /_health HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n0\r\n\r\n"
+        b"POST /_health HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc"
+        b"GET /missing HTTP/1.1\r\nConnection: close\r\n\r\n").data)
+    assert [(status, body) for status, _, body in responses] == [
+        (200, b"ok\n"), (200, b"ok\n"), (200, b"ok\n"), (404, b"404 page not found\n")]
+    assert responses[-1][1]["Connection"] == "close"
+
+
+def test_head_has_no_body():
+    data = serve(b"HEAD /_health HTTP/1.1\r\n\r\n"
+                 b"GET /_health HTTP/1.1\r\nConnection: close\r\n\r\n").data
+    # The HEAD response describes the GET's body without sending it, so the
+    # next response on the connection starts right after its headers
+    head, _, rest = data.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200") and b"Content-Length: 3" in head.split(b"\r\n")
+    assert [(status, body) for status, _, body in split_responses(rest)] == [(200, b"ok\n")]
+
+
+def test_streamed_head_has_no_body():
+    async def run():
+        reader = make_reader(b"HEAD /hooks/list HTTP/1.1\r\n\r\n")
+        request = await read_request(await reader.readline(), reader, Connection())
+        produced = []
+
+        async def body():
+            for data in (b"one\n", b"two\n"):
+                produced.append(data)
+                yield data
+
+        connection = Connection()
+        keep_alive = await write_response(connection, StreamingResponse(200, body()), request, True)
+        return connection.data, produced, keep_alive
+
+    data, produced, keep_alive = asyncio.run(run())
+    assert data.endswith(b"\r\n\r\n") and b"one" not in data
+    assert b"Transfer-Encoding: chunked" in data
+    # The endpoint still runs to the end
+    assert produced == [b"one\n", b"two\n"] and keep_alive
+
+
+def test_bad_content_length_closes_connection():
+    connection = serve(b"POST /_health HTTP/1.1\r\nContent-Length: -5\r\n\r\n"
+                       b"GET /_health HTTP/1.1\r\n\r\n")
+    responses = split_responses(connection.data)
+    assert [status for status, _, _ in responses] == [400]
+    assert responses[0][1]["Connection"] == "close" and connection.closed
+
+
+def test_response_without_request_has_body():
+    async def run():
+        connection = Connection()
+        await write_response(connection, Response(400, "Malformed request line\n"), None, False)
+        return connection.data
+
+    assert asyncio.run(run()).endswith(b"\r\n\r\nMalformed request line\n")
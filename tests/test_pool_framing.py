@@ -0,0 +1,90 @@
+import os
+import socket
+import threading
+
+import pytest
+
+from pool_client import (FRAME_HEADER, call_pool, recv_frame, recv_frame_with_fds, send_frame)
+from worker_pool import Endpoint, serve_connection
+
+HANDLER = '''
+def handler(body):
+    return b"got " + body
+'''
+
+
+def test_frame_round_trip():
+    client, server = socket.socketpair()
+    frames = [b"", b"x", os.urandom(1024 * 1024)]
+    # Large frames don't fit in the socket buffer, so send from another thread
+    sender = threading.Thread(target=lambda: [send_frame(client, frame) for frame in frames])
+    sender.start()
+    try:
+        assert [recv_frame(server) for _ in frames] == frames
+    finally:
+        sender.join()
+        client.close()
+        server.close()
+
+
+def test_frame_cut_short():
+    client, server = socket.socketpair()
+    client.sendall(FRAME_HEADER.pack(10) + b"abc")
+    client.close()
+    with pytest.raises(ConnectionError):
+        recv_frame(server)
+    server.close()
+
+
+def test_frame_with_fds(tmp_path):
+    path = tmp_path / "payload"
+    path.write_bytes(b"payload")
+    client, server = socket.socketpair(socket.AF_UNIX)
+    with open(path, "rb") as f:
+        socket.send_fds(client, [FRAME_HEADER.pack(6) + b"header"], [f.fileno()])
+    data, fds = recv_frame_with_fds(server)
+    with os.fdopen(fds[0], "rb") as passed:
+        assert (data, passed.read()) == (b"header", b"payload")
+    client.close()
+    server.close()
+
+
+@pytest.fixture
+def pool(tmp_path):
+    """A pool socket answered by serve_connection, as a worker would, for one handler endpoint."""
+    script = tmp_path / "greet.py"
+    script.write_text(HANDLER)
+    endpoints = {"greet.py": Endpoint(str(script))}
+    address = str(tmp_path / "pool.sock")
+    listener = socket.socket(socket.AF_UNIX)
+    listener.bind(address)
+    listener.listen()
+
+    def accept():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            with conn:
+                serve_connection(conn, endpoints)
+
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+    yield address
+    listener.close()
+
+
+def test_pool_round_trip(pool):
+    assert call_pool("greet.py", b"hello", pool) == (0, b"got hello", b"")
+
+
+def test_pool_round_trip_with_payload_fd(pool, tmp_path):
+    path = tmp_path / "payload"
+    path.write_bytes(b"from a file")
+    with open(path, "rb") as f:
+        assert call_pool("greet.py", b"", pool, payload_fd=f.fileno()) == (0, b"got from a file", b"")
+
+
+def test_pool_unknown_script(pool):
+    assert call_pool("missing.py", b"hello", pool) is None
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+
+# Endpoints find the ID of the request they are serving in this environment variable
+REQUEST_ID_ENV = "EASY_API_REQUEST_ID"
+REQUEST_ID_HEADER = "X-Request-Id"
+
+
+def new_request_id():
+    return os.urandom(8).hex()
+
+
+class Trace:
+    """The timed phases (spans) of one request.
+
+    Span times are time.monotonic() values, which share a clock across
+    processes on the same host, so spans written by the server, the launcher
+    and the endpoint line up.
+    """
+
+    def __init__(self, request_id, endpoint, source, tracer):
+        self.request_id = request_id
+        self.endpoint = endpoint
+        self.source = source
+        self.tracer = tracer
+        self.spans = []
+
+    def add(self, name, start, end=None):
+        self.spans.append((name, start, time.monotonic() if end is None else end))
+
+    def finish(self):
+        """Write the spans out."""
+        self.tracer.write(self)
+
+    def server_timing(self):
+        """Format the spans as a Server-Timing header value."""
+        return ", ".join(f"{name};dur={(end - start) * 1000:.3f}" for name, start, end in self.spans)
+
+    def json_lines(self):
+        lines = []
+        for name, start, end in self.spans:
+            lines.append(json.dumps({
+                "request_id": self.request_id,
+                "endpoint": self.endpoint,
+                "source": self.source,
+                "span": name,
+                "start": round(start, 6),
+                "duration_ms": round((end - start) * 1000, 3),
+            }) + "\n")
+        return lines
+
+
+class Tracer:
+    """Writes finished traces to a JSON lines file.
+
+    Each trace is appended with a single O_APPEND write, so the server and
+    any number of launchers can share one file.
+    """
+
+    def __init__(self, path, server_timing=True):
+        self.path = path
+        self.server_timing = server_timing
+
+    def start(self, request_id, endpoint, source):
+        return Trace(request_id or new_request_id(), endpoint, source, self)
+
+    def write(self, trace):
+        data = "".join(trace.json_lines()).encode()
+        if not data:
+            return
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+
+def create_tracer(settings, base_dir):
+    """Create a Tracer from the tracing section of the configuration, or None if tracing is off."""
+    settings = settings or {}
+    if not settings.get("enabled", False):
+        return None
+    return Tracer(os.path.join(base_dir, settings.get("file", "traces.jsonl")),
+                  settings.get("server_timing", True))
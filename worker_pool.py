@@ -0,0 +1,603 @@
+import os
+import sys
+import io
+import ast
+import json
+import time
+import select
+import signal
+import socket
+import subprocess
+from start_server import (CONFIG, ENDPOINTS_DIR, POOL_SOCKET, WORKING_DIR, get_endpoint_files,
+                          get_endpoint_options, build_endpoint_command)
+from pool_client import send_frame, recv_frame, recv_frame_with_fds, EndpointTimeout
+from tracing import REQUEST_ID_ENV
+
+
+def pool_settings():
+    """Get the worker pool settings from the configuration."""
+    settings = CONFIG.get("worker_pool") or {}
+    return {
+        "enabled": settings.get("enabled", False),
+        "size": int(settings.get("size", os.cpu_count() or 2)),
+        "max_requests": int(settings.get("max_requests", 1000)),
+        "fallback_spawn": settings.get("fallback_spawn", True),
+        "exclude": list(settings.get("exclude", [])),
+        "health_interval": float(settings.get("health_interval", 5)),
+    }
+
+
+# Set in the environment of persistent endpoints, so a script can tell which mode it runs in
+PERSISTENT_ENV = "EASY_API_PERSISTENT"
+# Seconds a persistent endpoint that keeps crashing waits between restarts
+RESTART_BACKOFF = 1.0
+
+
+def get_imports(tree):
+    """List the absolute modules a script imports at the top level of its parsed tree."""
+    imports = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            imports.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            imports.append(node.module)
+    return imports
+
+
+class Endpoint:
+    """A preloaded Python endpoint."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            source = f.read()
+        self.code = compile(source, path, "exec")
+        self.handler = None
+
+        tree = ast.parse(source, path)
+        self.imports = get_imports(tree)
+        if any(isinstance(node, ast.FunctionDef) and node.name == "handler" for node in tree.body):
+            # Modules exposing handler() guard their script code behind __main__,
+            # so it is safe to execute them once here and keep the callable
+            namespace = {"__name__": "endpoint_module", "__file__": path}
+            with script_path_first(path):
+                exec(self.code, namespace)
+            self.handler = namespace.get("handler")
+
+    def preload_imports(self):
+        """Import the modules a plain script uses so forked workers start warm."""
+        with script_path_first(self.path):
+            for module in self.imports:
+                try:
+                    __import__(module)
+                except Exception:
+                    pass
+
+
+class PersistentEndpoint:
+    """An endpoint of any type that is started once and then serves requests framed on its stdin/stdout."""
+
+    def __init__(self, path):
+        self.path = path
+        self.command = build_endpoint_command(path)
+        self.handler = None
+
+
+class PersistentError(Exception):
+    """Raised when a persistent endpoint dies or breaks the protocol."""
+
+
+class PersistentProcess:
+    """One running copy of a persistent endpoint, owned by a single worker.
+
+    Requests are sent as "<length>\\n<body>" and the endpoint answers with
+    "<exit code> <length>\\n<output>". A process that dies, times out or
+    answers garbage is killed and started again for the next request.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.process = None
+        self.buffer = bytearray()
+        self.started_at = 0.0
+        self.restarts = 0
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Start the process, unless it crashed too recently."""
+        if self.process is not None:
+            if time.monotonic() - self.started_at < RESTART_BACKOFF:
+                raise PersistentError(f"{self.endpoint.path} keeps exiting, waiting before restarting it")
+            self.restarts += 1
+            print(f"Restarting persistent endpoint {self.endpoint.path}", file=sys.stderr)
+        env = dict(os.environ)
+        env[PERSISTENT_ENV] = "1"
+        # Its stderr goes straight to the pool's, like a spawned script's goes to the server log
+        self.process = subprocess.Popen(self.endpoint.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        cwd=WORKING_DIR, env=env, start_new_session=True, bufsize=0)
+        os.set_blocking(self.process.stdin.fileno(), False)
+        os.set_blocking(self.process.stdout.fileno(), False)
+        self.buffer.clear()
+        self.started_at = time.monotonic()
+
+    def stop(self):
+        """Kill the process and anything it started."""
+        if self.process is None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+    def check(self):
+        """Health check: restart the process if it has died since its last request."""
+        if self.process is not None and not self.alive():
+            print(f"Persistent endpoint {self.endpoint.path} exited with code {self.process.returncode}",
+                  file=sys.stderr)
+            self.stop()
+            try:
+                self.start()
+            except (OSError, PersistentError) as e:
+                print(str(e), file=sys.stderr)
+
+    def call(self, payload, timeout=0):
+        """Send one request and return (exit_code, output).
+
+        Raises EndpointTimeout if there is no complete answer within timeout
+        seconds, or PersistentError if the process fails.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        if not self.alive():
+            self.stop()
+            self.start()
+        try:
+            self.write(b"%d\n" % len(payload) + payload, deadline)
+            header = self.read_line(deadline).split()
+            if len(header) != 2:
+                raise PersistentError(f"{self.endpoint.path} sent a malformed response header")
+            exit_code, size = int(header[0]), int(header[1])
+            return exit_code, self.read_exact(size, deadline)
+        except (EndpointTimeout, PersistentError):
+            self.stop()
+            raise
+        except (OSError, ValueError) as e:
+            self.stop()
+            raise PersistentError(f"{self.endpoint.path} failed: {str(e)}")
+
+    def wait_ready(self, fd, write, deadline):
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise EndpointTimeout()
+        if write:
+            ready = select.select([], [fd], [], remaining)[1]
+        else:
+            ready = select.select([fd], [], [], remaining)[0]
+        if not ready:
+            raise EndpointTimeout()
+
+    def write(self, data, deadline):
+        fd = self.process.stdin.fileno()
+        view = memoryview(data)
+        while view:
+            self.wait_ready(fd, True, deadline)
+            try:
+                view = view[os.write(fd, view):]
+            except BlockingIOError:
+                pass
+
+    def fill(self, deadline):
+        """Read whatever output is available into the buffer."""
+        fd = self.process.stdout.fileno()
+        self.wait_ready(fd, False, deadline)
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return
+        if not data:
+            raise PersistentError(f"{self.endpoint.path} exited mid-request")
+        self.buffer += data
+
+    def read_line(self, deadline):
+        while b"\n" not in self.buffer:
+            self.fill(deadline)
+        line, _, rest = bytes(self.buffer).partition(b"\n")
+        self.buffer[:] = rest
+        return line
+
+    def read_exact(self, size, deadline):
+        while len(self.buffer) < size:
+            self.fill(deadline)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+# This worker's running persistent endpoints, by endpoint path (empty in the zygote)
+persistent_processes = {}
+
+
+def get_persistent_process(endpoint):
+    process = persistent_processes.get(endpoint.path)
+    if process is None:
+        process = persistent_processes[endpoint.path] = PersistentProcess(endpoint)
+    return process
+
+
+class script_path_first:
+    """Put the script's directory first on sys.path like a normal interpreter run."""
+
+    def __init__(self, path):
+        self.directory = os.path.dirname(path)
+
+    def __enter__(self):
+        sys.path.insert(0, self.directory)
+
+    def __exit__(self, *exc_info):
+        try:
+            sys.path.remove(self.directory)
+        except ValueError:
+            pass
+
+
+def load_endpoints(exclude, preload_python=True):
+    """Compile every Python endpoint once, keyed by path relative to the endpoints directory.
+
+    Endpoints with the persistent option, of any type, are served too. With
+    preload_python off (the pool only runs for persistent endpoints), other
+    Python endpoints are left to be spawned.
+    """
+    endpoints = {}
+    for path in get_endpoint_files():
+        relative_path = os.path.relpath(path, ENDPOINTS_DIR)
+        hook_id = os.path.splitext(relative_path)[0].replace("\\", "/")
+        if get_endpoint_options(hook_id).get("persistent", False):
+            endpoints[relative_path.replace("\\", "/")] = PersistentEndpoint(path)
+            print(f"  - persistent {relative_path}")
+            continue
+        if not path.endswith(".py") or not preload_python:
+            continue
+        if hook_id in exclude:
+            continue
+        try:
+            endpoint = Endpoint(path)
+            endpoint.preload_imports()
+            endpoints[relative_path.replace("\\", "/")] = endpoint
+            kind = "handler" if endpoint.handler else "script"
+            print(f"  - preloaded {relative_path} ({kind})")
+        except Exception as e:
+            print(f"  - skipped {relative_path}: {str(e)}")
+    return endpoints
+
+
+def raise_timeout(signum, frame):
+    raise EndpointTimeout()
+
+
+def run_endpoint(endpoint, payload, timeout=0):
+    """Execute an endpoint in this process with redirected stdio.
+
+    Raises EndpointTimeout if it is still running after timeout seconds.
+    """
+    stdin = io.TextIOWrapper(io.BytesIO(payload))
+    stdout_buffer = io.BytesIO()
+    stderr_buffer = io.BytesIO()
+    stdout = io.TextIOWrapper(stdout_buffer, write_through=True)
+    stderr = io.TextIOWrapper(stderr_buffer, write_through=True)
+
+    saved = sys.stdin, sys.stdout, sys.stderr, sys.argv
+    sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+    sys.argv = [endpoint.path]
+    exit_code = 0
+    if timeout:
+        signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with script_path_first(endpoint.path):
+            if endpoint.handler:
+                result = endpoint.handler(payload)
+                if isinstance(result, str):
+                    stdout.write(result)
+                elif result is not None:
+                    stdout.flush()
+                    stdout_buffer.write(result)
+            else:
+                exec(endpoint.code, {"__name__": "__main__", "__file__": endpoint.path})
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            exit_code = e.code
+        elif e.code is not None:
+            stderr.write(f"{e.code}\n")
+            exit_code = 1
+    except EndpointTimeout:
+        raise
+    except BaseException:
+        import traceback
+        traceback.print_exc(file=stderr)
+        exit_code = 1
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.stdin, sys.stdout, sys.stderr, sys.argv = saved
+
+    return exit_code, stdout_buffer.getvalue(), stderr_buffer.getvalue()
+
+
+def serve_connection(conn, endpoints):
+    """Handle a single request arriving on conn."""
+    header, fds = recv_frame_with_fds(conn)
+    request = json.loads(header)
+    if request.get("fd") and fds:
+        # The launcher handed us its payload file, read it directly
+        with os.fdopen(fds[0], "rb") as payload_file:
+            payload = payload_file.read()
+    else:
+        for fd in fds:
+            os.close(fd)
+        payload = recv_frame(conn)
+    endpoint = endpoints.get(request["script"])
+
+    if endpoint is None:
+        send_frame(conn, json.dumps({"preloaded": False}).encode())
+        return
+
+    timeout = request.get("timeout") or 0
+    if request.get("request_id"):
+        os.environ[REQUEST_ID_ENV] = request["request_id"]
+    else:
+        os.environ.pop(REQUEST_ID_ENV, None)
+    if isinstance(endpoint, PersistentEndpoint):
+        send_persistent_result(conn, endpoint, payload, timeout)
+        return
+    if endpoint.handler:
+        # Handlers are plain callables, so they run inside the reused warm worker
+        send_result(conn, endpoint, payload, timeout)
+        return
+
+    # Plain scripts get a throwaway fork of the warm worker so their
+    # module-level state never leaks into the next request. It leads its own
+    # process group, so anything the script starts can be killed with it.
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.setsid()
+            send_result(conn, endpoint, payload, timeout, kill_group=True)
+        finally:
+            os._exit(0)
+
+    if not timeout:
+        os.waitpid(pid, 0)
+        return
+
+    # Backstop in case the script swallowed the timeout exception
+    deadline = time.monotonic() + timeout + 1
+    while os.waitpid(pid, os.WNOHANG) == (0, 0):
+        if time.monotonic() > deadline:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+            os.waitpid(pid, 0)
+            send_frame(conn, json.dumps({"timed_out": True}).encode())
+            return
+        time.sleep(0.005)
+
+
+def send_result(conn, endpoint, payload, timeout, kill_group=False):
+    """Run the endpoint and send its result (or that it timed out) back on conn.
+
+    With kill_group (in a fork that leads its own process group), a timeout
+    also kills everything the script started, and this process with it.
+    """
+    try:
+        exit_code, stdout, stderr = run_endpoint(endpoint, payload, timeout)
+    except EndpointTimeout:
+        send_frame(conn, json.dumps({"timed_out": True}).encode())
+        if kill_group:
+            os.killpg(os.getpid(), signal.SIGKILL)
+        return
+    send_frame(conn, json.dumps({"exit_code": exit_code}).encode())
+    send_frame(conn, stdout)
+    send_frame(conn, stderr)
+
+
+def send_persistent_result(conn, endpoint, payload, timeout):
+    """Pass the request to this worker's copy of a persistent endpoint and send back its answer."""
+    try:
+        exit_code, stdout = get_persistent_process(endpoint).call(payload, timeout)
+        stderr = b""
+    except EndpointTimeout:
+        send_frame(conn, json.dumps({"timed_out": True}).encode())
+        return
+    except (OSError, PersistentError) as e:
+        exit_code, stdout, stderr = 1, b"", f"{str(e)}\n".encode()
+    send_frame(conn, json.dumps({"exit_code": exit_code}).encode())
+    send_frame(conn, stdout)
+    send_frame(conn, stderr)
+
+
+class Retire(Exception):
+    """Raised in an idle worker when the pool reloads."""
+
+
+def worker_loop(listener, endpoints, max_requests, health_interval=5):
+    """Accept requests until the worker has served max_requests or is retired.
+
+    Persistent endpoints are started up front, so their setup cost is paid
+    before the first request, and checked every health_interval seconds
+    while the worker is idle.
+    """
+    state = {"idle": False, "retiring": False}
+
+    def retire(signum, frame):
+        # SIGHUP means the pool has reloaded and new workers are already
+        # accepting. Leave straight away if idle, otherwise finish the request.
+        state["retiring"] = True
+        if state["idle"]:
+            raise Retire()
+
+    def terminate(signum, frame):
+        # Persistent endpoints run in their own sessions, so stop them explicitly
+        for process in persistent_processes.values():
+            process.stop()
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, retire)
+    for endpoint in endpoints.values():
+        if isinstance(endpoint, PersistentEndpoint):
+            try:
+                get_persistent_process(endpoint).start()
+            except OSError as e:
+                print(f"Failed to start persistent endpoint {endpoint.path}: {str(e)}", file=sys.stderr)
+    served = 0
+    while max_requests <= 0 or served < max_requests:
+        try:
+            state["idle"] = True
+            if state["retiring"]:
+                break
+            # The listener is non-blocking so that a retiring worker is never
+            # stuck in accept() while holding a connection it won't serve
+            readable, _, _ = select.select([listener], [], [], health_interval if persistent_processes else None)
+            state["idle"] = False
+        except Retire:
+            break
+        if not readable:
+            for process in persistent_processes.values():
+                process.check()
+            continue
+        try:
+            conn, _ = listener.accept()
+        except BlockingIOError:
+            continue  # Another worker got there first
+        conn.setblocking(True)
+        try:
+            serve_connection(conn, endpoints)
+        except Exception as e:
+            print(f"Worker {os.getpid()} failed to handle request: {str(e)}", file=sys.stderr)
+        finally:
+            conn.close()
+        served += 1
+    for process in persistent_processes.values():
+        process.stop()
+    os._exit(0)
+
+
+def spawn_worker(listener, endpoints, settings):
+    """Fork a warm worker from the zygote."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            worker_loop(listener, endpoints, settings["max_requests"], settings["health_interval"])
+        finally:
+            os._exit(1)
+    return pid
+
+
+class Reload(Exception):
+    """Raised in the pool's main loop on SIGHUP."""
+
+
+def reload_pool(listener, workers, settings):
+    """Recompile the endpoints and swap in fresh workers without dropping requests.
+
+    The new workers start accepting before the old ones are retired, and old
+    workers finish whatever request they are in the middle of.
+    """
+    print("Reloading endpoints:")
+    endpoints = load_endpoints(settings["exclude"], settings["enabled"])
+    new_workers = set()
+    for _ in range(settings["size"]):
+        new_workers.add(spawn_worker(listener, endpoints, settings))
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGHUP)
+        except ProcessLookupError:
+            pass
+    sys.stdout.flush()
+    return endpoints, new_workers
+
+
+def main():
+    """Preload endpoints, then keep a pool of forked workers accepting requests.
+
+    Send SIGHUP to reload the endpoints after they change.
+    """
+    settings = pool_settings()
+    if not hasattr(os, "fork"):
+        print("Worker pool requires fork(); endpoints will be spawned per request")
+        return
+
+    print("Preloading endpoints:")
+    endpoints = load_endpoints(settings["exclude"], settings["enabled"])
+
+    if os.path.exists(POOL_SOCKET):
+        os.unlink(POOL_SOCKET)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(POOL_SOCKET)
+    listener.listen(128)
+    listener.setblocking(False)
+
+    workers = set()
+    state = {"waiting": False, "reload": False}
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    def reload(signum, frame):
+        state["reload"] = True
+        if state["waiting"]:
+            raise Reload()
+
+    signal.signal(signal.SIGTERM, shutdown)
+
+    for _ in range(settings["size"]):
+        workers.add(spawn_worker(listener, endpoints, settings))
+    signal.signal(signal.SIGHUP, reload)
+    print(f"Worker pool ready with {settings['size']} workers on {POOL_SOCKET}")
+    sys.stdout.flush()
+
+    try:
+        while True:
+            if state["reload"]:
+                state["reload"] = False
+                endpoints, workers = reload_pool(listener, workers, settings)
+            try:
+                state["waiting"] = True
+                if state["reload"]:
+                    continue
+                pid, _ = os.waitpid(-1, 0)
+            except Reload:
+                continue
+            except ChildProcessError:
+                time.sleep(0.1)
+                continue
+            finally:
+                state["waiting"] = False
+            if pid in workers:
+                # Recycle the worker that hit max_requests (or crashed)
+                workers.discard(pid)
+                workers.add(spawn_worker(listener, endpoints, settings))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        listener.close()
+        if os.path.exists(POOL_SOCKET):
+            os.unlink(POOL_SOCKET)
+        print("Worker pool stopped")
+
+
+if __name__ == "__main__":
+    main()